@@ -245,13 +245,12 @@ namespace ChatbotMvcForm4._6.Controllers
                 System.Diagnostics.Debug.WriteLine($"开始处理AI预测请求: {request.Description.Substring(0, Math.Min(50, request.Description.Length))}...");
                 
                 // 准备数据 - 复用原有逻辑
+                // /predict 只需要新案例，不再发送历史案例
                 var newCase = PrepareNewCaseData(request);
-                var cases = GetHistoricalCases();
                 
                 var apiRequest = new {
                     description = request.Description,
-                    new_case = newCase,
-                    historical_cases = cases
+                    new_case = newCase
                 };
                 
                 // 配置序列化
@@ -0,0 +1,130 @@
+"""
+Latency and recall of dense, hybrid (BM25 + dense, reciprocal-rank fusion) and lexically
+prefiltered hybrid search on a synthetic ticket corpus.
+
+Every ticket has a module, an error code and a ticket number. Each query paraphrases one
+ticket and mentions its error code, and recall@k is the share of queries whose ticket is in
+the top k.
+
+    python benchmarks/bench_hybrid_search.py --cases 5000 --queries 200
+    python benchmarks/bench_hybrid_search.py --cases 200000 --encoder hashing
+
+--encoder hashing swaps the SentenceTransformer for a bag-of-words hashing encoder. Its
+latency figures are meaningful. Its dense recall is not.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import vector_utils
+from lexical_index import tokenize
+
+MODULES = ["Billing", "Checkout", "Inventory", "Payroll", "Reporting", "Login", "Scheduler", "Printing",
+           "Search", "Notifications", "Warehouse", "CRM", "Invoicing", "Shipping", "Audit", "Export"]
+WORDS = ["timeout", "deadlock", "cache", "queue", "retry", "disk", "certificate", "proxy", "memory",
+         "connection", "database", "session", "upload", "token", "thread", "index", "batch", "job",
+         "slow", "crash", "failure", "missing", "duplicate", "stale", "corrupt", "overflow", "latency"]
+PHASES = ["Production", "UAT", "SIT", "Development"]
+
+class HashingEncoder:
+    """Bag-of-words feature hashing, a stand-in when the embedding model is unavailable"""
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def encode(self, texts, convert_to_numpy=True, **kwargs):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term in tokenize(text):
+                vectors[row, hash(term) % self.dim] += 1.0
+        return vectors
+
+def synthetic_tickets(rng: random.Random, count: int):
+    tickets = []
+    for i in range(count):
+        module = rng.choice(MODULES)
+        code = f"E{rng.randint(1000, 99999)}"
+        words = rng.sample(WORDS, 6)
+        summary = f"{module} {' '.join(words[:3])} error {code}"
+        tickets.append({
+            'ID': f"INC{1000000 + i}",
+            'CaseNumber': f"INC{1000000 + i}",
+            'Subject': summary,
+            'Summary': summary,
+            'Description': f"Users report {' '.join(words)} in {module}, error code {code}",
+            'Category': module,
+            'CategoryName': module,
+            'Task': rng.choice(["Bug", "Incident", "Request"]),
+            'Priority': f"Severity {rng.randint(1, 3)}",
+            'DefectPhase': rng.choice(PHASES),
+            'RCAReport': (
+                f"## 1. Issue Summary\n{summary}\n\n## 3. Root Causes\n- {words[3]} {words[4]} in {module} caused {code}\n\n"
+                f"## 4. Resolution\n- Fixed {words[5]} handling\n\n## 7. Conclusion\n{module} {words[0]} resolved"
+            )
+        })
+    return tickets
+
+def synthetic_query(rng: random.Random, ticket) -> str:
+    words = ticket['Description'].split()
+    paraphrase = " ".join(rng.sample(words[2:8], 3))
+    return f"Summary: {ticket['Category']} {paraphrase} Description: seeing {ticket['Summary'].split()[-1]} again"
+
+def run(label: str, search, queries, targets, k: int):
+    latencies, hits = [], 0
+    for query, target in zip(queries, targets):
+        start = time.perf_counter()
+        results = search(query)
+        latencies.append(time.perf_counter() - start)
+        hits += any(case['ID'] == target for case, _ in results[:k])
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{label:<20} {hits / len(queries):>10.3f} {statistics.median(latencies) * 1000:>10.2f} {p95 * 1000:>10.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--encoder", choices=["model", "hashing"], default="model")
+    parser.add_argument("--backend", default="numpy")
+    parser.add_argument("--prefilter-candidates", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.encoder == "hashing":
+        vector_utils.load_embedding_model = lambda model_name, backend=None: HashingEncoder()
+
+    rng = random.Random(args.seed)
+    tickets = synthetic_tickets(rng, args.cases)
+    sampled = rng.sample(tickets, min(args.queries, len(tickets)))
+    queries = [synthetic_query(rng, ticket) for ticket in sampled]
+    targets = [ticket['ID'] for ticket in sampled]
+
+    search = vector_utils.VectorSearch(backend=args.backend, store_dir="")
+    start = time.perf_counter()
+    snapshot = search.build_index(tickets, args.k)
+    print(f"{len(tickets)} tickets indexed in {time.perf_counter() - start:.2f}s, {len(queries)} queries, k={args.k}\n")
+
+    vectors = dict(zip(queries, search.encode_queries(queries)))
+
+    def dense(query):
+        return search.search_vector(vectors[query], args.k, snapshot)
+
+    def hybrid(query):
+        return search.hybrid_search(query, vectors[query], args.k, snapshot)
+
+    print(f"{'mode':<20} {'recall@k':>10} {'p50 ms':>10} {'p95 ms':>10}")
+    run("dense", dense, queries, targets, args.k)
+    search.prefilter_min_cases = len(tickets) + 1
+    run("hybrid", hybrid, queries, targets, args.k)
+    search.prefilter_min_cases = 0
+    search.prefilter_candidates = args.prefilter_candidates
+    run("hybrid + prefilter", hybrid, queries, targets, args.k)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Upstream calls, prompt/completion tokens and latency per /predict request for PREDICT_MODE
+dual (two parallel completions, prediction lines parsed) against structured (one
+JSON-schema-constrained completion).
+
+Start the fake OpenAI server first; --ms-per-token makes latency grow with the completion
+length as generation does:
+
+    python benchmarks/fake_openai_server.py --port 9100 --latency-ms 300 --ms-per-token 10
+    python benchmarks/bench_predict_modes.py --requests 100 --concurrency 16
+
+Every request has its own description, so the prediction cache never answers.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def percentile(values, share: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+async def run(client, mode: str, requests: int, concurrency: int):
+    slots = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(number: int):
+        body = {
+            "description": f"Printer queue stuck after restart ({mode} {number})",
+            "new_case": {"Summary": f"Printer queue stuck {number}", "Description": "Jobs stay in the queue after the spooler restart",
+                         "Category": "Printing", "Task": "Incident"}
+        }
+        async with slots:
+            start = time.perf_counter()
+            response = await client.post("/predict", json=body)
+            latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+        assert response.json()["predictions"].get("Module") == "Network", response.json()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(number) for number in range(requests)))
+    return time.perf_counter() - start, latencies
+
+async def main_async(args):
+    os.environ["OPENAI_BASE_URL"] = args.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-predict-benchmark")
+    import httpx
+    import llm_server
+
+    # Count calls and the tokens the upstream reports
+    usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    chat = llm_server.openai_client.chat
+
+    async def recording_chat(*call_args, **kwargs):
+        response = await chat(*call_args, **kwargs)
+        usage["calls"] += 1
+        usage["prompt_tokens"] += response.usage.prompt_tokens
+        usage["completion_tokens"] += response.usage.completion_tokens
+        return response
+
+    llm_server.openai_client.chat = recording_chat
+
+    transport = httpx.ASGITransport(app=llm_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://predict-benchmark", timeout=120) as client:
+        print(f"{args.requests} requests, concurrency {args.concurrency}\n")
+        print(f"{'mode':<11} {'calls/req':>10} {'prompt tok/req':>15} {'compl. tok/req':>15} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'req/s':>7}")
+        for mode in ("dual", "structured"):
+            llm_server.PREDICT_MODE = mode
+            usage.update(calls=0, prompt_tokens=0, completion_tokens=0)
+            elapsed, latencies = await run(client, mode, args.requests, args.concurrency)
+            print(f"{mode:<11} {usage['calls'] / args.requests:>10.2f} {usage['prompt_tokens'] / args.requests:>15.1f} "
+                  f"{usage['completion_tokens'] / args.requests:>15.1f} {statistics.median(latencies) * 1000:>8.1f} "
+                  f"{percentile(latencies, 0.95) * 1000:>8.1f} {args.requests / elapsed:>7.1f}")
+    await llm_server.openai_client.aclose()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--base-url", default="http://127.0.0.1:9100/v1")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Microbenchmark of RCA section extraction: the per-section regexes previously used by
+VectorSearch.create_embeddings against the single-pass rca_parser, cold and cached.
+
+    python benchmarks/bench_rca_parser.py --cases 5000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rca_parser
+
+def legacy_embedding_text(rca_text: str) -> str:
+    """The extraction VectorSearch used before rca_parser, kept for comparison"""
+    field_parts = []
+    key_sections = {name: None for name in rca_parser.SECTION_NAMES}
+    for section in key_sections.keys():
+        pattern = rf"{section}\s*[:\n]+(.*?)(?=(##|\Z|#\s+))"
+        match = re.search(pattern, rca_text, re.DOTALL | re.IGNORECASE)
+        if match:
+            key_sections[section] = match.group(1).strip()
+    for section, content in key_sections.items():
+        if content:
+            clean_section = re.sub(r'^\d+\.\s*', '', section)
+            clean_section = re.sub(r'[^\w\s]', '', clean_section).strip()
+            field_parts.append(f"{clean_section}: {content}")
+    if not any(key_sections.values()):
+        field_parts.append(f"RCA: {rca_text}")
+    return " ".join(field_parts)
+
+# Reports whose content looks like markup, compared along with the synthetic ones
+EDGE_CASE_REPORTS = [
+    # An issue reference at the start of a line is content, not a heading
+    "## 3. Root Causes\n#4521 regression in build\nmore detail\n\n## 4. Resolution\nfixed",
+    "## 3. Root Causes\n- Spooler deadlock\n#12 and #13 describe the same hang\n## 4. Resolution\n- Restarted the spooler",
+]
+
+def synthetic_report(rng: random.Random, paragraph_words: int) -> str:
+    words = ["printer", "network", "timeout", "database", "deadlock", "cache", "login", "service",
+             "config", "deploy", "memory", "queue", "retry", "disk", "certificate", "proxy"]
+    def paragraph():
+        return " ".join(rng.choice(words) for _ in range(paragraph_words))
+    return (
+        f"# Root Cause Analysis Report (RCA) - {rng.choice(words).title()} Issue\n\n"
+        f"## 1. Issue Summary\n- **Summary**: {paragraph()}\n\n"
+        f"## 2. Impact Analysis\n- **Affected Module**: {rng.choice(words)}\n- **Severity**: Severity {rng.randint(1, 3)}\n"
+        f"- **Priority**: Medium\n- **Defect Phase**: Production\n\n"
+        f"## 3. Root Causes\n- {paragraph()}\n- {paragraph()}\n\n"
+        f"## 4. Resolution\n- **Fix Applied**: {paragraph()}\n\n"
+        f"## 5. Preventive Measures\n- **General Measure**: {paragraph()}\n\n"
+        f"## 6. Supplementary Information\n- **Logs**: {paragraph()}\n\n"
+        f"## 7. Conclusion\n{paragraph()}\n"
+    )
+
+def timed(label: str, func, reports):
+    start = time.perf_counter()
+    for report in reports:
+        func(report)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms total  {elapsed / len(reports) * 1e6:8.1f} us/report")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=5000)
+    parser.add_argument("--paragraph-words", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    reports = [synthetic_report(rng, args.paragraph_words) for _ in range(args.cases)] + EDGE_CASE_REPORTS
+    print(f"{len(reports)} reports, {sum(map(len, reports)) / len(reports):.0f} characters on average\n")
+
+    mismatches = sum(legacy_embedding_text(report) != rca_parser.rca_embedding_text(report) for report in reports)
+    print(f"Reports where the two extractors disagree: {mismatches}\n")
+
+    rca_parser._cache.clear()
+    legacy = timed("legacy per-section regexes", legacy_embedding_text, reports)
+    rca_parser._cache.clear()
+    cold = timed("rca_parser, cold cache", rca_parser.rca_embedding_text, reports)
+    cached = timed("rca_parser, cached", rca_parser.rca_embedding_text, reports)
+    print(f"\nspeedup cold: {legacy / cold:.1f}x, cached: {legacy / cached:.1f}x")
+
+if __name__ == "__main__":
+    main()
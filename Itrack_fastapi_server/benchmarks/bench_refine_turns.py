@@ -0,0 +1,81 @@
+"""
+Request body size, prompt tokens and latency per /refine_rca turn against the number of
+turns in a session: the full protocol, where the client posts the whole RCA each turn,
+against /refine_rca/delta, where it posts only the field it changed.
+
+Start the fake OpenAI server first, it echoes the RCA state back as the refined RCA:
+
+    python benchmarks/fake_openai_server.py --port 9100 --latency-ms 200
+    python benchmarks/bench_refine_turns.py --turns 12
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=12)
+    parser.add_argument("--base-url", default="http://127.0.0.1:9100/v1")
+    args = parser.parse_args()
+
+    os.environ["OPENAI_BASE_URL"] = args.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-refine-benchmark")
+    os.environ["VECTOR_STORE_DIR"] = ""
+    from fastapi.testclient import TestClient
+    import llm_server
+
+    # Record the prompt tokens the upstream reports for each call
+    prompt_tokens = []
+    chat = llm_server.openai_client.chat
+
+    async def recording_chat(*call_args, **kwargs):
+        response = await chat(*call_args, **kwargs)
+        prompt_tokens.append(response.usage.prompt_tokens)
+        return response
+
+    llm_server.openai_client.chat = recording_chat
+
+    empty_section = {"dynamic_fields": []}
+    rca = {
+        "category": "Printing", "task": "Incident", "summary": "Printer queue stuck",
+        "description": "Jobs stay in the queue after the spooler restart", "conclusion": "",
+        "root_causes": ["Spooler deadlock on a stale job"],
+        "impact_analysis": {"affected_module": "Printing", "severity": "Severity 2", "priority": "Medium",
+                            "defect_phase": "Production", "dynamic_fields": []},
+        "resolution": {"fix_applied": "Restarted the spooler", "dynamic_fields": []},
+        "preventive_measures": {"general_measure": "Monitor the queue", "dynamic_fields": []},
+        "supplementary_info": empty_section, "additional_questions": empty_section
+    }
+
+    with TestClient(llm_server.app) as client:
+        print(f"{'turn':>5} {'full body B':>12} {'full prompt':>12} {'full ms':>8} "
+              f"{'delta body B':>13} {'delta prompt':>13} {'delta ms':>9}")
+        state = dict(rca)
+        for turn in range(1, args.turns + 1):
+            # The full protocol resends the last reply with the user's edit, as the form does
+            full_body = json.dumps({**state, "session_id": "bench-full", "is_final": False,
+                                    "root_causes": state["root_causes"] + [f"Root cause found in turn {turn}"]})
+            start = time.perf_counter()
+            response = client.post("/refine_rca", content=full_body, headers={"Content-Type": "application/json"})
+            full_ms = (time.perf_counter() - start) * 1000
+            response.raise_for_status()
+            state = {key: value for key, value in response.json().items() if key in rca}
+            full_prompt = prompt_tokens[-1]
+
+            changes = dict(rca) if turn == 1 else {"conclusion": f"Updated in turn {turn}"}
+            delta_body = json.dumps({"session_id": "bench-delta", "changes": changes})
+            start = time.perf_counter()
+            response = client.post("/refine_rca/delta", content=delta_body, headers={"Content-Type": "application/json"})
+            delta_ms = (time.perf_counter() - start) * 1000
+            response.raise_for_status()
+            delta_prompt = prompt_tokens[-1]
+
+            print(f"{turn:>5} {len(full_body):>12} {full_prompt:>12} {full_ms:>8.1f} "
+                  f"{len(delta_body):>13} {delta_prompt:>13} {delta_ms:>9.1f}")
+
+if __name__ == "__main__":
+    main()
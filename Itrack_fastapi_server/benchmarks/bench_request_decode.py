@@ -0,0 +1,76 @@
+"""
+Request decode time against history size for /predict and /search_similar_cases: JSON
+parsing plus pydantic validation of the body, with the former shared model (historical_cases
+validated as List[dict]) against the current per-endpoint models. "predict, no history" is
+the body the MVC controller now sends to /predict.
+
+    python benchmarks/bench_request_decode.py --sizes 0 100 1000 10000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-decode-benchmark")
+
+from pydantic import BaseModel
+from llm_server import PredictionRequest, SearchRequest
+
+class LegacyPredictionRequest(BaseModel):
+    """The model both endpoints used before they were split"""
+    description: str
+    historical_cases: List[dict]
+    new_case: Optional[dict] = None
+
+def payload(cases: int, with_history: bool = True) -> bytes:
+    history = [
+        {
+            "ID": str(i), "CaseNumber": f"INC{1000000 + i}", "Subject": f"Printer queue stuck {i}",
+            "Summary": f"Printer queue stuck {i}", "Description": "Jobs stay in the queue after the spooler restart. " * 8,
+            "Category": "Printing", "CategoryName": "Printing", "Task": "Incident", "TaskName": "Incident",
+            "Priority": "Severity 2", "PREFERENCE": 2, "DefectPhase": "Production",
+            "RCAReport": "## 3. Root Causes\n- Spooler deadlock on a stale job\n" * 20
+        }
+        for i in range(cases)
+    ]
+    body = {
+        "description": "Printer queue stuck after restart",
+        "new_case": {"Summary": "Printer queue stuck", "Category": "Printing"}
+    }
+    if with_history:
+        body["historical_cases"] = history
+    return json.dumps(body).encode("utf-8")
+
+def timed(model, body: bytes, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        model.model_validate(json.loads(body))
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'cases':>7} {'body KB':>10} {'json ms':>9} {'legacy ms':>10} {'predict ms':>11} "
+          f"{'predict, no history ms':>23} {'search ms':>10}")
+    for size in args.sizes:
+        body = payload(size)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            json.loads(body)
+        parse = (time.perf_counter() - start) / args.repeat
+        legacy = timed(LegacyPredictionRequest, body, args.repeat)
+        predict = timed(PredictionRequest, body, args.repeat)
+        predict_only = timed(PredictionRequest, payload(size, with_history=False), args.repeat)
+        search = timed(SearchRequest, body, args.repeat)
+        print(f"{size:>7} {len(body) / 1024:>10.1f} {parse * 1000:>9.2f} {legacy * 1000:>10.2f} "
+              f"{predict * 1000:>11.2f} {predict_only * 1000:>23.3f} {search * 1000:>10.2f}")
+    print("\nSearches against cases ingested through /cases/upsert do not send the history either")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Peak memory and time of turning a /search_similar_cases body into historical cases: the former
+path (json.loads of the whole body, then a cleaned dict per case) against the streaming path
+(iter_json_object over 64 KB chunks, one CaseRecord per case). Both keep the cases they
+produce, as the case store does; the difference is the transient overhead of decoding.
+
+    python benchmarks/bench_search_ingest.py --sizes 1000 10000 50000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from case_stream import ARRAY_START, CaseRecord, iter_json_object
+
+CHUNK_SIZE = 64 * 1024
+
+def payload(cases: int) -> bytes:
+    history = [
+        {
+            "ID": str(i), "CaseNumber": f"INC{1000000 + i}", "Subject": f"Printer queue stuck {i}",
+            "Description": "Jobs stay in the queue after the spooler restart. " * 8,
+            "Category": "Printing", "Task": "Incident", "Priority": "Severity 2", "DefectPhase": "Production",
+            "CreatedBy": "someone", "Attachments": [], "RCAReport": "## 3. Root Causes\n- Spooler deadlock on a stale job\n" * 20
+        }
+        for i in range(cases)
+    ]
+    return json.dumps({"description": "Printer queue stuck", "historical_cases": history}).encode("utf-8")
+
+def legacy(body: bytes):
+    data = json.loads(body)
+    return [
+        {
+            'ID': case.get('ID', 'Unknown'),
+            'CaseNumber': case.get('CaseNumber', case.get('ID', 'Unknown')),
+            'Subject': case.get('Subject', ''),
+            'Summary': case.get('Summary', case.get('Subject', '')),
+            'Description': case.get('Description', ''),
+            'Category': case.get('Category', ''),
+            'CategoryName': case.get('CategoryName', case.get('Category', '')),
+            'Task': case.get('Task', ''),
+            'TaskName': case.get('TaskName', case.get('Task', '')),
+            'Priority': case.get('Priority', ''),
+            'DefectPhase': case.get('DefectPhase', ''),
+            'RCAReport': case.get('RCAReport', '')
+        }
+        for case in data["historical_cases"] if case is not None
+    ]
+
+async def chunks(body: bytes):
+    for start in range(0, len(body), CHUNK_SIZE):
+        yield body[start:start + CHUNK_SIZE]
+
+async def streaming(body: bytes):
+    records = []
+    async for key, value in iter_json_object(chunks(body), "historical_cases"):
+        if key == "historical_cases" and value is not ARRAY_START and isinstance(value, dict):
+            records.append(CaseRecord.from_dict(value))
+    return records
+
+def measure(func, body: bytes):
+    tracemalloc.start()
+    start = time.perf_counter()
+    cases = func(body)
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(cases), elapsed, retained, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    args = parser.parse_args()
+
+    mb = 1024 * 1024
+    print(f"{'cases':>7} {'body MB':>8} {'path':<10} {'ms':>9} {'kept MB':>9} {'peak MB':>9} {'overhead MB':>12}")
+    for size in args.sizes:
+        body = payload(size)
+        for label, func in (("legacy", legacy), ("streaming", lambda b: asyncio.run(streaming(b)))):
+            count, elapsed, retained, peak = measure(func, body)
+            assert count == size
+            print(f"{size:>7} {len(body) / mb:>8.1f} {label:<10} {elapsed * 1000:>9.1f} {retained / mb:>9.1f} "
+                  f"{peak / mb:>9.1f} {(peak - retained) / mb:>12.1f}")
+
+if __name__ == "__main__":
+    main()
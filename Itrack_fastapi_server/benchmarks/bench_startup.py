@@ -0,0 +1,103 @@
+"""
+Startup benchmark of llm_server: the cost of importing the module, the time until uvicorn
+accepts connections, and the time until /ready reports the vector search as loaded.
+
+Every measurement runs in a fresh interpreter so that no module or model is already cached.
+A dummy OPENAI_API_KEY is used when none is set; no OpenAI request is made.
+
+    python benchmarks/bench_startup.py --runs 3
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import llm_server; print(time.perf_counter() - start)"
+
+def child_env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-startup-benchmark")
+    return env
+
+def measure_import() -> float:
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=SERVER_DIR, env=child_env(),
+                            check=True, capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def get_status(url: str) -> int:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+def measure_server(timeout: float):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "llm_server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVER_DIR, env=child_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    accept_seconds = ready_seconds = None
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+            try:
+                status = get_status(f"{base_url}/ready")
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.02)
+                continue
+            if accept_seconds is None:
+                accept_seconds = time.perf_counter() - start
+            if status == 200:
+                ready_seconds = time.perf_counter() - start
+                break
+            time.sleep(0.05)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return accept_seconds, ready_seconds
+
+def summary(values) -> str:
+    values = [v for v in values if v is not None]
+    if not values:
+        return "n/a"
+    return f"median {statistics.median(values) * 1000:8.1f} ms  max {max(values) * 1000:8.1f} ms"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=300.0, help="Seconds to wait for /ready in each run")
+    args = parser.parse_args()
+
+    imports, accepts, readies = [], [], []
+    for run in range(args.runs):
+        imports.append(measure_import())
+        accept_seconds, ready_seconds = measure_server(args.timeout)
+        accepts.append(accept_seconds)
+        readies.append(ready_seconds)
+        print(f"run {run + 1}: import {imports[-1] * 1000:.1f} ms, accepting after "
+              f"{(accept_seconds or 0) * 1000:.1f} ms, ready after {(ready_seconds or 0) * 1000:.1f} ms")
+
+    print(f"\n{'import llm_server':<22} {summary(imports)}")
+    print(f"{'accepting requests':<22} {summary(accepts)}")
+    print(f"{'/ready returns 200':<22} {summary(readies)}")
+    if any(value is None for value in readies):
+        print(f"WARNING: /ready did not return 200 within {args.timeout:.0f}s in some runs")
+
+if __name__ == "__main__":
+    main()
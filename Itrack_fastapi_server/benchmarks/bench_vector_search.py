@@ -0,0 +1,65 @@
+"""
+Microbenchmark of the exact search backends on random embeddings: sklearn NearestNeighbors
+against the pre-normalized numpy matrix (and FAISS IndexFlatIP when installed), for single
+queries and query batches. Every backend is checked against the numpy top-k.
+
+    python benchmarks/bench_vector_search.py --cases 20000 --dim 384 --batch 32
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from vector_backends import create_backend, normalize_rows
+
+def timed(backend, index, queries, k: int, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        backend.search(index, queries, k)
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    # VectorSearch hands the backends normalized rows
+    embeddings = normalize_rows(rng.standard_normal((args.cases, args.dim)))
+    queries = rng.standard_normal((args.batch, args.dim)).astype(np.float32)
+
+    names = ["numpy", "sklearn"]
+    try:
+        import faiss  # noqa: F401
+        names.append("faiss_flat")
+    except ImportError:
+        pass
+
+    reference = None
+    print(f"{args.cases} cases, dim {args.dim}, k={args.k}, batch {args.batch}\n")
+    print(f"{'backend':<12} {'build ms':>10} {'1 query ms':>12} {'batch ms':>10} {'batch/query ms':>15} {'top-k match':>12}")
+    for name in names:
+        backend = create_backend(name)
+        start = time.perf_counter()
+        index = backend.build(embeddings)
+        build_seconds = time.perf_counter() - start
+
+        single = timed(backend, index, queries[:1], args.k, args.repeat)
+        batch = timed(backend, index, queries, args.k, max(1, args.repeat // 5))
+        _, indices = backend.search(index, queries, args.k)
+        if reference is None:
+            reference = indices
+        match = np.mean([set(a) == set(b) for a, b in zip(indices.tolist(), reference.tolist())])
+        print(f"{name:<12} {build_seconds * 1000:>10.1f} {single * 1000:>12.3f} {batch * 1000:>10.3f} "
+              f"{batch / args.batch * 1000:>15.3f} {match:>12.3f}")
+
+if __name__ == "__main__":
+    main()
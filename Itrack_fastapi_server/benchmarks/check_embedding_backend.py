@@ -0,0 +1,88 @@
+"""
+Accuracy and speed check of an embedding backend against the fp32 PyTorch model.
+
+For every fixture query the top-k cases found with the candidate backend are compared with
+the fp32 top-k; the script fails when the mean overlap is below --min-overlap. It also
+reports per-query latency and bulk indexing throughput of both backends.
+
+    python benchmarks/check_embedding_backend.py --backend int8
+    python benchmarks/check_embedding_backend.py --backend onnx --threads 4 --repeat 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from embedding_models import load_embedding_model
+from rca_parser import rca_embedding_text
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "rca_corpus.json")
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+def top_k(case_vectors: np.ndarray, query_vectors: np.ndarray, k: int) -> np.ndarray:
+    similarities = normalize(query_vectors) @ normalize(case_vectors).T
+    return np.argsort(-similarities, axis=1)[:, :k]
+
+def measure(model, texts, queries, repeat: int):
+    start = time.perf_counter()
+    case_vectors = model.encode(texts * repeat, convert_to_numpy=True, batch_size=64)[:len(texts)]
+    bulk_seconds = time.perf_counter() - start
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        model.encode([query], convert_to_numpy=True)
+        latencies.append(time.perf_counter() - start)
+    query_vectors = model.encode(queries, convert_to_numpy=True)
+    return case_vectors, query_vectors, len(texts) * repeat / bulk_seconds, statistics.median(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", required=True, choices=["torch", "onnx", "int8"])
+    parser.add_argument("--model", default="paraphrase-multilingual-MiniLM-L12-v2")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=10, help="Embed the corpus this many times for the throughput figure")
+    parser.add_argument("--min-overlap", type=float, default=0.8)
+    args = parser.parse_args()
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+    texts = [rca_embedding_text(case["RCAReport"]) for case in corpus["cases"]]
+    queries = corpus["queries"]
+    k = min(args.k, len(texts))
+
+    reference = load_embedding_model(args.model, "torch", args.threads)
+    candidate = load_embedding_model(args.model, args.backend, args.threads)
+
+    ref_cases, ref_queries, ref_throughput, ref_latency = measure(reference, texts, queries, args.repeat)
+    cand_cases, cand_queries, cand_throughput, cand_latency = measure(candidate, texts, queries, args.repeat)
+
+    expected = top_k(ref_cases, ref_queries, k)
+    actual = top_k(cand_cases, cand_queries, k)
+    overlaps = [len(set(e) & set(a)) / k for e, a in zip(expected, actual)]
+    mean_overlap = sum(overlaps) / len(overlaps)
+    top1 = sum(e[0] == a[0] for e, a in zip(expected, actual)) / len(expected)
+
+    print(f"{len(texts)} cases, {len(queries)} queries, k={k}")
+    print(f"{'backend':<10} {'cases/s':>10} {'query p50 ms':>14}")
+    print(f"{'torch':<10} {ref_throughput:>10.1f} {ref_latency * 1000:>14.2f}")
+    print(f"{args.backend:<10} {cand_throughput:>10.1f} {cand_latency * 1000:>14.2f}")
+    print(f"top-{k} overlap with fp32: mean {mean_overlap:.3f}, min {min(overlaps):.3f}; top-1 agreement {top1:.3f}")
+
+    if mean_overlap < args.min_overlap:
+        print(f"FAIL: mean overlap {mean_overlap:.3f} is below {args.min_overlap}")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Local stand-in for the OpenAI chat completions API, for exercising the service without
+spending tokens.
+
+Run it, then point the service at it:
+
+    python benchmarks/fake_openai_server.py --port 9100 --latency-ms 200 --ms-per-token 10 --fail-every 5
+    set OPENAI_BASE_URL=http://127.0.0.1:9100/v1
+
+--fail-every N answers every Nth request with 429 and a Retry-After header, to exercise
+the client's retry path; --fail-first N does so for the first N requests only.
+--stream-error-after N ends streamed replies with an error event after N chunks.
+
+The tests import `app` and drive `config` and `counters` directly.
+"""
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import argparse
+import asyncio
+import json
+import time
+import uuid
+import uvicorn
+
+PREDICTION_REPLY = "1. Module: Network\n2. Priority: Medium\n3. Severity: Severity 2"
+RCA_REPLY = "1. Possible root causes: configuration drift\n2. Suggested investigation steps: check recent changes\n3. Potential solutions: roll back the change"
+STRUCTURED_PREDICTION_REPLY = json.dumps({
+    "predictions": {"Module": "Network", "Priority": "Medium", "Severity": "Severity 2"},
+    "rcaSuggestion": RCA_REPLY
+})
+REPORT_REPLY = "# Root Cause Analysis Report\n## 1. Issue Summary\nFake report.\n## 7. Conclusion\nFake conclusion."
+
+DEFAULT_CONFIG = {"latency_ms": 0.0, "ms_per_token": 0.0, "fail_every": 0, "fail_first": 0, "retry_after": 1.0,
+                  "stream_error_after": 0}
+config = dict(DEFAULT_CONFIG)
+# Requests received, and the most that were being answered at the same time
+counters = {"requests": 0, "in_flight": 0, "max_in_flight": 0}
+app = FastAPI(title="Fake OpenAI")
+
+def reset(**overrides):
+    """Restore the default behaviour with `overrides` applied and zero the counters"""
+    config.clear()
+    config.update(DEFAULT_CONFIG, **overrides)
+    counters.update(requests=0, in_flight=0, max_in_flight=0)
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def reply_for(messages, response_format=None) -> str:
+    system = messages[0].get("content", "") if messages else ""
+    prompt = messages[-1].get("content", "") if messages else ""
+    if response_format and response_format.get("type") == "json_schema":
+        # The only structured request is the single-call /predict
+        return STRUCTURED_PREDICTION_REPLY
+    if "FINAL RCA REPORT TEMPLATE" in system:
+        return REPORT_REPLY
+    if "predict the following fields" in prompt:
+        return PREDICTION_REPLY
+    if "root cause analysis for the new ticket" in prompt:
+        return RCA_REPLY
+    if prompt.lstrip().startswith("{"):
+        # Refine turns send the RCA state as JSON, echo it back
+        return prompt
+    if prompt.startswith("Current RCA state:\n"):
+        # Delta refine turns send the state on the line after the label
+        return prompt.split("\n", 2)[1]
+    return REPORT_REPLY
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    counters["requests"] += 1
+    number = counters["requests"]
+    if number <= config["fail_first"] or (config["fail_every"] and number % config["fail_every"] == 0):
+        return JSONResponse(
+            status_code=429,
+            headers={"retry-after": f"{config['retry_after']:g}"},
+            content={"error": {"message": "Rate limit reached (fake)", "type": "rate_limit_error"}}
+        )
+    messages = body.get("messages", [])
+    content = reply_for(messages, body.get("response_format"))
+    counters["in_flight"] += 1
+    counters["max_in_flight"] = max(counters["max_in_flight"], counters["in_flight"])
+    try:
+        await asyncio.sleep((config["latency_ms"] + config["ms_per_token"] * estimate_tokens(content)) / 1000)
+    finally:
+        counters["in_flight"] -= 1
+    prompt_tokens = sum(estimate_tokens(str(message.get("content", ""))) for message in messages)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    model = body.get("model", "gpt-3.5-turbo")
+
+    if body.get("stream"):
+        async def events():
+            for number, start in enumerate(range(0, len(content), 16)):
+                if config["stream_error_after"] and number == config["stream_error_after"]:
+                    error = {"error": {"message": "Stream interrupted (fake)", "type": "server_error"}}
+                    yield f"data: {json.dumps(error)}\n\n"
+                    return
+                chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {"content": content[start:start + 16]}, "finish_reason": None}]
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(0.005)
+            done = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+            }
+            yield f"data: {json.dumps(done)}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": estimate_tokens(content),
+            "total_tokens": prompt_tokens + estimate_tokens(content)
+        }
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay before each response")
+    parser.add_argument("--ms-per-token", type=float, default=0.0, help="Extra delay per completion token, as generation takes")
+    parser.add_argument("--fail-every", type=int, default=0, help="Answer every Nth request with 429")
+    parser.add_argument("--fail-first", type=int, default=0, help="Answer the first N requests with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429 responses")
+    parser.add_argument("--stream-error-after", type=int, default=0, help="End streamed replies with an error after N chunks")
+    args = parser.parse_args()
+    reset(latency_ms=args.latency_ms, ms_per_token=args.ms_per_token, fail_every=args.fail_every, fail_first=args.fail_first,
+          retry_after=args.retry_after, stream_error_after=args.stream_error_after)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
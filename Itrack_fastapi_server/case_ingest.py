@@ -0,0 +1,126 @@
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import time
+import uuid
+
+from metrics import QUEUE_WAIT
+
+logger = logging.getLogger("case_ingest")
+
+class CaseIngestWorker:
+    """Background worker applying batched case upserts and deletes to the case index
+
+    Submitted jobs are queued and applied in order. Jobs that are pending together are
+    coalesced into one `apply` call, up to `max_batch` changes, so new cases are embedded
+    in large batches instead of one request at a time. `apply` gets the changes of each
+    job and returns the counts of each job.
+    """
+    def __init__(self, apply: Callable[[List[List[Tuple[str, Any]]]], Awaitable[List[Dict[str, int]]]],
+                 max_batch: int = 5000, max_jobs: int = 1000):
+        self._apply = apply
+        self.max_batch = max(max_batch, 1)
+        self.max_jobs = max_jobs
+        self._queue: "deque[str]" = deque()
+        self._wakeup = asyncio.Event()
+        self._changes: Dict[str, List[Tuple[str, Any]]] = {}
+        self._done: Dict[str, asyncio.Event] = {}
+        self._queued_at: Dict[str, float] = {}
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {"jobs": 0, "batches": 0, "upserted": 0, "deleted": 0, "skipped": 0, "failed": 0}
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def submit(self, changes: List[Tuple[str, Any]]) -> str:
+        """Queue ("upsert", case) / ("delete", case ID) changes, returns the job ID"""
+        job_id = uuid.uuid4().hex
+        self._changes[job_id] = changes
+        self._done[job_id] = asyncio.Event()
+        self._queued_at[job_id] = time.perf_counter()
+        self.jobs[job_id] = {
+            "job_id": job_id,
+            "status": "queued",
+            "changes": len(changes),
+            "submitted_at": time.time(),
+            "result": None,
+            "error": None,
+            "seconds": None
+        }
+        # Keep the status of recent jobs only
+        while len(self.jobs) > self.max_jobs:
+            if next(iter(self.jobs.values()))["status"] in ("queued", "running"):
+                break
+            self.jobs.popitem(last=False)
+        self._queue.append(job_id)
+        self._wakeup.set()
+        self.counters["jobs"] += 1
+        return job_id
+
+    async def wait(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Wait until a job has been applied or failed and return its status, None for an unknown job"""
+        # Taken before waiting, newer jobs may evict it from `jobs` once it is done
+        job = self.jobs.get(job_id)
+        event = self._done.get(job_id)
+        if event is not None:
+            await event.wait()
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "queued_jobs": len(self._queue),
+            "queued_changes": sum(len(changes) for changes in self._changes.values())
+        }
+
+    async def _run(self):
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            batch = [self._queue.popleft()]
+            size = len(self._changes[batch[0]])
+            # Coalesce jobs that are already waiting, keeping their order
+            while self._queue and size + len(self._changes[self._queue[0]]) <= self.max_batch:
+                size += len(self._changes[self._queue[0]])
+                batch.append(self._queue.popleft())
+            await self._apply_batch(batch)
+
+    async def _apply_batch(self, batch: List[str]):
+        start_time = time.perf_counter()
+        for job_id in batch:
+            self.jobs[job_id]["status"] = "running"
+            QUEUE_WAIT.observe(start_time - self._queued_at.pop(job_id, start_time), queue="case_ingest")
+        groups = [self._changes[job_id] for job_id in batch]
+        changes = sum(len(group) for group in groups)
+        try:
+            results = await self._apply(groups)
+            status, error = "done", None
+            for result in results:
+                for key in ("upserted", "deleted", "skipped"):
+                    self.counters[key] += result.get(key, 0)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to apply {changes} case changes: {str(e)}", exc_info=True)
+            results, status, error = [None] * len(batch), "failed", str(e)
+            self.counters["failed"] += len(batch)
+        self.counters["batches"] += 1
+        seconds = round(time.perf_counter() - start_time, 3)
+        for job_id, result in zip(batch, results):
+            self.jobs[job_id].update(status=status, result=result, error=error, seconds=seconds)
+            self._changes.pop(job_id, None)
+            self._done.pop(job_id).set()
+        logger.info(f"Applied {len(batch)} jobs with {changes} case changes ({status}), time taken: {seconds:.3f}s")
@@ -0,0 +1,198 @@
+from collections.abc import Mapping
+from typing import Any, AsyncIterator, Dict, Iterator, Tuple
+import codecs
+import json
+
+# Fields kept for a historical case, everything else in a posted case is dropped
+CASE_FIELDS = (
+    'ID', 'CaseNumber', 'Subject', 'Summary', 'Description', 'Category', 'CategoryName',
+    'Task', 'TaskName', 'Priority', 'PREFERENCE', 'DefectPhase', 'RCAReport'
+)
+
+class CaseRecord(Mapping):
+    """Compact read-only historical case with exactly CASE_FIELDS
+
+    Behaves like the cleaned case dict it replaces (get, [], in, iteration, dict(record)),
+    but stores its fields in slots, which is about half the memory of a dict per case.
+    """
+    __slots__ = CASE_FIELDS
+
+    def __init__(self, **fields: Any):
+        for field in CASE_FIELDS:
+            object.__setattr__(self, field, fields.get(field, ''))
+
+    @classmethod
+    def from_dict(cls, case: Dict[str, Any]) -> "CaseRecord":
+        """Normalize a posted case, missing fields get default values"""
+        case_id = case.get('ID', 'Unknown')
+        subject = case.get('Subject', '')
+        category = case.get('Category', '')
+        task = case.get('Task', '')
+        # The MVC form posts the priority ID under several names
+        preference = next((case[key] for key in ('PREFERENCE', 'X_PREFERENCE', 'x_preference', 'PREFERENCE_STR')
+                           if case.get(key) is not None), '')
+        return cls(
+            ID=case_id,
+            CaseNumber=case.get('CaseNumber', case_id),
+            Subject=subject,
+            Summary=case.get('Summary', subject),
+            Description=case.get('Description', ''),
+            Category=category,
+            CategoryName=case.get('CategoryName', category),
+            Task=task,
+            TaskName=case.get('TaskName', task),
+            Priority=case.get('Priority', ''),
+            PREFERENCE=preference,
+            DefectPhase=case.get('DefectPhase', ''),
+            RCAReport=case.get('RCAReport', '')
+        )
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError("CaseRecord is read-only")
+
+    def __getitem__(self, field: str) -> Any:
+        if field not in CASE_FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(CASE_FIELDS)
+
+    def __len__(self) -> int:
+        return len(CASE_FIELDS)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, CaseRecord):
+            return all(getattr(self, field) == getattr(other, field) for field in CASE_FIELDS)
+        return super().__eq__(other)
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return (_restore_record, (dict(self),))
+
+    def __repr__(self) -> str:
+        return f"CaseRecord(ID={self.ID!r}, Subject={self.Subject!r})"
+
+def _restore_record(fields: Dict[str, Any]) -> CaseRecord:
+    return CaseRecord(**fields)
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+class _Buffer:
+    """Text decoded so far from a byte stream, consumed from the front"""
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self._chunks = chunks.__aiter__()
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    async def fill(self) -> bool:
+        """Append the next chunk, returns False at the end of the stream"""
+        if self.eof:
+            return False
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            chunk, self.eof = b"", True
+        # Drop the consumed prefix so the buffer only holds the value being parsed
+        self.text = self.text[self.pos:] + self._decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+        return not self.eof
+
+    async def peek(self) -> str:
+        """Next non-whitespace character, skipping it is up to the caller"""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not await self.fill():
+                raise ValueError("Unexpected end of JSON body")
+
+    async def expect_end(self):
+        """Check that only whitespace is left in the stream"""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                raise ValueError("Extra data after the JSON body")
+            if not await self.fill():
+                return
+
+    async def expect(self, char: str):
+        if await self.peek() != char:
+            raise ValueError(f"Expected '{char}' in JSON body")
+        self.pos += 1
+
+    async def value(self) -> Any:
+        """Decode one complete JSON value, reading more chunks until it is complete"""
+        await self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            else:
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self.text) or self.eof or not isinstance(value, (int, float)):
+                    self.pos = end
+                    return value
+            # Read until the pending text has doubled before decoding again, so a value
+            # spread over many chunks is only decoded a logarithmic number of times
+            target = 2 * (len(self.text) - self.pos)
+            while len(self.text) - self.pos < target and await self.fill():
+                pass
+
+class _ArrayStart:
+    def __repr__(self) -> str:
+        return "ARRAY_START"
+
+# Yielded once for the streamed array before its elements, also when it is empty
+ARRAY_START = _ArrayStart()
+
+async def iter_json_object(chunks: AsyncIterator[bytes], stream_key: str) -> AsyncIterator[Tuple[str, Any]]:
+    """Parse a JSON object body as it arrives
+
+    Yields (key, value) for every member of the top-level object. The array under
+    `stream_key` is yielded as (stream_key, ARRAY_START) followed by one (stream_key, element)
+    per element, so it is never held in memory as a whole. Raises ValueError on malformed JSON,
+    including anything but whitespace after the object.
+    """
+    buffer = _Buffer(chunks)
+    await buffer.expect("{")
+    if await buffer.peek() == "}":
+        buffer.pos += 1
+        await buffer.expect_end()
+        return
+    while True:
+        key = await buffer.value()
+        if not isinstance(key, str):
+            raise ValueError("Expected a string key in JSON body")
+        await buffer.expect(":")
+        if key == stream_key and await buffer.peek() == "[":
+            buffer.pos += 1
+            yield key, ARRAY_START
+            if await buffer.peek() == "]":
+                buffer.pos += 1
+            else:
+                while True:
+                    yield key, await buffer.value()
+                    separator = await buffer.peek()
+                    buffer.pos += 1
+                    if separator == "]":
+                        break
+                    if separator != ",":
+                        raise ValueError(f"Expected ',' or ']' in '{stream_key}'")
+        else:
+            yield key, await buffer.value()
+        separator = await buffer.peek()
+        buffer.pos += 1
+        if separator == "}":
+            await buffer.expect_end()
+            return
+        if separator != ",":
+            raise ValueError("Expected ',' or '}' in JSON body")
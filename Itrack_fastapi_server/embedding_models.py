@@ -0,0 +1,61 @@
+from typing import Any, Optional
+import logging
+import os
+import time
+
+logger = logging.getLogger("vector_search")
+
+# Backends for the SentenceTransformer model: plain PyTorch fp32, ONNX Runtime, and
+# PyTorch with dynamic int8 quantization of the Linear layers
+EMBEDDING_BACKENDS = ("torch", "onnx", "int8")
+
+def embedding_backend_name(backend: Optional[str] = None) -> str:
+    """Resolve the embedding backend from the argument or the EMBEDDING_BACKEND environment variable"""
+    backend = (backend or os.getenv("EMBEDDING_BACKEND", "torch")).strip().lower()
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}, expected one of {', '.join(EMBEDDING_BACKENDS)}")
+    return backend
+
+def load_embedding_model(model_name: str, backend: Optional[str] = None, threads: Optional[int] = None) -> Any:
+    """Load a SentenceTransformer model on the selected CPU backend
+
+    Args:
+        model_name: SentenceTransformer model name
+        backend: torch, onnx or int8, defaults to the EMBEDDING_BACKEND environment variable
+        threads: Intra-op thread count, defaults to EMBEDDING_THREADS; 0 keeps the library default
+
+    The onnx backend needs sentence-transformers>=3.2 with optimum[onnxruntime]. Set
+    EMBEDDING_ONNX_FILE to load a specific export, e.g. a quantized onnx/model_qint8_avx2.onnx.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    backend = embedding_backend_name(backend)
+    if threads is None:
+        threads = int(os.getenv("EMBEDDING_THREADS", "0"))
+    start_time = time.perf_counter()
+
+    if backend == "onnx":
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("The onnx embedding backend requires onnxruntime, install optimum[onnxruntime]") from e
+        model_kwargs = {"provider": "CPUExecutionProvider"}
+        if threads > 0:
+            session_options = onnxruntime.SessionOptions()
+            session_options.intra_op_num_threads = threads
+            model_kwargs["session_options"] = session_options
+        onnx_file = os.getenv("EMBEDDING_ONNX_FILE")
+        if onnx_file:
+            model_kwargs["file_name"] = onnx_file
+        model = SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+    else:
+        import torch
+        if threads > 0:
+            torch.set_num_threads(threads)
+        model = SentenceTransformer(model_name, device="cpu")
+        if backend == "int8":
+            torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        model.eval()
+
+    logger.info(f"Embedding model {model_name} loaded on {backend} backend (threads: {threads or 'default'}), time taken: {time.perf_counter() - start_time:.2f} seconds")
+    return model
@@ -0,0 +1,110 @@
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+import re
+
+from rca_parser import parse_rca_sections
+
+# PREFERENCE holds the ticket priority as an ID, as in the MVC Preferences enum
+PRIORITY_BY_PREFERENCE = {1: "High", 2: "Medium", 3: "Low"}
+PREDICTED_FIELDS = ("Module", "Priority", "Severity")
+
+_NUMBER_PATTERN = re.compile(r'\d+')
+
+def module_label(case: Dict[str, Any]) -> Optional[str]:
+    value = str(case.get('CategoryName') or case.get('Category') or '').strip()
+    return value or None
+
+def priority_label(case: Dict[str, Any]) -> Optional[str]:
+    """Priority name of a case from its PREFERENCE ID (1 High, 2 Medium, 3 Low)"""
+    value = case.get('PREFERENCE')
+    if value is None or value == '':
+        return None
+    text = str(value).strip()
+    if text.capitalize() in PRIORITY_BY_PREFERENCE.values():
+        return text.capitalize()
+    try:
+        return PRIORITY_BY_PREFERENCE.get(int(float(text)))
+    except ValueError:
+        return None
+
+def severity_label(case: Dict[str, Any]) -> Optional[str]:
+    """Severity of a case, stored in its Priority field as "Severity N" or N"""
+    match = _NUMBER_PATTERN.search(str(case.get('Priority') or ''))
+    return f"Severity {match.group()}" if match else None
+
+_LABELS = {"Module": module_label, "Priority": priority_label, "Severity": severity_label}
+
+class KnnFieldPredictor:
+    """Predicts Module, Priority and Severity by similarity-weighted voting of similar cases
+
+    Each neighbor votes for its own field values with weight 1 - cosine distance; neighbors
+    closer than `min_similarity` do not vote. A field's confidence is the share of the total
+    weight that its winning value got, where neighbors without a value for the field still
+    count towards the total. The prediction's confidence is the lowest field confidence, or 0
+    when fewer than `min_cases` neighbors voted, since a lone close case is no consensus.
+    """
+    def __init__(self, min_similarity: float = 0.5, min_cases: int = 3, suggestion_cases: int = 3, section_chars: int = 400):
+        self.min_similarity = min_similarity
+        self.min_cases = max(min_cases, 1)
+        self.suggestion_cases = suggestion_cases
+        self.section_chars = section_chars
+
+    def predict(self, neighbors: List[Tuple[Dict[str, Any], float]]) -> Dict[str, Any]:
+        """Vote on the fields
+
+        Args:
+            neighbors: (case, cosine distance) tuples, as returned by VectorSearch searches
+
+        Returns:
+            {"predictions": field -> value, "confidence": overall, "field_confidence": field -> share,
+            "cases": the voting cases, most similar first}
+        """
+        voters = [(case, 1.0 - distance) for case, distance in neighbors if 1.0 - distance >= self.min_similarity]
+        voters.sort(key=lambda voter: voter[1], reverse=True)
+        total = sum(weight for _, weight in voters)
+
+        predictions, field_confidence = {}, {}
+        for field in PREDICTED_FIELDS:
+            votes: Dict[str, float] = defaultdict(float)
+            for case, weight in voters:
+                value = _LABELS[field](case)
+                if value is not None:
+                    votes[value] += weight
+            if votes and total > 0:
+                value, weight = max(votes.items(), key=lambda item: item[1])
+                predictions[field] = value
+                field_confidence[field] = round(weight / total, 4)
+            else:
+                field_confidence[field] = 0.0
+
+        return {
+            "predictions": predictions,
+            "confidence": min(field_confidence.values()) if len(voters) >= self.min_cases else 0.0,
+            "field_confidence": field_confidence,
+            "cases": [case for case, _ in voters]
+        }
+
+    def rca_suggestion(self, cases: List[Dict[str, Any]]) -> str:
+        """RCA suggestion assembled from the reports of the most similar cases"""
+        # Section name -> content -> the cases that share it, so repeated fixes are listed once
+        parts: Dict[str, Dict[str, List[str]]] = {"Root Causes": {}, "Resolution": {}, "Preventive Measures": {}}
+        references = []
+        for case in cases[:self.suggestion_cases]:
+            sections = parse_rca_sections(case.get('RCAReport') or '')
+            reference = str(case.get('CaseNumber') or case.get('ID') or 'a similar case')
+            references.append(reference)
+            for name, found in parts.items():
+                content = sections.get(name)
+                if content:
+                    if len(content) > self.section_chars:
+                        content = content[:self.section_chars].rstrip() + "..."
+                    found.setdefault(content, []).append(reference)
+
+        lines = [f"Based on similar resolved cases: {', '.join(references)}"]
+        for number, (title, name) in enumerate((("Possible root causes", "Root Causes"),
+                                                 ("Resolutions applied in similar cases", "Resolution"),
+                                                 ("Preventive measures", "Preventive Measures")), 1):
+            if parts[name]:
+                lines.append(f"\n{number}. {title}:")
+                lines.extend(f"[{', '.join(sources)}] {content}" for content, sources in parts[name].items())
+        return "\n".join(lines)
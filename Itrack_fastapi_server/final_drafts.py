@@ -0,0 +1,179 @@
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+logger = logging.getLogger("final_drafts")
+
+def rca_data_hash(rca_data: Dict[str, Any]) -> str:
+    """Content hash of the data a final report is generated from"""
+    text = json.dumps(rca_data, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+class FinalReportDrafts:
+    """Speculative final RCA reports, generated in the background while a session is refined
+
+    After a refine turn the session's draft is rescheduled, but only once the session has
+    settled: the turn left the data a final request would send unchanged from the turn
+    before. The draft is generated once the session has been idle for `delay` seconds,
+    and a newer turn cancels a draft that is still waiting or running. A final request
+    whose data has the same content hash gets the draft instead of generating the report
+    again, and waits for it if it is still running.
+
+    Speculative work is bounded so it cannot starve live requests: at most
+    `max_concurrency` drafts run at a time, a draft is skipped while live OpenAI calls
+    are waiting for a slot (`is_busy`) or the session has a refine call in flight (see
+    turn), and at most `max_drafts` reports are kept, each for `ttl_seconds`.
+    """
+    def __init__(self, generate: Callable[[Dict[str, Any]], Awaitable[str]], is_busy: Callable[[], bool],
+                 delay: float = 10.0, max_concurrency: int = 2, max_drafts: int = 256, ttl_seconds: float = 1800.0):
+        self._generate = generate
+        self._is_busy = is_busy
+        self.delay = max(delay, 0.0)
+        self.max_drafts = max(max_drafts, 1)
+        self.ttl_seconds = ttl_seconds
+        self._slots = asyncio.Semaphore(max(max_concurrency, 1))
+        # Session ID -> {"hash", "task", "created", "started"}, oldest first
+        self._drafts: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Session ID -> data hash of its latest turn, least recently updated first
+        self._latest: "OrderedDict[str, str]" = OrderedDict()
+        # Session ID -> number of refine calls in flight
+        self._active: Counter = Counter()
+        self.counters = {"scheduled": 0, "generated": 0, "cancelled": 0, "unsettled": 0, "skipped_busy": 0,
+                         "skipped_active": 0, "failed": 0, "hits": 0, "waited": 0, "misses": 0}
+
+    def schedule(self, session_id: str, rca_data: Dict[str, Any]):
+        """(Re)schedule the draft of a session for the data a final request would send
+
+        Call after every turn; the draft is only scheduled when the previous turn of the
+        session ended with the same data.
+        """
+        data_hash = rca_data_hash(rca_data)
+        current = self._drafts.get(session_id)
+        if current is not None and current["hash"] == data_hash and not self._failed(current["task"]):
+            return
+        self.discard(session_id)
+        previous = self._latest.pop(session_id, None)
+        self._latest[session_id] = data_hash
+        while len(self._latest) > self.max_drafts:
+            self._latest.popitem(last=False)
+        if previous != data_hash:
+            # Still changing from turn to turn, a draft would likely be thrown away
+            self.counters["unsettled"] += 1
+            return
+        draft = {"hash": data_hash, "created": time.monotonic(), "started": False}
+        draft["task"] = asyncio.create_task(self._run(session_id, rca_data, draft))
+        self._drafts[session_id] = draft
+        self.counters["scheduled"] += 1
+        self._evict()
+
+    async def take(self, session_id: str, rca_data: Dict[str, Any]) -> Optional[str]:
+        """The draft report for exactly this data, or None; the draft is removed either way"""
+        # A final request ends the session
+        self._latest.pop(session_id, None)
+        draft = self._drafts.pop(session_id, None)
+        if draft is None:
+            return None
+        task = draft["task"]
+        # A draft that has not started generating yet is no head start
+        if draft["hash"] != rca_data_hash(rca_data) or self._expired(draft) or not draft["started"]:
+            task.cancel()
+            self.counters["misses"] += 1
+            return None
+        if not task.done():
+            # Still generating: waiting for it is faster than starting over
+            self.counters["waited"] += 1
+            try:
+                report = await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise
+                report = None
+        else:
+            report = None if self._failed(task) else task.result()
+        self.counters["misses" if report is None else "hits"] += 1
+        return report
+
+    @contextmanager
+    def turn(self, session_id: str) -> Iterator[None]:
+        """Mark a refine call of the session as in flight, its draft is cancelled and not started meanwhile"""
+        self.discard(session_id)
+        self._active[session_id] += 1
+        try:
+            yield
+        finally:
+            self._active[session_id] -= 1
+            if not self._active[session_id]:
+                del self._active[session_id]
+
+    def forget(self, session_id: str):
+        """Drop everything kept for a session, e.g. once it was finalized"""
+        self.discard(session_id)
+        self._latest.pop(session_id, None)
+
+    def discard(self, session_id: str):
+        """Drop the draft of a session, cancelling it if it is waiting or running"""
+        draft = self._drafts.pop(session_id, None)
+        if draft is not None and not draft["task"].done():
+            draft["task"].cancel()
+            self.counters["cancelled"] += 1
+
+    async def stop(self):
+        tasks = [draft["task"] for draft in self._drafts.values()]
+        self._drafts.clear()
+        self._latest.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "drafts": len(self._drafts),
+            "running": sum(not draft["task"].done() for draft in self._drafts.values())
+        }
+
+    async def _run(self, session_id: str, rca_data: Dict[str, Any], draft: Dict[str, Any]) -> Optional[str]:
+        # Wait for the session to settle, a newer turn cancels this task meanwhile
+        await asyncio.sleep(self.delay)
+        async with self._slots:
+            if self._is_busy():
+                self.counters["skipped_busy"] += 1
+                logger.info(f"Skipped final report draft for session {session_id}, live requests are waiting")
+                return None
+            if session_id in self._active:
+                self.counters["skipped_active"] += 1
+                logger.info(f"Skipped final report draft for session {session_id}, a refine call is in flight")
+                return None
+            draft["started"] = True
+            start_time = time.perf_counter()
+            try:
+                report = await self._generate(rca_data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.counters["failed"] += 1
+                logger.warning(f"Final report draft for session {session_id} failed: {str(e)}")
+                return None
+        self.counters["generated"] += 1
+        logger.info(f"Final report draft for session {session_id} generated in {time.perf_counter() - start_time:.3f}s")
+        return report
+
+    def _expired(self, draft: Dict[str, Any]) -> bool:
+        return self.ttl_seconds > 0 and time.monotonic() - draft["created"] > self.ttl_seconds
+
+    @staticmethod
+    def _failed(task: asyncio.Task) -> bool:
+        return task.done() and (task.cancelled() or task.result() is None)
+
+    def _evict(self):
+        for session_id in [session_id for session_id, draft in self._drafts.items() if self._expired(draft)]:
+            self.discard(session_id)
+        while len(self._drafts) > self.max_drafts:
+            session_id, draft = self._drafts.popitem(last=False)
+            if not draft["task"].done():
+                draft["task"].cancel()
@@ -0,0 +1,202 @@
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import math
+import re
+
+import numpy as np
+from rca_parser import content_hash
+
+logger = logging.getLogger("vector_search")
+
+# Cleaned case fields indexed for exact matches on module names, error codes and ticket numbers
+LEXICAL_FIELDS = (
+    'ID', 'CaseNumber', 'Subject', 'Summary', 'Description', 'Category', 'CategoryName',
+    'Task', 'TaskName', 'Priority', 'DefectPhase', 'RCAReport'
+)
+
+# Words, numbers and codes such as ERR-1042, 0x80070005 or v2.3.1; CJK text has no spaces,
+# so every CJK character is a token of its own
+_TOKEN_PATTERN = re.compile(r'[0-9a-z_]+(?:[-./:][0-9a-z_]+)*|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]')
+_PART_PATTERN = re.compile(r'[-./:]')
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms of `text`, compound codes are kept whole and also split into their parts"""
+    terms = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        terms.append(token)
+        if len(token) > 1 and _PART_PATTERN.search(token):
+            terms.extend(part for part in _PART_PATTERN.split(token) if part)
+    return terms
+
+def lexical_text(case: Dict[str, Any]) -> str:
+    """Text of the indexed fields of a case"""
+    return "\n".join(str(case[field]) for field in LEXICAL_FIELDS if case.get(field))
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int, rrf_k: int = 60) -> List[int]:
+    """Fuse ranked lists of row numbers, a row scores 1 / (rrf_k + rank) in every list it appears in"""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(scores, key=lambda row: (-scores[row], row))[:k]
+
+class LexicalSnapshot:
+    """Immutable BM25 index over the rows of one IndexSnapshot
+
+    Postings hold the rows and term counts of each term. The BM25 weights are computed
+    when a query term is scored, so adding or removing a case only touches the postings
+    of its own terms instead of reweighting the whole index.
+    """
+    def __init__(self, size: int, postings: Dict[str, Tuple[np.ndarray, np.ndarray]], lengths: np.ndarray,
+                 documents: int, total_length: float, k1: float = 1.2, b: float = 0.75):
+        self.size = size
+        self.postings = postings
+        # Document length by row, only read for rows in the postings
+        self.lengths = lengths
+        self.documents = documents
+        self.total_length = total_length
+        self.k1 = k1
+        self.b = b
+
+    def __len__(self) -> int:
+        return self.size
+
+    def scores(self, query: str, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """BM25 score of every row for `query`, rows outside `rows` score 0"""
+        scores = np.zeros(self.size, dtype=np.float32)
+        average_length = self.total_length / self.documents if self.documents and self.total_length > 0 else 1.0
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            posting_rows, counts = posting
+            idf = math.log(1 + (self.documents - len(posting_rows) + 0.5) / (len(posting_rows) + 0.5))
+            norms = self.k1 * (1 - self.b + self.b * self.lengths[posting_rows] / average_length)
+            # A row appears once per posting
+            scores[posting_rows] += idf * counts * (self.k1 + 1) / (counts + norms)
+        if rows is not None:
+            mask = np.zeros(self.size, dtype=bool)
+            mask[rows] = True
+            scores[~mask] = 0
+        return scores
+
+    def search(self, query: str, k: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows with a positive BM25 score for `query`, best first, at most k
+
+        Args:
+            query: Query text
+            k: Maximum number of rows
+            rows: Restrict the search to these row numbers
+        """
+        scores = self.scores(query, rows)
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        order = np.argsort(-scores[matched], kind='stable')
+        return matched[order], scores[matched[order]]
+
+class BM25Index:
+    """Term frequencies of every indexed case, kept across requests
+
+    Cases are tokenized once per content hash. build() turns the current documents into
+    row-aligned postings, update() derives the postings of the next snapshot from the
+    previous one for the rows that changed.
+    """
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # Case key -> (text hash, term frequencies, document length)
+        self.documents: Dict[str, Tuple[str, Counter, int]] = {}
+        self.tokenized = 0
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def _document(self, key: str, case: Dict[str, Any], keep: bool = True) -> Tuple[str, Counter, int]:
+        text = lexical_text(case)
+        text_hash = content_hash(text)
+        document = self.documents.get(key)
+        if document is None or document[0] != text_hash:
+            terms = Counter(tokenize(text))
+            document = (text_hash, terms, sum(terms.values()))
+            self.tokenized += 1
+            if keep:
+                self.documents[key] = document
+        return document
+
+    def build(self, keys: List[Optional[str]], cases: List[Optional[Dict[str, Any]]]) -> LexicalSnapshot:
+        """Postings for the cases in row order, rows whose key is None hold no case"""
+        term_rows: Dict[str, List[int]] = {}
+        term_counts: Dict[str, List[int]] = {}
+        lengths = np.zeros(len(keys), dtype=np.float32)
+        live = {}
+        for row, (key, case) in enumerate(zip(keys, cases)):
+            if key is None:
+                continue
+            document = live[key] = self._document(key, case)
+            lengths[row] = document[2]
+            for term, count in document[1].items():
+                term_rows.setdefault(term, []).append(row)
+                term_counts.setdefault(term, []).append(count)
+        self.documents = live
+
+        postings = {
+            term: (np.array(rows, dtype=np.int64), np.array(term_counts[term], dtype=np.float32))
+            for term, rows in term_rows.items()
+        }
+        return LexicalSnapshot(len(keys), postings, lengths, len(live), float(lengths.sum()), self.k1, self.b)
+
+    def update(self, snapshot: LexicalSnapshot, size: int, removed: List[Tuple[int, str, Dict[str, Any]]],
+               added: List[Tuple[int, str, Dict[str, Any]]]) -> LexicalSnapshot:
+        """The snapshot after cases left and entered rows, `snapshot` itself is left unchanged
+
+        Args:
+            snapshot: Postings of the previous rows
+            size: Number of rows now
+            removed: (row, key, case) of cases that no longer hold their row
+            added: (row, key, case) of cases that now hold their row
+        """
+        dropped: Dict[str, List[int]] = {}
+        inserted: Dict[str, Tuple[List[int], List[int]]] = {}
+        documents, total_length = snapshot.documents, snapshot.total_length
+        added_keys = {key for _, key, _ in added}
+        for row, key, case in removed:
+            # The document of the replaced content, without caching it again
+            _, terms, length = self._document(key, case, keep=False)
+            for term in terms:
+                dropped.setdefault(term, []).append(row)
+            documents -= 1
+            total_length -= length
+            if key not in added_keys:
+                self.documents.pop(key, None)
+
+        lengths = snapshot.lengths
+        if size > len(lengths) or any(row < snapshot.size for row, _, _ in added):
+            # Rows of the previous snapshot keep their lengths, grow into a copy
+            lengths = np.zeros(max(size, 2 * len(lengths)), dtype=np.float32)
+            lengths[:snapshot.size] = snapshot.lengths[:snapshot.size]
+        for row, key, case in added:
+            _, terms, length = self._document(key, case)
+            lengths[row] = length
+            for term, count in terms.items():
+                rows, counts = inserted.setdefault(term, ([], []))
+                rows.append(row)
+                counts.append(count)
+            documents += 1
+            total_length += length
+
+        postings = dict(snapshot.postings)
+        for term in dropped.keys() | inserted.keys():
+            rows, counts = postings.get(term, (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)))
+            if term in dropped:
+                keep = ~np.isin(rows, dropped[term])
+                rows, counts = rows[keep], counts[keep]
+            if term in inserted:
+                rows = np.concatenate([rows, np.array(inserted[term][0], dtype=np.int64)])
+                counts = np.concatenate([counts, np.array(inserted[term][1], dtype=np.float32)])
+            if len(rows):
+                postings[term] = (rows, counts)
+            else:
+                postings.pop(term, None)
+        return LexicalSnapshot(size, postings, lengths, documents, total_length, self.k1, self.b)
@@ -1,6 +1,8 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Union, Any
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, ValidationError
+from typing import List, Optional, Dict, Union, Any, Tuple, Callable
 import openai
 import os
 import json
@@ -9,9 +11,18 @@ import re
 from typing import Union
 import logging,time
 import asyncio
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from vector_utils import VectorSearch
-from openai import AsyncOpenAI
+from vector_utils import VectorSearch, IndexSync, QueryEmbeddingBatcher, FILTER_FIELDS, filter_value
+from session_store import create_session_store
+from response_cache import ResponseCache
+from openai_client import create_openai_client
+from rca_context import RefineContextManager
+from final_drafts import FinalReportDrafts
+from field_predictor import KnnFieldPredictor
+from case_ingest import CaseIngestWorker
+from case_stream import ARRAY_START, CaseRecord, iter_json_object
+import metrics
 
 # Load the .env file
 load_dotenv('.env')
@@ -22,14 +33,34 @@ if not OPENAI_API_KEY:
     raise ValueError("Missing OpenAI API Key. Set OPENAI_API_KEY in .env file or as an environment variable.")
 
 # Creating an OpenAI Asynchronous Client
-async_openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+# Shared by all endpoints: pooled connections, per-call timeouts, retries and concurrency limits (OPENAI_* settings)
+openai_client = create_openai_client(OPENAI_API_KEY)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the vector search warm-up in the background and close shared clients on shutdown"""
+    global vector_search_ready
+    # uvicorn accepts requests right away, only similar case search waits for the model
+    vector_search_ready = asyncio.create_task(warm_up_vector_search())
+    case_ingest_worker.start()
+    try:
+        yield
+    finally:
+        await case_ingest_worker.stop()
+        await final_drafts.stop()
+        if not vector_search_ready.done():
+            vector_search_ready.cancel()
+        await openai_client.aclose()
 
 # FastAPI app with optimized settings for concurrent processing
 app = FastAPI(
     title="ITrack AI Service",
     description="AI-powered ticket analysis and recommendation service",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
+# Latency and in-flight requests per endpoint, exposed by /metrics
+app.add_middleware(metrics.RequestMetricsMiddleware, routes=app.routes)
 
 # Configure logging to track concurrent requests
 logging.basicConfig(
@@ -72,10 +103,18 @@ def load_final_rca_template():
 REFINE_DESC_PROMPT_TEMPLATE = load_refine_desc_prompt()
 FINAL_RCA_TEMPLATE = load_final_rca_template()
 
+# Pins the system prompt and replays earlier turns only within REFINE_HISTORY_TOKENS
+refine_context = RefineContextManager(
+    REFINE_DESC_PROMPT_TEMPLATE,
+    model="gpt-3.5-turbo",
+    history_tokens=int(os.getenv("REFINE_HISTORY_TOKENS", "2000")),
+    context_window=int(os.getenv("REFINE_CONTEXT_WINDOW", "16385")),
+    completion_tokens=1000
+)
+
 # Initialize session_store to store RCA polling session data
-session_store = {}
-# session_store need to be set up to be cleaned up regularly, updated or emptied
-# If the project has the opportunity to go online, I need to save it to the library before cleaning up the session_store[session_id] or clearing the session_store, for debugging after the project goes online.
+# Bounded by SESSION_MAX_ENTRIES / SESSION_TTL_SECONDS / SESSION_MAX_BYTES, set SESSION_SQLITE_PATH to keep sessions across restarts and workers
+session_store = create_session_store()
 
 # Define data model based on the prompt structure
 class DynamicField(BaseModel):
@@ -120,6 +159,12 @@ class RCARequest(BaseModel):
     additional_questions: AdditionalQuestions
     is_final: bool  # Determines if this is the final iteration
 
+class RCADeltaRequest(BaseModel):
+    """Patch-style refine request, see apply_rca_delta for how `changes` is applied"""
+    session_id: str
+    changes: Dict[str, Any] = Field(default_factory=dict)  # Only the RCA fields changed since the last turn
+    is_final: bool = False
+
 class RCAResponse(BaseModel):
     category: str  # Replace issue_title
     task: str  # Add new field
@@ -183,6 +228,9 @@ def process_rca_data(session_data, new_data):
             if key == "root_causes":
                 session_data[key] = [str(item) if isinstance(item, dict) else item for item in session_data[key]]
 
+            # **Clients resend the whole list every turn, keep each item once**
+            session_data[key] = dedupe_list(session_data[key])
+
         # **If it is a dictionary, recursively merge**
         elif isinstance(new_value, dict):
             session_data[key] = process_rca_data(session_data[key], new_value)
@@ -194,6 +242,69 @@ def process_rca_data(session_data, new_data):
     return session_data
 
 
+def dedupe_list(items: list) -> list:
+    """
+    Drop repeated list items, keeping the first occurrence. Strings are compared without surrounding whitespace.
+    """
+    seen = set()
+    result = []
+    for item in items:
+        key = item.strip() if isinstance(item, str) else compact_json(item)
+        if key not in seen:
+            seen.add(key)
+            result.append(item)
+    return result
+
+# Posted dynamic_fields are validated before they are merged by key
+dynamic_fields_adapter = TypeAdapter(Optional[List[DynamicField]])
+
+def apply_rca_delta(state: dict, changes: dict) -> dict:
+    """
+    Apply a field-level delta to the canonical RCA state of a session:
+    - Scalar and list fields are replaced, lists are deduplicated
+    - Sections (impact_analysis, resolution, ...) are merged key by key, their dynamic_fields
+      by field key, keeping only confirmed fields as process_rca_data does
+    - null resets a field to its default
+    Raises ValueError or ValidationError for changes that do not fit the RCA model.
+    """
+    defaults = process_rca_data({}, {})
+    unknown = [key for key in changes if key not in defaults or key == "is_final"]
+    if unknown:
+        raise ValueError(f"Unknown RCA fields: {', '.join(unknown)}")
+
+    merged = copy.deepcopy(defaults)
+    for key, value in state.items():
+        if key in merged:
+            merged[key] = {**merged[key], **value} if isinstance(merged[key], dict) and isinstance(value, dict) else value
+
+    for key, value in changes.items():
+        if value is None:
+            merged[key] = copy.deepcopy(defaults[key])
+        elif isinstance(defaults[key], dict):
+            if not isinstance(value, dict):
+                raise ValueError(f"'{key}' must be an object")
+            section = merged[key]
+            for field, field_value in value.items():
+                if field != "dynamic_fields":
+                    section[field] = field_value
+                    continue
+                fields = {item["key"]: item for item in section.get("dynamic_fields", [])}
+                for item in dynamic_fields_adapter.validate_python(field_value) or []:
+                    if item.is_confirmed:
+                        fields[item.key] = item.model_dump()
+                section["dynamic_fields"] = list(fields.values())
+        elif isinstance(defaults[key], list):
+            if not isinstance(value, list):
+                raise ValueError(f"'{key}' must be a list")
+            merged[key] = dedupe_list([str(item) if isinstance(item, dict) else item for item in value])
+        else:
+            merged[key] = value
+
+    # Changed fields are validated as in a full request
+    for key in changes:
+        TypeAdapter(RCAResponse.model_fields[key].annotation).validate_python(merged[key])
+    return merged
+
 def ensure_complete_rca_request(rca_request: RCARequest) -> RCARequest:
     """
     Ensure all fields in `RCARequest` have default values to prevent KeyError
@@ -214,6 +325,12 @@ def ensure_complete_rca_request(rca_request: RCARequest) -> RCARequest:
         is_final=rca_request.is_final
     )
 
+def compact_json(data) -> str:
+    """
+    Serialize data for an OpenAI message without indentation to keep the token count down.
+    """
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
 def extract_json_from_response(text):
     """
     Parse the JSON returned by OpenAI, remove Markdown code blocks, and ensure correct format.
@@ -223,6 +340,207 @@ def extract_json_from_response(text):
         return json_match.group(1)  # **Extract JSON part**
     return text  # **If no Markdown code block, return original content**
 
+# Replaces Chinese characters in generated reports, matches single characters so it also works on streamed chunks
+CJK_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+
+EMPTY_CONCLUSIONS = ("## 7. Conclusion\nNone", "## 7. Conclusion\nN/A")
+
+def build_final_rca_data(rca_request: RCARequest) -> dict:
+    """
+    Build the RCA data sent to OpenAI for the final report.
+    """
+    rca_data = rca_request.model_dump()
+    
+    # No longer strictly filter dynamic_fields, keep more information for AI analysis
+    # Just mark which fields are confirmed, let AI decide how to use this data
+    for section in ["impact_analysis", "resolution", "preventive_measures", "supplementary_info"]:
+        if section in rca_data and "dynamic_fields" in rca_data[section]:
+            # Add a flag to indicate whether the field has been confirmed
+            for field in rca_data[section]["dynamic_fields"]:
+                if not field.get("is_confirmed", False):
+                    field["ai_note"] = "This field is not confirmed by user but may contain valuable information"
+    return rca_data
+
+def build_final_rca_messages(rca_data: dict) -> List[dict]:
+    """
+    Build the OpenAI messages that generate the final RCA report.
+    """
+    return [
+        {"role": "system", "content": FINAL_RCA_TEMPLATE},
+        {"role": "user", "content": json.dumps(rca_data, indent=2)}
+    ]
+
+def has_empty_conclusion(rca_report: str) -> bool:
+    """
+    Check whether the report's conclusion only contains "None" or "N/A".
+    """
+    return any(marker in rca_report for marker in EMPTY_CONCLUSIONS)
+
+def build_conclusion_messages(rca_report: str) -> List[dict]:
+    """
+    Build the OpenAI messages that regenerate an empty conclusion from the report.
+    """
+    return [
+        {"role": "system", "content": "You are an AI that creates detailed conclusions for Root Cause Analysis reports. Given the RCA report content, generate a comprehensive conclusion that summarizes the findings, impact, root causes, resolutions, and preventive measures. The conclusion should be professional and actionable."},
+        {"role": "user", "content": f"Based on this Root Cause Analysis report, generate a comprehensive conclusion paragraph:\n\n{rca_report}"}
+    ]
+
+def replace_empty_conclusion(rca_report: str, new_conclusion: str) -> str:
+    """
+    Put the regenerated conclusion in place of the empty one.
+    """
+    for marker in EMPTY_CONCLUSIONS:
+        rca_report = rca_report.replace(marker, f"## 7. Conclusion\n{new_conclusion}")
+    return rca_report
+
+def sse_event(event: str, data) -> str:
+    """
+    Format a Server-Sent Event with a JSON payload.
+    """
+    return f"event: {event}\ndata: {compact_json(data)}\n\n"
+
+async def generate_final_report(rca_data: dict, draft: bool = False) -> str:
+    """
+    Generate the final RCA report, regenerating the conclusion when it came back empty.
+    Drafts run in their own OpenAI concurrency group and are labelled separately in the metrics.
+    """
+    endpoint = "final_draft" if draft else "final_report"
+    # Call API - Increase temperature and maximum tokens to allow more creative and detailed content generation
+    response = await openai_client.chat(
+        endpoint,
+        call_site=endpoint,
+        model="gpt-3.5-turbo",
+        messages=build_final_rca_messages(rca_data),
+        temperature=0.5,  # Increase temperature to increase creativity
+        max_tokens=3000   # Increase maximum tokens to allow more detailed reports
+    )
+    
+    # Get report content
+    rca_report = response.choices[0].message.content.strip()
+    
+    # Use regex to replace any other Chinese characters
+    rca_report = CJK_PATTERN.sub('N/A', rca_report)
+    
+    # Handle empty conclusion case - if the conclusion only contains "None" or "N/A", add a prompt to generate a new conclusion
+    if has_empty_conclusion(rca_report):
+        # Call API to generate a conclusion
+        conclusion_response = await openai_client.chat(
+            endpoint,
+            call_site="conclusion_draft" if draft else "conclusion",
+            model="gpt-3.5-turbo",
+            messages=build_conclusion_messages(rca_report),
+            temperature=0.4,
+            max_tokens=500
+        )
+        
+        # Get conclusion content and replace original conclusion
+        new_conclusion = conclusion_response.choices[0].message.content.strip()
+        rca_report = replace_empty_conclusion(rca_report, new_conclusion)
+    return rca_report
+
+# Drafts the final report in the background once a session's RCA state is unchanged across two turns
+# and it has been idle for FINAL_DRAFT_DELAY_SECONDS, skipped while live OpenAI calls are waiting for
+# a slot or the session has a refine call in flight. Speculative calls cost tokens, so it is opt-in
+final_drafts = FinalReportDrafts(
+    lambda rca_data: generate_final_report(rca_data, draft=True),
+    is_busy=lambda: openai_client.waiting > 0,
+    delay=float(os.getenv("FINAL_DRAFT_DELAY_SECONDS", "10")),
+    max_concurrency=int(os.getenv("FINAL_DRAFT_CONCURRENCY", "2")),
+    max_drafts=int(os.getenv("FINAL_DRAFT_MAX_ENTRIES", "256")),
+    ttl_seconds=float(os.getenv("FINAL_DRAFT_TTL_SECONDS", "1800"))
+)
+FINAL_DRAFTS_ENABLED = os.getenv("FINAL_DRAFT_ENABLED", "false").strip().lower() in ("1", "true", "yes")
+
+def schedule_final_draft(session_id: str, rca_state: dict):
+    """
+    Draft the final report for the data the client sends if it finalizes the session
+    with the RCA state of this turn unchanged.
+    """
+    if not FINAL_DRAFTS_ENABLED or not isinstance(rca_state, dict):
+        return
+    try:
+        rca_request = RCARequest(**{**rca_state, "session_id": session_id, "is_final": True})
+    except ValidationError:
+        # The model's reply is not a complete RCA, the client has to fix it before finalizing
+        final_drafts.forget(session_id)
+        return
+    final_drafts.schedule(session_id, build_final_rca_data(ensure_complete_rca_request(rca_request)))
+
+def load_refine_session(session_id: str) -> dict:
+    """
+    Load a refine session, or start a new one.
+    "state" is the latest RCA data as a native dict, "context" holds the user/assistant
+    messages already serialized; the system prompt is only added when calling OpenAI.
+    """
+    session = session_store.get(session_id)
+    if session is None or "state" not in session:
+        session = {
+            "is_first_request": True,
+            "state": {},
+            "context": []
+        }
+    return session
+
+async def refine_turn(session_id: str, session: dict, user_message: dict, replay_history: bool = True) -> dict:
+    """
+    Run one refine turn: call OpenAI with the pinned system prompt, the earlier turns that fit
+    the history budget and `user_message`, then store the reply as the session's RCA state.
+    """
+    messages, history, prompt_stats = refine_context.build(session["context"] if replay_history else [], user_message)
+    metrics.PROMPT_TOKENS.observe(prompt_stats["prompt_tokens"], call_site="refine_rca")
+    logger.info(f"Prompt for session {session_id}: {prompt_stats['prompt_tokens']} tokens "
+                f"(system: {prompt_stats['system_tokens']}, history: {prompt_stats['history_tokens']} in {prompt_stats['replayed_turns']} turns, "
+                f"collapsed: {prompt_stats['collapsed_tokens']} in {prompt_stats['collapsed_turns']} turns, exact: {prompt_stats['exact']})")
+    
+    logger.info(f"Calling OpenAI API for session {session_id}")
+
+    # **Call OpenAI API**
+    call_start = time.perf_counter()
+    try:
+        # The session's draft is for the state this turn replaces
+        with final_drafts.turn(session_id):
+            response = await openai_client.chat(
+                "refine_rca",
+                model="gpt-3.5-turbo",  
+                messages=messages,
+                temperature=0.5,
+                max_tokens=refine_context.completion_tokens
+            )
+    except Exception as e:
+        logger.error(f"OpenAI API error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"OpenAI API error: {str(e)}")
+
+    logger.info(f"OpenAI API call completed in {time.perf_counter() - call_start:.3f}s")
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        logger.info(f"OpenAI usage for session {session_id}: prompt tokens: {usage.prompt_tokens}, completion tokens: {usage.completion_tokens}")
+
+    # **Process OpenAI response**
+    assistant_response = response.choices[0].message.content
+    processed_text = extract_json_from_response(assistant_response)
+
+    try:
+        response_data = json.loads(processed_text.strip())
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse JSON response: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to parse response: {str(e)}")
+    
+    if isinstance(response_data, dict) and isinstance(response_data.get("root_causes"), list):
+        response_data["root_causes"] = dedupe_list(response_data["root_causes"])
+    
+    # **Save OpenAI response to session_store**
+    # Only the replayed history is kept, collapsed turns live on in the merged state
+    session["context"] = history + [
+        user_message,
+        {"role": "assistant", "content": compact_json(response_data)}
+    ]
+    # The next turn merges into this response, as the previous turn's reply is the current RCA state
+    session["state"] = response_data if isinstance(response_data, dict) else {}
+    session["is_first_request"] = False
+    session_store.put(session_id, session)
+    schedule_final_draft(session_id, session["state"])
+    return response_data
+
 @app.post("/refine_rca", response_model=Union[RCAResponse, dict])
 async def refine_rca(rca_request: RCARequest) -> Union[RCAResponse, dict]:
     """Processes issue report and calls OpenAI to refine it."""
@@ -230,7 +548,7 @@ async def refine_rca(rca_request: RCARequest) -> Union[RCAResponse, dict]:
     
     logger.info(f"Received request for session_id: {session_id}")
 
-    start_time = time.time()  # record start time
+    start_time = time.perf_counter()  # record start time
     
     # **If is_final=True, generate the final RCA report**
     if rca_request.is_final:
@@ -240,68 +558,19 @@ async def refine_rca(rca_request: RCARequest) -> Union[RCAResponse, dict]:
         rca_request = ensure_complete_rca_request(rca_request)
         
         # Construct request data
-        rca_data = rca_request.model_dump()
+        rca_data = build_final_rca_data(rca_request)
         
-        # No longer strictly filter dynamic_fields, keep more information for AI analysis
-        # Just mark which fields are confirmed, let AI decide how to use this data
-        for section in ["impact_analysis", "resolution", "preventive_measures", "supplementary_info"]:
-            if section in rca_data and "dynamic_fields" in rca_data[section]:
-                # Add a flag to indicate whether the field has been confirmed
-                for field in rca_data[section]["dynamic_fields"]:
-                    if not field.get("is_confirmed", False):
-                        field["ai_note"] = "This field is not confirmed by user but may contain valuable information"
-        
-        # Call OpenAI to generate the final RCA report
+        # Call OpenAI to generate the final RCA report, unless a draft for exactly this data is ready
         try:
-            logger.info("Calling OpenAI API to generate final RCA report")
-            
-            # Construct messages
-            messages = [
-                {"role": "system", "content": FINAL_RCA_TEMPLATE},
-                {"role": "user", "content": json.dumps(rca_data, indent=2)}
-            ]
-            
-            # Call API - Increase temperature and maximum tokens to allow more creative and detailed content generation
-            response = await async_openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                temperature=0.5,  # Increase temperature to increase creativity
-                max_tokens=3000   # Increase maximum tokens to allow more detailed reports
-            )
-            
-            # Get report content
-            rca_report = response.choices[0].message.content.strip()
-            
-            # Use regex to replace any other Chinese characters
-            rca_report = re.sub(r'[\u4e00-\u9fff]', 'N/A', rca_report)
-            
-            # Handle empty conclusion case - if the conclusion only contains "None" or "N/A", add a prompt to generate a new conclusion
-            if "## 7. Conclusion\nNone" in rca_report or "## 7. Conclusion\nN/A" in rca_report:
-                # Extract report content as context
-                report_context = rca_report
-                
-                # Create a request to generate a complete conclusion
-                conclusion_messages = [
-                    {"role": "system", "content": "You are an AI that creates detailed conclusions for Root Cause Analysis reports. Given the RCA report content, generate a comprehensive conclusion that summarizes the findings, impact, root causes, resolutions, and preventive measures. The conclusion should be professional and actionable."},
-                    {"role": "user", "content": f"Based on this Root Cause Analysis report, generate a comprehensive conclusion paragraph:\n\n{report_context}"}
-                ]
-                
-                # Call API to generate a conclusion
-                conclusion_response = await async_openai_client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=conclusion_messages,
-                    temperature=0.4,
-                    max_tokens=500
-                )
-                
-                # Get conclusion content and replace original conclusion
-                new_conclusion = conclusion_response.choices[0].message.content.strip()
-                rca_report = rca_report.replace("## 7. Conclusion\nNone", f"## 7. Conclusion\n{new_conclusion}")
-                rca_report = rca_report.replace("## 7. Conclusion\nN/A", f"## 7. Conclusion\n{new_conclusion}")
+            rca_report = await final_drafts.take(session_id, rca_data)
+            if rca_report is not None:
+                logger.info(f"Using the pre-generated final RCA report draft for session {session_id}")
+            else:
+                logger.info("Calling OpenAI API to generate final RCA report")
+                rca_report = await generate_final_report(rca_data)
             
             # Clear session
-            if session_id in session_store:
-                del session_store[session_id]
+            session_store.delete(session_id)
                 
             logger.info(f"RCA report generated successfully for session {session_id}")
             
@@ -320,91 +589,437 @@ async def refine_rca(rca_request: RCARequest) -> Union[RCAResponse, dict]:
     rca_request = ensure_complete_rca_request(rca_request)
     
     # **Initialize session_store**
-    if session_id not in session_store:
-        session_store[session_id] = {
-            "is_first_request": True,
-            "context": [  # **Store conversation history directly**
-                {"role": "system", "content": REFINE_DESC_PROMPT_TEMPLATE}  # **Only add system role once**
-            ]
-        }
+    session = load_refine_session(session_id)
 
-    last_response_time = time.time()
+    last_response_time = time.perf_counter()
     logger.info(f"Session store prepared. Time taken: {last_response_time - start_time:.3f}s")
     
 
-    # **Optimize session_store size**# Only keep the last 10 messages
-    if len(session_store[session_id]["context"]) > 10:
-        session_store[session_id]["context"] = session_store[session_id]["context"][-10:]  
-
-    current_session_data = session_store[session_id]["context"][-1]["content"]
-    try:
-        current_session_data = json.loads(current_session_data)
-    except json.JSONDecodeError:
-        logger.warning(f"Failed to decode JSON for session {session_id}, resetting session context.")
-        session_store[session_id]["context"] = [{"role": "system", "content": REFINE_DESC_PROMPT_TEMPLATE}]
-        current_session_data = {}
-
     logger.info(f"Processing RCA data for session {session_id}")
-    current_session_data = process_rca_data(current_session_data, rca_request.model_dump())
+    current_session_data = process_rca_data(session["state"], rca_request.model_dump())
 
     # **Construct OpenAI messages**
-    session_store[session_id]["context"].append(
-        {"role": "user", "content": json.dumps(current_session_data, indent=2)}
-    )
+    # The user message carries the whole merged state, so turns that do not fit the
+    # history budget are dropped rather than replayed
+    user_message = {"role": "user", "content": compact_json(current_session_data)}
+    response_data = await refine_turn(session_id, session, user_message)
+
+    # **Record response time**
+    logger.info(f"Total processing time: {time.perf_counter() - start_time:.3f}s")
     
-    logger.info(f"Calling OpenAI API for session {session_id}")
+    # **Return structured data**
+    return response_data
 
-    # **Call OpenAI API**
+@app.post("/refine_rca/delta", response_model=Union[RCAResponse, dict])
+async def refine_rca_delta(delta_request: RCADeltaRequest) -> Union[RCAResponse, dict]:
+    """Patch-style /refine_rca: the client sends only the fields it changed.
+    
+    The server keeps the canonical RCA state of the session, applies the delta to it and
+    sends OpenAI the current state and the changes without replaying earlier turns, so the
+    request body and the prompt stay the same size however many turns a session has.
+    With is_final the final report is generated from the state, as /refine_rca does.
+    """
+    session_id = delta_request.session_id
+    start_time = time.perf_counter()
+    logger.info(f"Received delta request for session_id: {session_id}, changed fields: {list(delta_request.changes)}")
+    
+    session = load_refine_session(session_id)
     try:
-        response = await async_openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",  
-            messages=session_store[session_id]["context"],
-            temperature=0.5,
-            max_tokens=1000
-        )
-    except Exception as e:
-        logger.error(f"OpenAI API error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"OpenAI API error: {str(e)}")
-
-    call_time = time.time()
-    logger.info(f"OpenAI API call completed in {call_time - last_response_time:.3f}s")
-    last_response_time = call_time
-
-    # **Process OpenAI response**
-    assistant_response = response.choices[0].message.content
-    processed_text = extract_json_from_response(assistant_response)
+        state = apply_rca_delta(session["state"], delta_request.changes)
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid RCA changes: {str(e)}")
+    
+    if delta_request.is_final:
+        try:
+            rca_request = RCARequest(**{**state, "session_id": session_id, "is_final": True})
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=f"Invalid RCA state: {str(e)}")
+        return await refine_rca(rca_request)
+    
+    user_message = {
+        "role": "user",
+        "content": f"Current RCA state:\n{compact_json(state)}\nChanged by the user this turn:\n{compact_json(delta_request.changes)}"
+    }
+    response_data = await refine_turn(session_id, session, user_message, replay_history=False)
+    
+    logger.info(f"Total processing time: {time.perf_counter() - start_time:.3f}s")
+    return response_data
 
-    try:
-        response_data = json.loads(processed_text.strip())
-    except json.JSONDecodeError as e:
-        logger.error(f"Failed to parse JSON response: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to parse response: {str(e)}")
+@app.post("/refine_rca/stream")
+async def refine_rca_stream(rca_request: RCARequest):
+    """Generates the final RCA report and streams it as Server-Sent Events.
     
-    # **Save OpenAI response to session_store**
-    session_store[session_id]["context"].append(
-        {"role": "assistant", "content": json.dumps(response_data, indent=2)}
+    Events: "token" for each report chunk, "conclusion" for chunks of a regenerated
+    conclusion when the report's conclusion came back empty, "final" with the complete
+    report and the raw data, and "error" if generation fails.
+    """
+    session_id = rca_request.session_id
+    logger.info(f"Streaming final RCA report for session_id: {session_id}")
+    
+    rca_request = ensure_complete_rca_request(rca_request)
+    rca_data = build_final_rca_data(rca_request)
+    
+    async def event_stream():
+        start_time = time.perf_counter()
+        try:
+            rca_report = await final_drafts.take(session_id, rca_data)
+            if rca_report is not None:
+                # The draft is complete, send it as a single chunk
+                session_store.delete(session_id)
+                logger.info(f"Streamed the pre-generated RCA report draft for session {session_id}")
+                yield sse_event("token", {"text": rca_report})
+                yield sse_event("final", {"status": "success", "rca_report": rca_report, "data": rca_data})
+                return
+            
+            stream = openai_client.chat_stream(
+                "final_report",
+                model="gpt-3.5-turbo",
+                messages=build_final_rca_messages(rca_data),
+                temperature=0.5,
+                max_tokens=3000
+            )
+            report_parts = []
+            async for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                text = CJK_PATTERN.sub('N/A', chunk.choices[0].delta.content)
+                if not report_parts:
+                    logger.info(f"First report token for session {session_id} after {time.perf_counter() - start_time:.3f}s")
+                report_parts.append(text)
+                yield sse_event("token", {"text": text})
+            
+            rca_report = "".join(report_parts).strip()
+            
+            if has_empty_conclusion(rca_report):
+                stream = openai_client.chat_stream(
+                    "final_report",
+                    call_site="conclusion",
+                    model="gpt-3.5-turbo",
+                    messages=build_conclusion_messages(rca_report),
+                    temperature=0.4,
+                    max_tokens=500
+                )
+                conclusion_parts = []
+                async for chunk in stream:
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    text = chunk.choices[0].delta.content
+                    conclusion_parts.append(text)
+                    yield sse_event("conclusion", {"text": text})
+                rca_report = replace_empty_conclusion(rca_report, "".join(conclusion_parts).strip())
+            
+            # Clear session
+            session_store.delete(session_id)
+            logger.info(f"Streamed RCA report for session {session_id} in {time.perf_counter() - start_time:.3f}s")
+            
+            yield sse_event("final", {
+                "status": "success",
+                "rca_report": rca_report,
+                "data": rca_data
+            })
+        except Exception as e:
+            logger.error(f"Error streaming RCA report: {str(e)}")
+            yield sse_event("error", {"detail": f"Error generating RCA report: {str(e)}"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
-    # **Record response time**
-    logger.info(f"Total processing time: {time.time() - start_time:.3f}s")
-    
-    # **Return structured data**
-    return response_data
+class SearchFilters(BaseModel):
+    """Restrict similar case search to cases with these attribute values, applied inside the index"""
+    Category: Optional[Union[str, List[str]]] = None
+    Task: Optional[Union[str, List[str]]] = None
+    DefectPhase: Optional[Union[str, List[str]]] = None
+    Priority: Optional[Union[str, List[str]]] = None
+    # Filter fields whose value must equal the one of new_case, e.g. ["Category", "DefectPhase"]
+    same_as_new_case: List[str] = Field(default_factory=list)
 
 class PredictionRequest(BaseModel):
+    """Body of /predict, which only needs the new ticket
+
+    Clients may still send historical_cases; unknown fields are ignored without being validated.
+    """
+    description: str
+    new_case: Optional[dict] = None
+
+class SearchRequest(BaseModel):
+    """Body of /search_similar_cases"""
     description: str
-    historical_cases: List[dict]
     new_case: Optional[dict] = None
+    # Omit to search the cases ingested through /cases/upsert. Posted cases are searched on their
+    # own and are not added to the ingested ones. The endpoint parses this array incrementally,
+    # each item becomes a CaseRecord and non-object items are skipped
+    historical_cases: Optional[List[Any]] = None
+    filters: Optional[SearchFilters] = None
 
 class PredictionResponse(BaseModel):
     predictions: Dict[str, str]
     rcaSuggestion: str
+    # "knn" when the similar cases answered, "llm" when OpenAI did
+    source: str = "llm"
+    # Confidence of the kNN vote, also reported when it was too low to answer
+    confidence: Optional[float] = None
 
 class SearchResponse(BaseModel):
     similarCases: List[Dict[str, Any]]
 
-# Initialize vector retrieval system
-vector_search = VectorSearch()
+class HistoricalCase(BaseModel):
+    """A case posted to /cases/upsert, other fields are accepted and dropped by CaseRecord"""
+    model_config = ConfigDict(extra="allow")
+
+    ID: Optional[Union[str, int]] = None
+    CaseNumber: Optional[Union[str, int]] = None
+    Subject: Optional[str] = None
+    Summary: Optional[str] = None
+    Description: Optional[str] = None
+    Category: Optional[str] = None
+    CategoryName: Optional[str] = None
+    Task: Optional[str] = None
+    TaskName: Optional[str] = None
+    Priority: Optional[Union[str, int]] = None
+    PREFERENCE: Optional[Union[str, int]] = None
+    DefectPhase: Optional[str] = None
+    RCAReport: Optional[str] = None
+
+class CaseUpsertRequest(BaseModel):
+    cases: List[HistoricalCase]
+
+class CaseDeleteRequest(BaseModel):
+    ids: List[str]
+
+def resolve_search_filters(filters: Optional[SearchFilters], new_case: Optional[dict]) -> Optional[Dict[str, List[str]]]:
+    """Turn the request filters into filter field -> accepted values
+
+    A field in same_as_new_case that also has explicit values keeps new_case's value only if it
+    is one of them. Returns None when no case can match, e.g. new_case is outside those values.
+    """
+    if filters is None:
+        return {}
+    resolved = {}
+    for field in FILTER_FIELDS:
+        values = getattr(filters, field)
+        if values:
+            resolved[field] = [values] if isinstance(values, str) else list(values)
+    for field in filters.same_as_new_case:
+        if field not in FILTER_FIELDS:
+            raise HTTPException(status_code=400, detail=f"Unsupported filter field: {field}, expected one of {', '.join(FILTER_FIELDS)}")
+        value = (new_case or {}).get(field)
+        if value is None or not str(value).strip():
+            logger.warning(f"[SEARCH] new_case has no {field}, not filtering on it")
+            continue
+        if field in resolved and filter_value(field, value) not in {filter_value(field, v) for v in resolved[field]}:
+            logger.info(f"[SEARCH] new_case {field} {value!r} is not among the filtered values {resolved[field]}")
+            return None
+        resolved[field] = [str(value)]
+    return resolved
+
+# Cache /predict completions by prompt, so re-submitted tickets skip OpenAI
+prediction_cache = ResponseCache(
+    max_entries=int(os.getenv("PREDICT_CACHE_MAX_ENTRIES", "1024")),
+    ttl_seconds=float(os.getenv("PREDICT_CACHE_TTL_SECONDS", "3600")),
+    directory=os.getenv("PREDICT_CACHE_DIR") or None
+)
+
+async def cached_chat_completion(call_site: str, validate: Optional[Callable[[str], Any]] = None, **kwargs) -> str:
+    """Return the message content of a chat completion, served from prediction_cache when possible
+
+    Args:
+        call_site: Label for the OpenAI metrics
+        validate: Called with the content before it is cached, an exception keeps it out of the cache
+        **kwargs: Arguments for chat.completions.create
+    """
+    async def create():
+        response = await openai_client.chat("predict", call_site=call_site, **kwargs)
+        content = response.choices[0].message.content
+        if validate is not None:
+            validate(content)
+        return content
+    return await prediction_cache.get_or_create(ResponseCache.make_key(kwargs), create)
+
+# "dual" asks for the predictions and the RCA suggestion in two parallel completions and parses
+# the prediction lines, "structured" gets both in one JSON-schema-constrained completion
+PREDICT_MODE = os.getenv("PREDICT_MODE", "dual").strip().lower()
+# Structured outputs need a model that supports json_schema response formats
+PREDICT_STRUCTURED_MODEL = os.getenv("PREDICT_STRUCTURED_MODEL", "gpt-4o-mini")
+
+PREDICTION_SCHEMA = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "ticket_prediction",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "predictions": {
+                    "type": "object",
+                    "properties": {
+                        "Module": {"type": "string", "description": "The module/category this issue belongs to"},
+                        "Priority": {"type": "string", "enum": ["High", "Medium", "Low"]},
+                        "Severity": {"type": "string", "enum": ["Severity 1", "Severity 2", "Severity 3"]}
+                    },
+                    "required": ["Module", "Priority", "Severity"],
+                    "additionalProperties": False
+                },
+                "rcaSuggestion": {
+                    "type": "string",
+                    "description": "Root cause analysis: possible root causes, suggested investigation steps and potential solutions"
+                }
+            },
+            "required": ["predictions", "rcaSuggestion"],
+            "additionalProperties": False
+        }
+    }
+}
+
+def build_structured_predict_messages(description: str, new_case: Optional[dict]) -> List[dict]:
+    """
+    Build the single prompt that asks for the field predictions and the RCA suggestion together.
+    """
+    prompt = "New Ticket Information:\n"
+    if new_case:
+        for field in ["Summary", "Description", "Category", "Task", "Priority", "DefectPhase"]:
+            if new_case.get(field):
+                prompt += f"{field}: {new_case[field]}\n"
+    else:
+        prompt += f"Description: {description}\n"
+    prompt += "\nPredict the Module, Priority (High, Medium, Low) and Severity (Severity 1, Severity 2, Severity 3) of this ticket, "
+    prompt += "and write a root cause analysis with possible root causes, suggested investigation steps and potential solutions."
+    return [
+        {"role": "system", "content": "You are a professional IT issue and RCA analysis expert. Please reply in English to avoid coding issues."},
+        {"role": "user", "content": prompt}
+    ]
+
+async def predict_structured(description: str, new_case: Optional[dict]) -> PredictionResponse:
+    """Predictions and RCA suggestion from one structured-output completion"""
+    content = await cached_chat_completion(
+        "predict_structured",
+        validate=PredictionResponse.model_validate_json,
+        model=PREDICT_STRUCTURED_MODEL,
+        messages=build_structured_predict_messages(description, new_case),
+        response_format=PREDICTION_SCHEMA,
+        temperature=0.3
+    )
+    return PredictionResponse.model_validate_json(content)
+
+# Opt-in: Module, Priority and Severity are voted on by the most similar ingested cases first,
+# OpenAI is only asked when the vote's confidence is below PREDICT_KNN_THRESHOLD
+PREDICT_KNN_ENABLED = os.getenv("PREDICT_KNN_ENABLED", "false").strip().lower() in ("1", "true", "yes")
+PREDICT_KNN_THRESHOLD = float(os.getenv("PREDICT_KNN_THRESHOLD", "0.7"))
+PREDICT_KNN_K = int(os.getenv("PREDICT_KNN_K", "10"))
+field_predictor = KnnFieldPredictor(
+    min_similarity=float(os.getenv("PREDICT_KNN_MIN_SIMILARITY", "0.5")),
+    min_cases=int(os.getenv("PREDICT_KNN_MIN_CASES", "3"))
+)
+# Which path answered /predict
+predict_sources = {"knn": 0, "llm": 0}
+
+def build_search_query(description: str, new_case: Optional[dict]) -> str:
+    """Query text for the similar case search of a new ticket"""
+    query_parts = []
+    
+    # If new_case is provided, focus on key fields
+    if new_case:
+        # Key fields from the form
+        priority_fields = ["Summary", "Description"]  # Highest priority
+        important_fields = ["Category", "Task", "Priority", "PREFERENCE", "DefectPhase"]
+        
+        # Add high priority fields first
+        for field in priority_fields:
+            if field in new_case and new_case[field]:
+                query_parts.append(f"{field}: {new_case[field]}")
+        
+        # Add other important fields
+        for field in important_fields:
+            if field in new_case and new_case[field]:
+                query_parts.append(f"{field}: {new_case[field]}")
+    
+    # Always include the description field (if not already added)
+    if not any(part.startswith("Description:") for part in query_parts):
+        query_parts.append(f"Description: {description}")
+    
+    return " ".join(query_parts)
+
+async def predict_from_similar_cases(description: str, new_case: Optional[dict]) -> Optional[Dict[str, Any]]:
+    """kNN vote over the ingested cases, None while the vector search is loading or nothing is ingested"""
+    # /predict never waits for the warm-up, OpenAI answers until the index is there
+    search_engine = vector_search
+    if not PREDICT_KNN_ENABLED or search_engine is None or query_batcher is None:
+        return None
+    snapshot = search_engine.snapshot
+    if snapshot is None or len(snapshot) == 0:
+        return None
+    query = build_search_query(description, new_case)
+    query_vector = await query_batcher.encode(query)
+    k = min(PREDICT_KNN_K, len(snapshot))
+    if SEARCH_MODE == "hybrid":
+        neighbors = await asyncio.to_thread(search_engine.hybrid_search, query, query_vector, k, snapshot)
+    else:
+        neighbors = await asyncio.to_thread(search_engine.search_vector, query_vector, k, snapshot)
+    return field_predictor.predict(neighbors)
+
+# Vector retrieval system, loaded in the background by the lifespan hook so that startup
+# does not wait for the embedding model; search requests await vector_search_ready
+vector_search: Optional[VectorSearch] = None
+query_batcher: Optional[QueryEmbeddingBatcher] = None
+vector_search_ready: Optional[asyncio.Task] = None
+# dense (the default) uses embeddings only, hybrid fuses BM25 over the case fields with the dense ranking
+SEARCH_MODE = os.getenv("SEARCH_MODE", "dense").strip().lower()
+vector_search_status = {
+    "status": "pending",
+    "error": None,
+    "seconds": None
+}
+
+async def warm_up_vector_search():
+    """Load the embedding model and the persisted case store off the event loop"""
+    global vector_search, query_batcher
+    vector_search_status["status"] = "loading"
+    start_time = time.perf_counter()
+    try:
+        vector_search = await asyncio.to_thread(VectorSearch)
+        # Concurrent searches share query embedding forward passes
+        query_batcher = QueryEmbeddingBatcher(
+            vector_search.encode_queries,
+            window_ms=float(os.getenv("QUERY_BATCH_WINDOW_MS", "5")),
+            max_batch=int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))
+        )
+    except Exception as e:
+        vector_search_status["status"] = "failed"
+        vector_search_status["error"] = str(e)
+        logger.error(f"[STARTUP] Vector search warm-up failed: {str(e)}", exc_info=True)
+        raise
+    finally:
+        vector_search_status["seconds"] = round(time.perf_counter() - start_time, 3)
+    vector_search_status["status"] = "ready"
+    logger.info(f"[STARTUP] Vector search ready, time taken: {vector_search_status['seconds']:.3f}s")
+
+async def apply_case_changes(groups: List[List[tuple]]) -> List[Dict[str, int]]:
+    """Apply the changes of a batch of ingest jobs to the vector search in the thread pool"""
+    search_engine = await get_vector_search()
+    return await asyncio.to_thread(search_engine.apply_case_change_groups, groups)
+
+# Upserts and deletes from /cases/* are applied in the background, jobs waiting together share one embedding pass
+case_ingest_worker = CaseIngestWorker(
+    apply_case_changes,
+    max_batch=int(os.getenv("CASE_INGEST_MAX_BATCH", "5000"))
+)
+
+async def get_vector_search() -> VectorSearch:
+    """Wait for the warm-up to finish and return the vector search, 503 when it is unavailable"""
+    if vector_search_ready is None:
+        raise HTTPException(status_code=503, detail="Vector search has not been started")
+    try:
+        # Shield the shared warm-up task from the cancellation of a single request
+        await asyncio.shield(vector_search_ready)
+    except asyncio.CancelledError:
+        if vector_search_ready.cancelled():
+            raise HTTPException(status_code=503, detail="Vector search warm-up was cancelled")
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Vector search is unavailable: {str(e)}")
+    return vector_search
 
 @app.post("/predict")
 async def predict(request: PredictionRequest):
@@ -412,7 +1027,7 @@ async def predict(request: PredictionRequest):
     # Increase the concurrency counter
     concurrent_requests["predict"] += 1
     concurrent_requests["total"] += 1
-    request_start_time = time.time()
+    request_start_time = time.perf_counter()
     
     logger.info(f"[PREDICT] Starting request processing (concurrency: predict={concurrent_requests['predict']}, total={concurrent_requests['total']})")
     
@@ -420,15 +1035,53 @@ async def predict(request: PredictionRequest):
         # Parse the request body
         description = request.description
         new_case = request.new_case
-        historical_cases = request.historical_cases
         
         # Record request information
         description_preview = description[:100] + "..." if len(description) > 100 else description
         logger.info(f"[PREDICT] Received prediction request, description: {description_preview}")
         
-        # Check and clean data
-        if not historical_cases:
-            logger.warning("[PREDICT] No historical cases provided")
+        knn_confidence = None
+        try:
+            vote = await predict_from_similar_cases(description, new_case)
+        except Exception as e:
+            logger.warning(f"[PREDICT] Similar case vote failed, asking OpenAI: {str(e)}")
+            vote = None
+        if vote is not None:
+            knn_confidence = vote["confidence"]
+            logger.info(f"[PREDICT] Similar case vote of {len(vote['cases'])} cases: {vote['predictions']}, "
+                        f"confidence: {vote['field_confidence']}")
+            if knn_confidence >= PREDICT_KNN_THRESHOLD:
+                predict_sources["knn"] += 1
+                response_data = {
+                    "predictions": vote["predictions"],
+                    "rcaSuggestion": field_predictor.rca_suggestion(vote["cases"]),
+                    "source": "knn",
+                    "confidence": knn_confidence
+                }
+                request_duration = time.perf_counter() - request_start_time
+                logger.info(f"[PREDICT] Answered from similar cases, time taken: {request_duration:.3f}s")
+                return response_data
+        predict_sources["llm"] += 1
+        
+        if PREDICT_MODE == "structured":
+            logger.info("[PREDICT] Call OpenAI once for structured prediction and RCA suggestion")
+            try:
+                response_data = (await predict_structured(description, new_case)).model_dump()
+                logger.info(f"[PREDICT] Structured predictions: {response_data['predictions']}, RCA suggestion length: {len(response_data['rcaSuggestion'])}")
+            except Exception as e:
+                logger.error(f"[PREDICT] Structured OpenAI call failed: {str(e)}")
+                response_data = {
+                    "predictions": {
+                        "Module": "Unable to predict",
+                        "Priority": "Unable to predict",
+                        "Severity": "Unable to predict"
+                    },
+                    "rcaSuggestion": "Failed to generate RCA suggestion due to an error."
+                }
+            response_data.update(source="llm", confidence=knn_confidence)
+            request_duration = time.perf_counter() - request_start_time
+            logger.info(f"[PREDICT] Processing completed, time taken: {request_duration:.3f}s")
+            return response_data
         
         # Build the prompt
         prompt = "Based on the following information, please predict the fields of the new ticket:\n\n"
@@ -456,7 +1109,8 @@ async def predict(request: PredictionRequest):
         logger.info("[PREDICT] Parallel call OpenAI to generate prediction and RCA suggestion")
         try:
             # Create parallel tasks
-            prediction_task = async_openai_client.chat.completions.create(
+            prediction_task = cached_chat_completion(
+                "predict",
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "You are a professional IT issue analysis expert. Please reply in English to avoid coding issues."},
@@ -489,7 +1143,8 @@ async def predict(request: PredictionRequest):
             rca_prompt += "2. Suggested investigation steps\n"
             rca_prompt += "3. Potential solutions\n"
             
-            rca_task = async_openai_client.chat.completions.create(
+            rca_task = cached_chat_completion(
+                "rca_suggestion",
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "You are a professional RCA analysis expert. Please reply in English to avoid coding issues."},
@@ -499,10 +1154,9 @@ async def predict(request: PredictionRequest):
             )
             
             # Wait for two tasks to complete in parallel
-            prediction_response, rca_response = await asyncio.gather(prediction_task, rca_task)
+            predictions_text, rcaSuggestion = await asyncio.gather(prediction_task, rca_task)
             
             # Parse the prediction results
-            predictions_text = prediction_response.choices[0].message.content
             logger.info(f"[PREDICT] Received OpenAI prediction response, length: {len(predictions_text)}")
             predictions = {}
             for line in predictions_text.split('\n'):
@@ -521,7 +1175,6 @@ async def predict(request: PredictionRequest):
             logger.info(f"[PREDICT] Parsed predictions: {predictions}")
             
             # Get RCA suggestion
-            rcaSuggestion = rca_response.choices[0].message.content
             logger.info(f"[PREDICT] RCA suggestion generated successfully, length: {len(rcaSuggestion)}")
             
         except Exception as e:
@@ -536,15 +1189,17 @@ async def predict(request: PredictionRequest):
         # Build the prediction response - only contains prediction and RCA suggestion, no similar cases
         response_data = {
             "predictions": predictions,
-            "rcaSuggestion": rcaSuggestion
+            "rcaSuggestion": rcaSuggestion,
+            "source": "llm",
+            "confidence": knn_confidence
         }
         
-        request_duration = time.time() - request_start_time
+        request_duration = time.perf_counter() - request_start_time
         logger.info(f"[PREDICT] Processing completed, time taken: {request_duration:.3f}s")
         return response_data
         
     except Exception as e:
-        request_duration = time.time() - request_start_time
+        request_duration = time.perf_counter() - request_start_time
         logger.error(f"[PREDICT] Prediction failed, time taken: {request_duration:.3f}s, error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
     finally:
@@ -554,95 +1209,112 @@ async def predict(request: PredictionRequest):
         logger.info(f"[PREDICT] Request ended (concurrency: predict={concurrent_requests['predict']}, total={concurrent_requests['total']})")
 
 # Separate endpoint for similar case search
-@app.post("/search_similar_cases")
-async def search_similar_cases(request: PredictionRequest):
+async def read_search_request(http_request: Request, search_engine: VectorSearch) -> Tuple[SearchRequest, Optional[IndexSync], int]:
+    """Parse a search body as it arrives, indexing inline historical cases on the way
+    
+    The historical_cases array is never materialized: each item is normalized into a
+    CaseRecord and new cases are embedded in batches while the rest of the body is read.
+    Returns the request without its history, the index sync (None when no history was
+    posted) and the number of posted cases.
+    """
+    fields = {}
+    index_sync = None
+    received = 0
+    embedding = None
+    try:
+        async for key, value in iter_json_object(http_request.stream(), "historical_cases"):
+            if key != "historical_cases" or (index_sync is None and value is not ARRAY_START):
+                fields[key] = value
+                continue
+            if value is ARRAY_START:
+                index_sync = search_engine.begin_index_sync()
+                continue
+            received += 1
+            if isinstance(value, dict) and index_sync.add(CaseRecord.from_dict(value)):
+                # At most one batch is embedding while the next one is parsed
+                if embedding is not None:
+                    await embedding
+                embedding = asyncio.ensure_future(asyncio.to_thread(index_sync.embed, index_sync.take_pending()))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {str(e)}")
+    finally:
+        if embedding is not None:
+            await embedding
+    
+    try:
+        request = SearchRequest.model_validate(fields)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    return request, index_sync, received
+
+@app.post("/search_similar_cases", openapi_extra={
+    "requestBody": {"required": True, "content": {"application/json": {"schema": SearchRequest.model_json_schema()}}}
+})
+async def search_similar_cases(http_request: Request):
     """Only search and return similar cases"""
     # Increase the concurrency counter
     concurrent_requests["search"] += 1
     concurrent_requests["total"] += 1
-    request_start_time = time.time()
+    request_start_time = time.perf_counter()
     
     logger.info(f"[SEARCH] Starting request processing (concurrency: search={concurrent_requests['search']}, total={concurrent_requests['total']})")
     
     try:
         # Parse the request body
+        search_engine = await get_vector_search()
+        request, index_sync, received = await read_search_request(http_request, search_engine)
         description = request.description
         new_case = request.new_case
-        historical_cases = request.historical_cases
-        
-        # Record request information
-        logger.info(f"[SEARCH] Received similar case search request, historical case count: {len(historical_cases)}")
-        
-        # Ensure at least one historical case
-        if not historical_cases:
-            logger.error("[SEARCH] No historical cases provided")
-            raise HTTPException(status_code=400, detail="At least one historical case is required to build the index")
-        
-        # Check and clean historical case data
-        cleaned_cases = []
-        for case in historical_cases:
-            if case is None:
-                continue
-                
-            # Ensure all necessary fields have default values
-            cleaned_case = {
-                'ID': case.get('ID', 'Unknown'),
-                'CaseNumber': case.get('CaseNumber', case.get('ID', 'Unknown')),
-                'Subject': case.get('Subject', ''),
-                'Summary': case.get('Summary', case.get('Subject', '')),
-                'Description': case.get('Description', ''),
-                'Category': case.get('Category', ''),
-                'CategoryName': case.get('CategoryName', case.get('Category', '')),
-                'Task': case.get('Task', ''),
-                'TaskName': case.get('TaskName', case.get('Task', '')),
-                'Priority': case.get('Priority', ''),
-                'DefectPhase': case.get('DefectPhase', ''),
-                'RCAReport': case.get('RCAReport', '')
-            }
-            
-            # Add cleaned case
-            cleaned_cases.append(cleaned_case)
-        
-        # Use historical cases to build the index (only process cases containing RCAReport)
-        try:
-            logger.info("[SEARCH] Starting to build vector index")
-            # Move CPU-intensive indexing operations to the thread pool asynchronously
-            await asyncio.to_thread(vector_search.build_index, cleaned_cases)
-            logger.info("[SEARCH] Vector index built successfully")
-        except ValueError as e:
-            logger.error(f"[SEARCH] Failed to build index: {str(e)}")
-            raise HTTPException(status_code=400, detail=str(e))
-        
-        # Build the query string
-        query_parts = []
         
-        # If new_case is provided, focus on key fields
-        if new_case:
-            # Key fields from the form
-            priority_fields = ["Summary", "Description"]  # Highest priority
-            important_fields = ["Category", "Task", "Priority", "PREFERENCE", "DefectPhase"]
+        if index_sync is None:
+            # Search the cases maintained through /cases/upsert and /cases/delete
+            logger.info("[SEARCH] Received similar case search request against the ingested cases")
+            snapshot = search_engine.snapshot
+            if snapshot is None:
+                logger.error("[SEARCH] No cases have been ingested")
+                raise HTTPException(status_code=400, detail="No cases are indexed, upload them through /cases/upsert or pass historical_cases")
+        else:
+            # Record request information
+            logger.info(f"[SEARCH] Received similar case search request, historical case count: {received}")
             
-            # Add high priority fields first
-            for field in priority_fields:
-                if field in new_case and new_case[field]:
-                    query_parts.append(f"{field}: {new_case[field]}")
+            # Ensure at least one historical case
+            if not received:
+                logger.error("[SEARCH] No historical cases provided")
+                raise HTTPException(status_code=400, detail="At least one historical case is required to build the index")
             
-            # Add other important fields
-            for field in important_fields:
-                if field in new_case and new_case[field]:
-                    query_parts.append(f"{field}: {new_case[field]}")
+            # Index only the posted historical cases (those containing RCAReport), for this
+            # request alone; the ingested cases and the published index are unaffected
+            try:
+                logger.info("[SEARCH] Starting to build vector index")
+                # Move CPU-intensive indexing operations to the thread pool asynchronously
+                # The returned snapshot is private to this request, concurrent rebuilds cannot change it
+                snapshot = await asyncio.to_thread(index_sync.finish)
+                logger.info("[SEARCH] Vector index built successfully")
+            except ValueError as e:
+                logger.error(f"[SEARCH] Failed to build index: {str(e)}")
+                raise HTTPException(status_code=400, detail=str(e))
         
-        # Always include the description field (if not already added)
-        if not any(part.startswith("Description:") for part in query_parts):
-            query_parts.append(f"Description: {description}")
+        # Metadata filters select the candidate rows before any similarity is computed
+        filters = resolve_search_filters(request.filters, new_case)
+        if filters is None:
+            return {"similarCases": []}
+        candidate_rows = snapshot.filter_rows(filters)
+        if candidate_rows is not None:
+            logger.info(f"[SEARCH] Filters {filters} match {len(candidate_rows)} of {len(snapshot)} cases")
+            if len(candidate_rows) == 0:
+                return {"similarCases": []}
         
-        # Combine the query string
-        query = " ".join(query_parts)
+        # Build the query string
+        query = build_search_query(description, new_case)
         
         # Search for similar cases
         logger.info("[SEARCH] Starting to search for similar cases")
-        # Move the vector search operation to the thread pool asynchronously
-        similar_cases = await asyncio.to_thread(vector_search.search, query)
+        # The query is embedded together with other concurrent searches, then looked up in the thread pool
+        query_vector = await query_batcher.encode(query)
+        if SEARCH_MODE == "hybrid":
+            similar_cases = await asyncio.to_thread(search_engine.hybrid_search, query, query_vector, None, snapshot, candidate_rows)
+        else:
+            similar_cases = await asyncio.to_thread(search_engine.search_vector, query_vector, None, snapshot, candidate_rows)
         logger.info(f"[SEARCH] Search completed, found {len(similar_cases)} similar cases")
         
         # Prepare case data for the frontend
@@ -678,16 +1350,89 @@ async def search_similar_cases(request: PredictionRequest):
             "similarCases": frontend_cases
         }
         
-        request_duration = time.time() - request_start_time
+        request_duration = time.perf_counter() - request_start_time
         logger.info(f"[SEARCH] Processing completed, time taken: {request_duration:.3f}s")
         return response_data
         
+    except (HTTPException, RequestValidationError):
+        raise
     except Exception as e:
-        request_duration = time.time() - request_start_time
+        request_duration = time.perf_counter() - request_start_time
         logger.error(f"[SEARCH] Similar case search failed, time taken: {request_duration:.3f}s, error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         # Decrease the concurrency counter
         concurrent_requests["search"] -= 1
         concurrent_requests["total"] -= 1
-        logger.info(f"[SEARCH] Request ended (concurrency: search={concurrent_requests['search']}, total={concurrent_requests['total']})")
\ No newline at end of file
+        logger.info(f"[SEARCH] Request ended (concurrency: search={concurrent_requests['search']}, total={concurrent_requests['total']})")
+
+async def submit_case_changes(changes: List[tuple], wait: bool):
+    """Queue case changes for the ingest worker, optionally waiting until they are searchable"""
+    job_id = case_ingest_worker.submit(changes)
+    if not wait:
+        return JSONResponse(status_code=202, content=case_ingest_worker.jobs[job_id])
+    job = await case_ingest_worker.wait(job_id)
+    if job is None:
+        logger.error(f"[CASES] Job {job_id} is not registered with the ingest worker")
+        raise HTTPException(status_code=500, detail=f"Status of job {job_id} is unavailable")
+    if job["status"] == "failed":
+        return JSONResponse(status_code=500, content=job)
+    return job
+
+@app.post("/cases/upsert")
+async def upsert_cases(request: CaseUpsertRequest, wait: bool = False):
+    """Add or replace historical cases by ID, cases without an RCAReport are skipped"""
+    logger.info(f"[CASES] Upsert of {len(request.cases)} cases")
+    # Only fields the client sent, so CaseRecord fills in its defaults for the others
+    return await submit_case_changes([("upsert", CaseRecord.from_dict(case.model_dump(exclude_unset=True))) for case in request.cases], wait)
+
+@app.post("/cases/delete")
+async def delete_cases(request: CaseDeleteRequest, wait: bool = False):
+    """Remove historical cases by ID"""
+    logger.info(f"[CASES] Delete of {len(request.ids)} cases")
+    return await submit_case_changes([("delete", case_id) for case_id in request.ids], wait)
+
+@app.get("/cases/jobs/{job_id}")
+async def case_job_status(job_id: str):
+    """Status of an upsert or delete job"""
+    job = case_ingest_worker.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+def indexed_cases() -> int:
+    """Number of cases in the published search index"""
+    if vector_search is None or vector_search.snapshot is None:
+        return 0
+    return len(vector_search.snapshot)
+
+metrics.SESSIONS.set_function(lambda: session_store.backend.count())
+metrics.INDEX_CASES.set_function(indexed_cases)
+metrics.OPENAI_WAITING.set_function(lambda: openai_client.waiting)
+
+@app.get("/stats")
+async def stats():
+    """Report concurrency and session store counters"""
+    return {
+        "concurrent_requests": concurrent_requests,
+        "sessions": session_store.stats(),
+        "predict_cache": prediction_cache.stats(),
+        "predict_sources": predict_sources,
+        "openai": openai_client.stats(),
+        "final_drafts": final_drafts.stats(),
+        "case_ingest": {
+            **case_ingest_worker.stats(),
+            "indexed_cases": indexed_cases()
+        }
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Latency histograms and gauges in the Prometheus text format"""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once the vector search is loaded, 503 while it is loading or after a failure"""
+    status_code = 200 if vector_search_status["status"] == "ready" else 503
+    return JSONResponse(status_code=status_code, content={"vector_search": vector_search_status})
\ No newline at end of file
@@ -0,0 +1,220 @@
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import math
+import threading
+import time
+
+from starlette.routing import Match
+
+# Latency buckets in seconds, from a cached search up to a slow OpenAI call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Registry:
+    """Metrics rendered together by /metrics"""
+    def __init__(self):
+        self.metrics: List[Any] = []
+
+    def register(self, metric: Any) -> Any:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        return "".join(metric.render() for metric in self.metrics)
+
+REGISTRY = Registry()
+
+class _Metric:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], registry: Optional[Registry]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+class Histogram(_Metric):
+    """Cumulative bucket histogram, optionally split by labels
+
+    Observations may come from the event loop and from executor threads, so updates
+    take a lock. Durations should be measured with time.perf_counter.
+    """
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        # Label values -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, **labels: Any):
+        key = self._key(labels)
+        index = len(self.buckets)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = position
+                break
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """Observe the duration of the block, also when it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in sorted(self._series.items())]
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = _labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+class Gauge(_Metric):
+    """Current value, optionally split by labels
+
+    A gauge without labels can read its value from a function when it is rendered,
+    for values that are already tracked elsewhere (session count, index size).
+    """
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels: Any):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: Any):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float]):
+        if self.labelnames:
+            raise ValueError(f"{self.name} has labels, set its values instead")
+        self._function = function
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        if self._function is not None:
+            try:
+                values = [((), float(self._function()))]
+            except Exception:
+                values = []
+        else:
+            with self._lock:
+                values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+# Service metrics, shared by the modules that record them
+REQUEST_LATENCY = Histogram("itrack_request_duration_seconds",
+                            "Time from receiving a request to sending the last byte of its response",
+                            ["endpoint", "method", "status"])
+REQUESTS_IN_FLIGHT = Gauge("itrack_requests_in_flight", "Requests being processed", ["endpoint"])
+OPENAI_UPSTREAM_LATENCY = Histogram("itrack_openai_upstream_seconds",
+                                    "OpenAI call latency per attempt, until the last streamed chunk",
+                                    ["call_site"])
+OPENAI_QUEUE_WAIT = Histogram("itrack_openai_queue_wait_seconds",
+                              "Time an OpenAI call waited for a concurrency slot", ["call_site"])
+QUEUE_WAIT = Histogram("itrack_queue_wait_seconds",
+                       "Time work waited in an internal queue before it started", ["queue"])
+EMBEDDING_LATENCY = Histogram("itrack_embedding_seconds", "Time to embed one batch of texts", ["kind"])
+INDEX_BUILD_LATENCY = Histogram("itrack_index_build_seconds",
+                                "Time to sync the case store and publish a new index snapshot",
+                                buckets=DEFAULT_BUCKETS + (120.0, 300.0, 600.0))
+SEARCH_LATENCY = Histogram("itrack_search_seconds", "Time of a similar case search over the index", ["mode"])
+PROMPT_TOKENS = Histogram("itrack_prompt_tokens", "Prompt tokens sent to OpenAI per call, estimated before the call",
+                          ["call_site"], buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000))
+SESSIONS = Gauge("itrack_sessions", "RCA sessions in the session store")
+INDEX_CASES = Gauge("itrack_index_cases", "Cases in the published search index")
+OPENAI_WAITING = Gauge("itrack_openai_waiting", "OpenAI calls waiting for a concurrency slot")
+
+def route_label(routes: Sequence[Any], scope: Dict[str, Any]) -> str:
+    """Path template of the route handling a request, so path parameters do not create series"""
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope.get("path", ""))
+    return "unmatched"
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording request latency and in-flight requests per endpoint
+
+    Latency runs until the last body chunk is sent, so streamed responses are timed
+    to their end rather than to their headers.
+    """
+    def __init__(self, app: Callable, routes: Sequence[Any]):
+        self.app = app
+        self.routes = routes
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        endpoint = route_label(self.routes, scope)
+        status = {"code": 500}
+        start = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc(endpoint=endpoint)
+        done = False
+
+        async def send_wrapper(message: Dict[str, Any]):
+            nonlocal done
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False) and not done:
+                done = True
+                REQUESTS_IN_FLIGHT.dec(endpoint=endpoint)
+                REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint,
+                                        method=scope["method"], status=status["code"])
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if not done:
+                done = True
+                REQUESTS_IN_FLIGHT.dec(endpoint=endpoint)
+                REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint,
+                                        method=scope["method"], status=status["code"])
@@ -0,0 +1,232 @@
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, Optional
+import asyncio
+import logging
+import os
+import random
+import time
+import httpx
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError
+from metrics import OPENAI_QUEUE_WAIT, OPENAI_UPSTREAM_LATENCY
+
+logger = logging.getLogger("openai_client")
+
+# Status codes worth retrying: request timeout, conflict, rate limit and server errors
+RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read the delay the server asked for from Retry-After / retry-after-ms, if any"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRY_STATUS_CODES
+    # Also covers APITimeoutError
+    return isinstance(error, APIConnectionError)
+
+class OpenAIClient:
+    """Shared AsyncOpenAI client with a sized connection pool, per-call timeouts,
+    jittered retries and concurrency limits
+
+    Every call waits for a slot in the global semaphore and in its endpoint's semaphore
+    (predict, refine_rca, final_report, final_draft), so a slow upstream queues requests here instead
+    of opening ever more connections. Queue wait and upstream latency are recorded per
+    call site.
+    """
+    def __init__(self, api_key: str, base_url: Optional[str] = None, max_connections: int = 100,
+                 max_keepalive_connections: int = 20, connect_timeout: float = 5.0, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 20.0, max_concurrency: int = 32,
+                 endpoint_concurrency: Optional[Dict[str, int]] = None, endpoint_timeouts: Optional[Dict[str, float]] = None,
+                 default_timeout: float = 60.0):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.default_timeout = default_timeout
+        self.endpoint_timeouts = endpoint_timeouts or {}
+        self._http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections),
+            timeout=httpx.Timeout(default_timeout, connect=connect_timeout)
+        )
+        # Retries are handled here, so they can respect the semaphores and be counted
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=self._http_client, max_retries=0)
+        self._global_slots = asyncio.Semaphore(max_concurrency)
+        self._endpoint_slots = {name: asyncio.Semaphore(limit) for name, limit in (endpoint_concurrency or {}).items()}
+        self.waiting = 0
+        self.metrics: Dict[str, Dict[str, float]] = {}
+
+    def _record(self, call_site: str, **values: float):
+        metrics = self.metrics.setdefault(call_site, {
+            "calls": 0, "errors": 0, "retries": 0,
+            "queue_wait_total": 0.0, "queue_wait_max": 0.0,
+            "upstream_total": 0.0, "upstream_max": 0.0
+        })
+        if "queue_wait" in values:
+            OPENAI_QUEUE_WAIT.observe(values["queue_wait"], call_site=call_site)
+        if "upstream" in values:
+            OPENAI_UPSTREAM_LATENCY.observe(values["upstream"], call_site=call_site)
+        for name, value in values.items():
+            if name in ("queue_wait", "upstream"):
+                metrics[f"{name}_total"] += value
+                metrics[f"{name}_max"] = max(metrics[f"{name}_max"], value)
+            else:
+                metrics[name] += value
+
+    async def _acquire(self, endpoint: str, call_site: str):
+        start = time.perf_counter()
+        self.waiting += 1
+        endpoint_slots = self._endpoint_slots.get(endpoint)
+        try:
+            if endpoint_slots is not None:
+                await endpoint_slots.acquire()
+            try:
+                await self._global_slots.acquire()
+            except BaseException:
+                if endpoint_slots is not None:
+                    endpoint_slots.release()
+                raise
+        finally:
+            self.waiting -= 1
+        wait = time.perf_counter() - start
+        self._record(call_site, queue_wait=wait)
+        if wait > 1:
+            logger.warning(f"[{call_site}] Waited {wait:.3f}s for an OpenAI slot")
+
+    def _release(self, endpoint: str):
+        self._global_slots.release()
+        endpoint_slots = self._endpoint_slots.get(endpoint)
+        if endpoint_slots is not None:
+            endpoint_slots.release()
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        # Full jitter, but never sooner than the server asked for
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    async def chat(self, endpoint: str, call_site: Optional[str] = None, **kwargs) -> Any:
+        """Create a chat completion
+
+        Args:
+            endpoint: Concurrency group of the call (predict, refine_rca, final_report, final_draft)
+            call_site: Label for metrics, defaults to the endpoint
+            **kwargs: Arguments for chat.completions.create
+        """
+        call_site = call_site or endpoint
+        kwargs.setdefault("timeout", self.endpoint_timeouts.get(endpoint, self.default_timeout))
+        attempt = 0
+        while True:
+            await self._acquire(endpoint, call_site)
+            start = time.perf_counter()
+            try:
+                response = await self.client.chat.completions.create(**kwargs)
+                self._record(call_site, calls=1, upstream=time.perf_counter() - start)
+                return response
+            except Exception as e:
+                self._record(call_site, calls=1, upstream=time.perf_counter() - start)
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self._record(call_site, errors=1)
+                    raise
+                error = e
+            finally:
+                self._release(endpoint)
+
+            # Back off without holding a slot
+            delay = self._backoff(attempt, error)
+            attempt += 1
+            self._record(call_site, retries=1)
+            logger.warning(f"[{call_site}] OpenAI call failed ({str(error)}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def chat_stream(self, endpoint: str, call_site: Optional[str] = None, **kwargs) -> AsyncIterator[Any]:
+        """Stream chat completion chunks, holding the slots until the stream ends
+
+        Only opening the stream is retried; once chunks have been yielded a failure is raised.
+        """
+        call_site = call_site or endpoint
+        kwargs.setdefault("timeout", self.endpoint_timeouts.get(endpoint, self.default_timeout))
+        kwargs["stream"] = True
+        attempt = 0
+        while True:
+            await self._acquire(endpoint, call_site)
+            start = time.perf_counter()
+            try:
+                try:
+                    stream = await self.client.chat.completions.create(**kwargs)
+                except Exception as e:
+                    self._record(call_site, calls=1, upstream=time.perf_counter() - start)
+                    if attempt >= self.max_retries or not is_retryable(e):
+                        self._record(call_site, errors=1)
+                        raise
+                    error = e
+                else:
+                    try:
+                        async for chunk in stream:
+                            yield chunk
+                    except Exception:
+                        self._record(call_site, errors=1)
+                        raise
+                    finally:
+                        self._record(call_site, calls=1, upstream=time.perf_counter() - start)
+                        await stream.close()
+                    return
+            finally:
+                self._release(endpoint)
+
+            delay = self._backoff(attempt, error)
+            attempt += 1
+            self._record(call_site, retries=1)
+            logger.warning(f"[{call_site}] OpenAI stream failed to open ({str(error)}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"waiting": self.waiting, "call_sites": self.metrics}
+
+    async def aclose(self):
+        await self._http_client.aclose()
+
+def create_openai_client(api_key: str) -> OpenAIClient:
+    """Create the OpenAI client configured by the OPENAI_* environment variables"""
+    return OpenAIClient(
+        api_key=api_key,
+        base_url=os.getenv("OPENAI_BASE_URL") or None,
+        max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        connect_timeout=float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5")),
+        max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "3")),
+        max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", "32")),
+        endpoint_concurrency={
+            "predict": int(os.getenv("OPENAI_PREDICT_CONCURRENCY", "16")),
+            "refine_rca": int(os.getenv("OPENAI_REFINE_CONCURRENCY", "16")),
+            "final_report": int(os.getenv("OPENAI_FINAL_REPORT_CONCURRENCY", "8")),
+            "final_draft": int(os.getenv("FINAL_DRAFT_CONCURRENCY", "2"))
+        },
+        endpoint_timeouts={
+            "predict": float(os.getenv("OPENAI_PREDICT_TIMEOUT", "30")),
+            "refine_rca": float(os.getenv("OPENAI_REFINE_TIMEOUT", "60")),
+            "final_report": float(os.getenv("OPENAI_FINAL_REPORT_TIMEOUT", "120")),
+            "final_draft": float(os.getenv("OPENAI_FINAL_REPORT_TIMEOUT", "120"))
+        },
+        default_timeout=float(os.getenv("OPENAI_TIMEOUT", "60"))
+    )
@@ -0,0 +1,114 @@
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+import logging
+import math
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger("rca_context")
+
+# Chat format overhead, per message and for priming the reply
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+# Without tiktoken: compact JSON averages a little under 4 characters per token, err on the high side
+CHARS_PER_TOKEN = 3.5
+
+class TokenEstimator:
+    """Prompt token counts, exact with tiktoken installed and a character estimate otherwise"""
+    def __init__(self, model: str = "gpt-3.5-turbo"):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("cl100k_base")
+        self.exact = self.encoding is not None
+        # The system prompt is counted on every turn, remember the long texts
+        self.text = lru_cache(maxsize=16)(self._text)
+
+    def _text(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+    def message(self, message: Dict[str, Any]) -> int:
+        return MESSAGE_OVERHEAD_TOKENS + self.text(message.get("content") or "")
+
+    def messages(self, messages: List[Dict[str, Any]]) -> int:
+        return sum(map(self.message, messages)) + REPLY_PRIMING_TOKENS
+
+class RefineContextManager:
+    """Builds the messages of a /refine_rca turn within a token budget
+
+    The system prompt is always sent first and the current user message, which carries
+    the whole merged RCA state, always last. Earlier turns are replayed newest first as
+    user/assistant pairs while they fit in `history_tokens` and in the model window;
+    older turns are collapsed into the merged state, which already contains them.
+    """
+    def __init__(self, system_prompt: str, model: str = "gpt-3.5-turbo", history_tokens: int = 2000,
+                 context_window: int = 16385, completion_tokens: int = 1000):
+        self.system_prompt = system_prompt
+        self.estimator = TokenEstimator(model)
+        self.history_tokens = max(history_tokens, 0)
+        self.context_window = context_window
+        self.completion_tokens = completion_tokens
+
+    def build(self, history: List[Dict[str, Any]], current: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], Dict[str, Any]]:
+        """Select the history for this turn
+
+        Args:
+            history: Previous user/assistant messages of the session, oldest first
+            current: The user message of this turn
+
+        Returns:
+            The messages to send, the replayed history (to store with the session) and
+            token statistics for logging.
+        """
+        system = {"role": "system", "content": self.system_prompt}
+        pinned = self.estimator.messages([system, current])
+        budget = min(self.history_tokens, self.context_window - self.completion_tokens - pinned)
+
+        turns = _pair_turns(history)
+        kept: List[List[Dict[str, Any]]] = []
+        used = 0
+        for turn in reversed(turns):
+            tokens = sum(map(self.estimator.message, turn))
+            if used + tokens > budget:
+                break
+            kept.append(turn)
+            used += tokens
+        kept.reverse()
+
+        replayed = [message for turn in kept for message in turn]
+        collapsed = turns[:len(turns) - len(kept)]
+        stats = {
+            "prompt_tokens": pinned + used,
+            "system_tokens": self.estimator.message(system),
+            "history_tokens": used,
+            "replayed_turns": len(kept),
+            "collapsed_turns": len(collapsed),
+            "collapsed_tokens": sum(self.estimator.message(message) for turn in collapsed for message in turn),
+            "exact": self.estimator.exact
+        }
+        if pinned + self.completion_tokens > self.context_window:
+            logger.warning(f"System prompt and current RCA state need {pinned} tokens, "
+                           f"more than the {self.context_window} token window leaves for the prompt")
+        return [system] + replayed + [current], replayed, stats
+
+def _pair_turns(history: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Group messages into turns that each start with a user message, so no reply is replayed without its question"""
+    turns: List[List[Dict[str, Any]]] = []
+    for message in history:
+        if message.get("role") == "system":
+            # Older sessions may still hold the prompt, it is pinned separately now
+            continue
+        if message.get("role") == "user" or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    if turns and turns[0][0].get("role") != "user":
+        turns.pop(0)
+    return turns
@@ -0,0 +1,78 @@
+from collections import OrderedDict
+from typing import Dict, Optional
+import hashlib
+import re
+import threading
+
+# Sections of an RCA report, in report order
+SECTION_NAMES = (
+    'Issue Summary',
+    'Impact Analysis',
+    'Root Causes',
+    'Resolution',
+    'Preventive Measures',
+    'Supplementary Information',
+    'Conclusion'
+)
+
+_SECTION_LOOKUP = {name.lower(): name for name in SECTION_NAMES}
+
+# One pass over the report finds every section heading ("## 3. Root Causes") and every
+# label line ("Root Causes: ..."); sections run until the next heading or label. A heading
+# is "#" marks, whitespace and a known section title, so "#4521 regression" is content
+_SECTION_TITLES = '|'.join(SECTION_NAMES)
+_BOUNDARY_PATTERN = re.compile(
+    r'^[ \t]*(?:#+[ \t]+[\d. \t*]*(?P<title>' + _SECTION_TITLES + r')[^\n]*'
+    r'|(?:\*\*)?(?P<label>' + _SECTION_TITLES + r')(?:\*\*)?[ \t]*:+(?:\*\*)?)',
+    re.MULTILINE | re.IGNORECASE
+)
+
+_CACHE_SIZE = 10000
+_cache: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def content_hash(text: str) -> str:
+    """SHA-1 of a report, used to key parsed sections and case embeddings"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def _parse(text: str) -> Dict[str, str]:
+    found = {}
+    current = None
+    content_start = 0
+    for match in _BOUNDARY_PATTERN.finditer(text):
+        if current is not None and current not in found:
+            found[current] = text[content_start:match.start()].strip()
+        current = _SECTION_LOOKUP[(match.group('title') or match.group('label')).lower()]
+        content_start = match.end()
+    if current is not None and current not in found:
+        found[current] = text[content_start:].strip()
+    # Report order, the first occurrence of a section wins
+    return {name: found[name] for name in SECTION_NAMES if found.get(name)}
+
+def parse_rca_sections(text: str, text_hash: Optional[str] = None) -> Dict[str, str]:
+    """Split an RCA report into its known sections
+
+    Returns a dict of section name to stripped content, in report order, for the sections
+    that are present and non-empty. Results are cached by content hash; treat them as read-only.
+    """
+    if text_hash is None:
+        text_hash = content_hash(text)
+    with _cache_lock:
+        sections = _cache.get(text_hash)
+        if sections is not None:
+            _cache.move_to_end(text_hash)
+            return sections
+
+    sections = _parse(text)
+    with _cache_lock:
+        _cache[text_hash] = sections
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return sections
+
+def rca_embedding_text(text: str, text_hash: Optional[str] = None) -> str:
+    """Text embedded for a case: its known sections, or the whole report when none are found"""
+    sections = parse_rca_sections(text, text_hash)
+    if not sections:
+        return f"RCA: {text}"
+    return " ".join(f"{name}: {content}" for name, content in sections.items())
@@ -0,0 +1,135 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+
+logger = logging.getLogger("response_cache")
+
+class ResponseCache:
+    """Content-addressed cache for OpenAI completion results
+
+    Values live in an LRU memory tier and, when `directory` is set, in a disk tier of one
+    JSON file per key that outlives restarts. Entries older than `ttl_seconds` are treated
+    as missing. Concurrent requests for the same key share one in-flight call.
+    """
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600, directory: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.directory = directory
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "shared": 0, "errors": 0}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(payload: Dict[str, Any]) -> str:
+        """Hash a request payload, ignoring whitespace differences inside message contents"""
+        normalized = dict(payload)
+        if "messages" in normalized:
+            normalized["messages"] = [
+                {**message, "content": " ".join(str(message.get("content", "")).split())}
+                for message in normalized["messages"]
+            ]
+        encoded = json.dumps(normalized, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created > self.ttl_seconds
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _remember(self, key: str, created: float, value: Any):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, key: str) -> Tuple[bool, Any]:
+        item = self._memory.get(key)
+        if item is not None:
+            if not self._expired(item[0]):
+                self._memory.move_to_end(key)
+                self.counters["hits"] += 1
+                return True, item[1]
+            del self._memory[key]
+        return False, None
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, Any]]:
+        """(created, value) of the disk entry for key, None if it is missing or expired; runs in a thread"""
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if not self._expired(entry["created"]):
+                return entry["created"], entry["value"]
+            os.remove(path)
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def _write_disk(self, key: str, created: float, value: Any):
+        """Write the disk entry for key atomically; runs in a thread"""
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"created": created, "value": value}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write response cache entry {key}: {str(e)}")
+
+    async def get_or_create(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for key, or await factory() once for all concurrent callers"""
+        found, value = self._lookup(key)
+        if found:
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            # Run the lookup and the call as their own task so a caller that disconnects does not cancel them for the others
+            inflight = asyncio.ensure_future(self._create(key, factory))
+            inflight.add_done_callback(lambda task: task.cancelled() or task.exception())
+            self._inflight[key] = inflight
+        else:
+            self.counters["shared"] += 1
+        return await asyncio.shield(inflight)
+
+    async def _create(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Read key from the disk tier, or call factory() and store its value; file I/O runs in threads"""
+        try:
+            entry = await asyncio.to_thread(self._read_disk, key) if self.directory else None
+            if entry is not None:
+                self.counters["disk_hits"] += 1
+                self._remember(key, *entry)
+                return entry[1]
+            self.counters["misses"] += 1
+            try:
+                value = await factory()
+            except Exception:
+                self.counters["errors"] += 1
+                raise
+        finally:
+            self._inflight.pop(key, None)
+        created = time.time()
+        self._remember(key, created, value)
+        if self.directory:
+            await asyncio.to_thread(self._write_disk, key, created, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "entries": len(self._memory),
+            "inflight": len(self._inflight),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "disk": bool(self.directory)
+        }
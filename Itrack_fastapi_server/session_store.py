@@ -0,0 +1,291 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger("session_store")
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+def session_size(session: Dict[str, Any]) -> int:
+    """Approximate memory cost of a session as the size of its JSON form"""
+    return len(_dumps(session).encode("utf-8"))
+
+def _item_key(item: Any) -> Any:
+    """Hashable content of a list item whose encoding can be reused, None for other items"""
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict) and all(value is None or isinstance(value, (str, int, float)) for value in item.values()):
+        # The type keeps True and 1 apart
+        return tuple((key, type(value), value) for key, value in item.items())
+    return None
+
+class EncodedSession:
+    """JSON form of a session as (text, UTF-8 size) parts, see SessionEncoder"""
+    def __init__(self, parts: List[Tuple[Optional[str], int]], changed: bool):
+        self.parts = parts
+        self.size = sum(size for _, size in parts)
+        # False when the text equals the one of the session's previous put
+        self.changed = changed
+
+    def text(self) -> str:
+        return "".join(text for text, _ in self.parts)
+
+class SessionEncoder:
+    """Encodes sessions, serializing only what changed since the session's previous put
+
+    Top-level values are encoded on every put, lists item by item: items already seen in
+    the session's previous put, such as the messages of earlier turns, reuse their encoded
+    text. Items are matched by content, so sessions read back from SQLite match too. With
+    `keep_text` False only the sizes are kept, for backends that store the session object.
+    """
+    def __init__(self, keep_text: bool = True):
+        self.keep_text = keep_text
+        # Session ID -> (item content -> (text, size), parts of the previous put)
+        self._sessions: Dict[str, Tuple[Dict[Any, Tuple[Optional[str], int]], List[Tuple[Optional[str], int]]]] = {}
+
+    def _part(self, text: str) -> Tuple[Optional[str], int]:
+        return (text if self.keep_text else None), len(text.encode("utf-8"))
+
+    def encode(self, session_id: str, session: Dict[str, Any]) -> EncodedSession:
+        known, previous = self._sessions.get(session_id, ({}, None))
+        items: Dict[Any, Tuple[Optional[str], int]] = {}
+        parts = [self._part("{")]
+        for position, (key, value) in enumerate(session.items()):
+            parts.append(self._part(("," if position else "") + _dumps(key) + ":"))
+            if not isinstance(value, list):
+                parts.append(self._part(_dumps(value)))
+                continue
+            parts.append(self._part("["))
+            for index, item in enumerate(value):
+                if index:
+                    parts.append(self._part(","))
+                item_key = _item_key(item)
+                part = known.get(item_key) if item_key is not None else None
+                if part is None:
+                    part = self._part(_dumps(item))
+                if item_key is not None:
+                    items[item_key] = part
+                parts.append(part)
+            parts.append(self._part("]"))
+        parts.append(self._part("}"))
+        self._sessions[session_id] = (items, parts)
+        # Reused parts are the same strings, so comparing them is cheap
+        changed = not self.keep_text or previous is None or len(previous) != len(parts) or any(
+            new is not old and new != old for (new, _), (old, _) in zip(parts, previous)
+        )
+        return EncodedSession(parts, changed)
+
+    def forget(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+class MemorySessionBackend:
+    """In-process sessions, ordered from least to most recently used"""
+    # Sessions are kept as objects, only their size is needed
+    keeps_text = False
+
+    def __init__(self):
+        self._items: "OrderedDict[str, Tuple[Dict[str, Any], int, float]]" = OrderedDict()
+        self._total_bytes = 0
+
+    def get(self, session_id: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        item = self._items.get(session_id)
+        if item is None:
+            return None
+        return item[0], item[2]
+
+    def touch(self, session_id: str, now: float):
+        session, size, _ = self._items[session_id]
+        self._items[session_id] = (session, size, now)
+        self._items.move_to_end(session_id)
+
+    def put(self, session_id: str, session: Dict[str, Any], encoded: EncodedSession, now: float):
+        self.delete(session_id)
+        self._items[session_id] = (session, encoded.size, now)
+        self._total_bytes += encoded.size
+
+    def delete(self, session_id: str) -> bool:
+        item = self._items.pop(session_id, None)
+        if item is None:
+            return False
+        self._total_bytes -= item[1]
+        return True
+
+    def oldest(self) -> Optional[Tuple[str, float]]:
+        for session_id, (_, _, last_access) in self._items.items():
+            return session_id, last_access
+        return None
+
+    def count(self) -> int:
+        return len(self._items)
+
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+class SQLiteSessionBackend:
+    """Sessions in a SQLite file, so they survive restarts and are shared between workers"""
+    keeps_text = True
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS rca_sessions ("
+                "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_rca_sessions_last_access ON rca_sessions (last_access)")
+
+    def get(self, session_id: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, last_access FROM rca_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def touch(self, session_id: str, now: float):
+        with self._lock:
+            self._conn.execute("UPDATE rca_sessions SET last_access = ? WHERE session_id = ?", (now, session_id))
+
+    def put(self, session_id: str, session: Dict[str, Any], encoded: EncodedSession, now: float):
+        data = encoded.text()
+        with self._lock:
+            if not encoded.changed:
+                # Unchanged since this worker's previous put: only touch the row, unless another worker rewrote it
+                cursor = self._conn.execute(
+                    "UPDATE rca_sessions SET last_access = ? WHERE session_id = ? AND data = ?", (now, session_id, data)
+                )
+                if cursor.rowcount > 0:
+                    return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO rca_sessions (session_id, data, size, last_access) VALUES (?, ?, ?, ?)",
+                (session_id, data, encoded.size, now)
+            )
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM rca_sessions WHERE session_id = ?", (session_id,))
+        return cursor.rowcount > 0
+
+    def oldest(self) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT session_id, last_access FROM rca_sessions ORDER BY last_access LIMIT 1"
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM rca_sessions").fetchone()[0]
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM rca_sessions").fetchone()[0]
+
+class SessionStore:
+    """Bounded store for /refine_rca sessions
+
+    Sessions idle for longer than `ttl_seconds` expire, and the least recently used
+    sessions are evicted once there are more than `max_entries` or their JSON size
+    exceeds `max_bytes`. Sessions are plain dicts; callers must `put` a session back
+    after changing it. A put does not serialize the messages of earlier turns again, see SessionEncoder.
+    """
+    def __init__(self, backend=None, max_entries: int = 1000, ttl_seconds: float = 3600, max_bytes: int = 64 * 1024 * 1024):
+        self.backend = backend if backend is not None else MemorySessionBackend()
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.encoder = SessionEncoder(keep_text=getattr(self.backend, "keeps_text", True))
+        self.counters = {"hits": 0, "misses": 0, "puts": 0, "expired": 0, "evicted": 0}
+
+    def _expired(self, last_access: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - last_access > self.ttl_seconds
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Return the session and mark it as recently used, or None if it is missing or expired"""
+        now = time.time()
+        self._evict(now)
+        item = self.backend.get(session_id)
+        if item is None:
+            self.counters["misses"] += 1
+            return None
+        self.counters["hits"] += 1
+        self.backend.touch(session_id, now)
+        return item[0]
+
+    def put(self, session_id: str, session: Dict[str, Any]):
+        """Store the session, then evict expired and least recently used sessions beyond the limits"""
+        now = time.time()
+        self.backend.put(session_id, session, self.encoder.encode(session_id, session), now)
+        self.counters["puts"] += 1
+        self._evict(now, keep=session_id)
+
+    def delete(self, session_id: str) -> bool:
+        self.encoder.forget(session_id)
+        return self.backend.delete(session_id)
+
+    def __contains__(self, session_id: str) -> bool:
+        item = self.backend.get(session_id)
+        return item is not None and not self._expired(item[1], time.time())
+
+    def __len__(self) -> int:
+        return self.backend.count()
+
+    def sweep(self):
+        """Drop expired sessions and enforce the size limits"""
+        self._evict(time.time())
+
+    def _evict(self, now: float, keep: Optional[str] = None):
+        while True:
+            oldest = self.backend.oldest()
+            if oldest is None:
+                return
+            session_id, last_access = oldest
+            if self._expired(last_access, now):
+                counter = "expired"
+            elif session_id != keep and (self.backend.count() > self.max_entries or self.backend.total_bytes() > self.max_bytes):
+                counter = "evicted"
+            else:
+                return
+            self.delete(session_id)
+            self.counters[counter] += 1
+            logger.info(f"Session {session_id} {counter}")
+
+    def stats(self) -> Dict[str, Any]:
+        self.sweep()
+        return {
+            **self.counters,
+            "sessions": self.backend.count(),
+            "bytes": self.backend.total_bytes(),
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds
+        }
+
+def create_session_store() -> SessionStore:
+    """Create the session store configured by the SESSION_* environment variables
+
+    SESSION_SQLITE_PATH selects the SQLite backend; without it sessions live in memory.
+    """
+    sqlite_path = os.getenv("SESSION_SQLITE_PATH", "")
+    backend = SQLiteSessionBackend(sqlite_path) if sqlite_path else MemorySessionBackend()
+    store = SessionStore(
+        backend,
+        max_entries=int(os.getenv("SESSION_MAX_ENTRIES", "1000")),
+        ttl_seconds=float(os.getenv("SESSION_TTL_SECONDS", "3600")),
+        max_bytes=int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+    )
+    logger.info(f"Session store initialized, backend: {type(backend).__name__}")
+    return store
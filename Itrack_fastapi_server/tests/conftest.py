@@ -0,0 +1,82 @@
+import os
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+@pytest.fixture(scope="session")
+def fake_openai_server():
+    """benchmarks/fake_openai_server.py served on a free local port, yields its /v1 base URL"""
+    import uvicorn
+    import fake_openai_server
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(fake_openai_server.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("Fake OpenAI server did not start")
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{port}/v1"
+    server.should_exit = server.force_exit = True
+    thread.join(timeout=5)
+
+@pytest.fixture
+def fake_openai(fake_openai_server):
+    """The fake server's module, reset to its default behaviour for each test"""
+    import fake_openai_server as server
+    server.reset()
+    yield server
+    server.reset()
+
+@pytest.fixture
+def make_vector_search(monkeypatch, tmp_path):
+    """Factory of VectorSearch instances embedding with bench_hybrid_search's hashing encoder
+
+    Instances share tmp_path/store unless given another store_dir; the encoder counts the
+    texts it embedded in `encoded`.
+    """
+    import vector_utils
+    from bench_hybrid_search import HashingEncoder
+
+    class CountingEncoder(HashingEncoder):
+        encoded = 0
+
+        def encode(self, texts, convert_to_numpy=True, **kwargs):
+            CountingEncoder.encoded += len(texts)
+            return super().encode(texts, convert_to_numpy, **kwargs)
+
+    monkeypatch.setattr(vector_utils, "load_embedding_model", lambda model_name, backend=None: CountingEncoder(64))
+
+    def make(**kwargs):
+        kwargs.setdefault("store_dir", str(tmp_path / "store"))
+        kwargs.setdefault("backend", "numpy")
+        return vector_utils.VectorSearch(**kwargs)
+    make.encoder = CountingEncoder
+    return make
+
+@pytest.fixture
+def llm_server(monkeypatch):
+    """The llm_server module, imported with a placeholder OpenAI key"""
+    monkeypatch.setenv("OPENAI_API_KEY", os.getenv("OPENAI_API_KEY") or "test-key")
+    import llm_server
+    return llm_server
+
+@pytest.fixture
+def fake_llm_server(llm_server, fake_openai, fake_openai_server, monkeypatch):
+    """llm_server calling the fake OpenAI server, with an empty prediction cache"""
+    from openai_client import OpenAIClient
+    from response_cache import ResponseCache
+    monkeypatch.setattr(llm_server, "openai_client", OpenAIClient(api_key="sk-test", base_url=fake_openai_server, backoff_base=0.01))
+    monkeypatch.setattr(llm_server, "prediction_cache", ResponseCache())
+    return llm_server
@@ -0,0 +1,231 @@
+import glob
+import os
+import random
+
+import numpy as np
+import pytest
+
+from bench_hybrid_search import synthetic_tickets
+from case_stream import CaseRecord
+
+@pytest.fixture
+def tickets():
+    # As the endpoints pass them, and as the case store reads them back
+    return [CaseRecord.from_dict(case) for case in synthetic_tickets(random.Random(5), 60)]
+
+def results(search, query):
+    """Every dense distance and BM25 score by case ID, row numbers differ between indexes"""
+    snapshot = search.snapshot
+    vector = search.encode_queries([query])[0]
+    dense = {case['ID']: distance for case, distance in search.search_vector(vector, len(snapshot))}
+    rows, scores = snapshot.lexical.search(query, len(snapshot.cases))
+    lexical = {snapshot.cases[row]['ID']: float(score) for row, score in zip(rows.tolist(), scores.tolist())}
+    return dense, lexical
+
+def assert_matches_rebuild(make_vector_search, search, cases):
+    """Searches on `search` answer as an index built from scratch over `cases` does"""
+    rebuilt = make_vector_search(store_dir="")
+    rebuilt.build_index(cases)
+    assert len(search.snapshot) == len(cases)
+    for case in cases[:5]:
+        # Backends sum in different orders, distances may differ in the last bits
+        dense, lexical = results(search, case['Summary'])
+        expected_dense, expected_lexical = results(rebuilt, case['Summary'])
+        assert dense == pytest.approx(expected_dense, abs=1e-5)
+        assert lexical == pytest.approx(expected_lexical, abs=1e-5)
+
+def test_changes_update_the_index_in_place(make_vector_search, tickets):
+    search = make_vector_search()
+    search.apply_case_changes([("upsert", case) for case in tickets[:40]])
+    first = search.snapshot
+    encoded = make_vector_search.encoder.encoded
+
+    changed = CaseRecord.from_dict(dict(tickets[3], RCAReport=tickets[3]['RCAReport'] + "\n- Also a stale proxy"))
+    relabeled = CaseRecord.from_dict(dict(tickets[4], Category="Reporting"))
+    stats = search.apply_case_changes(
+        [("upsert", case) for case in tickets[40:]] + [("upsert", changed), ("upsert", relabeled), ("delete", tickets[5]['ID'])]
+    )
+    assert stats == {"upserted": 22, "deleted": 1, "skipped": 0}
+    # Only the new cases and the changed report were embedded
+    assert make_vector_search.encoder.encoded - encoded == 21
+    # The previous snapshot is untouched by the update
+    assert len(first) == 40 and first.cases[3] == tickets[3]
+
+    current = [case for case in tickets if case['ID'] != tickets[5]['ID']]
+    current[3], current[4] = changed, relabeled
+    assert_matches_rebuild(make_vector_search, search, current)
+    assert search.snapshot.filter_rows({"Category": ["Reporting"]}).tolist() == sorted(
+        row for row, case in enumerate(search.snapshot.cases) if case is not None and case['Category'] == "Reporting"
+    )
+
+def test_changes_are_logged_and_replayed_by_a_new_process(make_vector_search, tickets, tmp_path):
+    search = make_vector_search()
+    search.apply_case_changes([("upsert", case) for case in tickets[:30]])
+    base_files = glob.glob(str(tmp_path / "store" / "embeddings-*.bin"))
+    search.apply_case_changes([("upsert", case) for case in tickets[30:]] + [("delete", tickets[0]['ID'])])
+    # The base was not rewritten, the change went to the log and one segment
+    assert glob.glob(str(tmp_path / "store" / "embeddings-*.bin")) == base_files
+    assert len(glob.glob(str(tmp_path / "store" / "segment-*.bin"))) == 1
+
+    encoded = make_vector_search.encoder.encoded
+    restarted = make_vector_search()
+    assert make_vector_search.encoder.encoded == encoded
+    assert restarted.case_store.keys == search.case_store.keys
+    np.testing.assert_array_equal(restarted.case_store.embeddings, search.case_store.embeddings)
+    assert_matches_rebuild(make_vector_search, restarted, tickets[1:])
+
+def test_other_workers_changes_are_picked_up(make_vector_search, tickets):
+    first, second = make_vector_search(), make_vector_search()
+    first.apply_case_changes([("upsert", case) for case in tickets[:30]])
+    second.apply_case_changes([("upsert", case) for case in tickets[30:]])
+    first.apply_case_changes([("delete", tickets[31]['ID'])])
+    assert_matches_rebuild(make_vector_search, first, tickets[:31] + tickets[32:])
+
+def test_dead_rows_are_compacted(make_vector_search, tickets, tmp_path, monkeypatch):
+    monkeypatch.setenv("VECTOR_STORE_COMPACT_RATIO", "0.25")
+    search = make_vector_search()
+    search.apply_case_changes([("upsert", case) for case in tickets])
+    search.apply_case_changes([("delete", case['ID']) for case in tickets[:10]])
+    assert len(search.snapshot.dead) == 10
+    search.apply_case_changes([("delete", case['ID']) for case in tickets[10:20]])
+    assert search.case_store.dead_rows == set() and len(search.case_store.keys) == 40
+    assert len(search.snapshot.dead) == 0
+    assert len(glob.glob(str(tmp_path / "store" / "embeddings-*.bin"))) == 1
+    assert glob.glob(str(tmp_path / "store" / "segment-*.bin")) == []
+    assert_matches_rebuild(make_vector_search, search, tickets[20:])
+
+@pytest.mark.parametrize("backend", ["sklearn", "faiss_flat"])
+def test_dead_rows_are_never_returned(make_vector_search, tickets, backend):
+    if backend == "faiss_flat":
+        pytest.importorskip("faiss")
+    search = make_vector_search(backend=backend, store_dir="")
+    search.apply_case_changes([("upsert", case) for case in tickets[:50]])
+    search.apply_case_changes([("upsert", case) for case in tickets[50:]] + [("delete", tickets[0]['ID'])])
+    assert_matches_rebuild(make_vector_search, search, tickets[1:])
+    vector = search.encode_queries([tickets[0]['Summary']])[0]
+    found = [case['ID'] for case, _ in search.search_vector(vector, 59)]
+    assert sorted(found) == sorted(case['ID'] for case in tickets[1:])
+
+def test_inline_history_is_searched_on_its_own(make_vector_search, tickets, tmp_path):
+    search = make_vector_search()
+    search.apply_case_changes([("upsert", case) for case in tickets[:40]])
+    published = search.snapshot
+    stored = sorted(os.listdir(tmp_path / "store"))
+
+    # Overlaps the ingested cases, one of them with another report
+    posted = tickets[35:50]
+    posted[0] = CaseRecord.from_dict(dict(posted[0], RCAReport="## 3. Root Causes\n- Inline only"))
+    index_sync = search.begin_index_sync()
+    for case in posted:
+        index_sync.add(case)
+    snapshot = index_sync.finish()
+    assert sorted(case['ID'] for case in snapshot.cases) == sorted(case['ID'] for case in posted)
+    vector = search.encode_queries([tickets[0]['Summary']])[0]
+    found = [case['ID'] for case, _ in search.search_vector(vector, 60, snapshot)]
+    assert sorted(found) == sorted(case['ID'] for case in posted)
+
+    # The ingested cases, the published index and the store on disk are untouched
+    assert search.snapshot is published
+    assert search.case_store.cases[search.case_store.rows[tickets[35]['ID']]] == tickets[35]
+    assert sorted(os.listdir(tmp_path / "store")) == stored
+
+    # Reposting embeds nothing again, the inline cache is bounded
+    encoded = make_vector_search.encoder.encoded
+    index_sync = search.begin_index_sync()
+    for case in posted:
+        index_sync.add(case)
+    index_sync.finish()
+    assert make_vector_search.encoder.encoded == encoded
+    search._inline_cache_size = 5
+    search._inline_embeddings([search._case_entry(tickets[59])], {})
+    assert len(search._inline_cache) == 5
+
+def test_upsert_rejects_malformed_cases(llm_server):
+    from fastapi.testclient import TestClient
+    client = TestClient(llm_server.app)
+    for cases in ([{"ID": "1", "RCAReport": 5}], [{"ID": "1", "RCAReport": ["x"]}], ["x"], [None]):
+        response = client.post("/cases/upsert", json={"cases": cases})
+        assert response.status_code == 422, cases
+
+def test_index_sync_parses_cases_only_in_embed(make_vector_search, tickets, monkeypatch):
+    import threading
+    import vector_utils
+    search = make_vector_search(store_dir="")
+    search.embed_batch_size = 4
+    parsed_on = []
+    original = vector_utils.content_hash
+    monkeypatch.setattr(vector_utils, "content_hash", lambda text: parsed_on.append(threading.get_ident()) or original(text))
+
+    index_sync = search.begin_index_sync()
+    full = [index_sync.add(case) for case in tickets[:20]]
+    assert parsed_on == []
+    # A batch is embed_batch_size * 4 cases
+    assert full.index(True) == 15
+
+    worker = threading.Thread(target=index_sync.embed, args=(index_sync.take_pending(),))
+    worker.start()
+    worker.join()
+    assert set(parsed_on) == {worker.ident}
+    assert len(index_sync.finish()) == 20
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_numpy_backend_searches_the_mapped_store_in_place(make_vector_search, tickets, dtype):
+    search = make_vector_search(store_dtype=dtype)
+    search.apply_case_changes([("upsert", case) for case in tickets[:40]])
+    search.apply_case_changes([("upsert", case) for case in tickets[40:]])
+    restarted = make_vector_search(store_dtype=dtype)
+    blocks = restarted.snapshot.index.blocks
+    assert len(blocks) == 2 and isinstance(blocks[0], np.memmap) and blocks[0].dtype == np.dtype(dtype)
+    assert blocks[0] is restarted.case_store._base
+    if dtype == "float32":
+        assert_matches_rebuild(make_vector_search, restarted, tickets)
+    else:
+        vector = restarted.encode_queries([tickets[7]['Summary']])[0]
+        assert restarted.search_vector(vector, 1)[0][0]['ID'] == tickets[7]['ID']
+
+def test_coalesced_jobs_report_their_own_counts(make_vector_search, tickets):
+    import asyncio
+    from case_ingest import CaseIngestWorker
+    search = make_vector_search()
+    search.apply_case_changes([("upsert", case) for case in tickets[:10]])
+    applied = []
+
+    async def apply(groups):
+        applied.append(len(groups))
+        return search.apply_case_change_groups(groups)
+
+    async def main():
+        worker = CaseIngestWorker(apply, max_jobs=1)
+        jobs = [
+            worker.submit([("upsert", case) for case in tickets[10:20]]),
+            worker.submit([("delete", tickets[0]['ID']), ("delete", "missing"), ("upsert", dict(tickets[1], RCAReport=""))]),
+            worker.submit([("delete", tickets[15]['ID'])])
+        ]
+        worker.start()
+        try:
+            results = [await worker.wait(job_id) for job_id in jobs]
+            # Finished jobs make room for newer ones
+            await worker.wait(worker.submit([]))
+            return results, await worker.wait(jobs[0])
+        finally:
+            await worker.stop()
+
+    results, evicted = asyncio.run(main())
+    assert applied[0] == 3
+    assert [job["result"] for job in results] == [
+        {"upserted": 10, "deleted": 0, "skipped": 0},
+        {"upserted": 0, "deleted": 1, "skipped": 1},
+        {"upserted": 0, "deleted": 1, "skipped": 0}
+    ]
+    assert all(job["status"] == "done" for job in results) and evicted is None
+    assert len(search.snapshot) == 18
+
+def test_missing_job_is_an_error(llm_server, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    async def wait(job_id):
+        return None
+    monkeypatch.setattr(llm_server.case_ingest_worker, "wait", wait)
+    monkeypatch.setattr(llm_server.case_ingest_worker, "submit", lambda changes: "evicted")
+    response = TestClient(llm_server.app).post("/cases/delete?wait=true", json={"ids": ["1"]})
+    assert response.status_code == 500 and "evicted" in response.json()["detail"]
@@ -0,0 +1,170 @@
+import zlib
+
+import numpy as np
+import pytest
+
+from case_stream import CaseRecord
+from vector_backends import normalize_rows
+from vector_utils import CaseStore
+
+class Encoder:
+    """Deterministic embeddings seeded by the text, records what it was asked to embed"""
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, texts):
+        self.texts.extend(texts)
+        return np.stack([np.random.default_rng(zlib.crc32(text.encode())).standard_normal(8) for text in texts])
+
+def entry(case_id, report):
+    case = CaseRecord.from_dict({"ID": case_id, "RCAReport": report})
+    return (case_id, f"hash-{report}", case, report)
+
+@pytest.fixture
+def entries():
+    return [entry(str(i), f"report {i}") for i in range(5)]
+
+def test_warm_start_maps_the_store_without_embedding(tmp_path, entries):
+    encoder = Encoder()
+    store = CaseStore(str(tmp_path), "float32", "model")
+    store.sync(entries, encoder)
+    assert len(encoder.texts) == 5
+
+    restarted = CaseStore(str(tmp_path), "float32", "model")
+    assert restarted.load()
+    assert isinstance(restarted.embeddings, np.memmap)
+    assert restarted.keys == store.keys and restarted.cases == store.cases
+    np.testing.assert_array_equal(restarted.embeddings, store.embeddings)
+
+    restarted.sync(entries, encoder)
+    assert len(encoder.texts) == 5
+
+def test_only_changed_hashes_are_re_embedded(tmp_path, entries):
+    encoder = Encoder()
+    store = CaseStore(str(tmp_path), "float32", "model")
+    store.sync(entries, encoder)
+    before = store.embeddings[store.rows["1"]].copy()
+
+    entries[2] = entry("2", "report 2, revised")
+    change = store.sync(entries[1:], encoder)
+    assert encoder.texts[5:] == ["report 2, revised"]
+    assert change.stats == {"reused": 3, "embedded": 1, "evicted": 1, "updated": 0}
+    assert "0" not in store.rows and len(store) == 4
+    np.testing.assert_array_equal(store.embeddings[store.rows["1"]], before)
+    np.testing.assert_allclose(store.embeddings[store.rows["2"]], normalize_rows(encoder(["report 2, revised"]))[0], rtol=1e-6)
+
+def test_payload_change_keeps_the_embedding(tmp_path, entries):
+    encoder = Encoder()
+    store = CaseStore(str(tmp_path), "float32", "model")
+    store.sync(entries, encoder)
+    row = store.rows["3"]
+    renamed = CaseRecord.from_dict({"ID": "3", "Subject": "Renamed", "RCAReport": "report 3"})
+    change = store.apply([("3", "hash-report 3", renamed, "report 3")], [], encoder)
+    assert len(encoder.texts) == 5
+    assert change.stats["updated"] == 1 and store.rows["3"] == row
+
+    restarted = CaseStore(str(tmp_path), "float32", "model")
+    restarted.load()
+    assert restarted.cases[row]["Subject"] == "Renamed"
+
+def test_float16_store_round_trips(tmp_path, entries):
+    encoder = Encoder()
+    store = CaseStore(str(tmp_path), "float16", "model")
+    store.sync(entries[:3], encoder)
+    store.sync(entries, encoder)
+
+    restarted = CaseStore(str(tmp_path), "float16", "model")
+    assert restarted.load()
+    assert restarted._base.dtype == np.float16
+    # The live store already holds the float16-rounded values a reload reads back
+    np.testing.assert_array_equal(restarted.embeddings, store.embeddings)
+    np.testing.assert_allclose(restarted.embeddings[restarted.rows["4"]], normalize_rows(encoder(["report 4"]))[0], rtol=1e-3, atol=1e-3)
+
+def test_store_of_another_model_is_ignored(tmp_path, entries):
+    CaseStore(str(tmp_path), "float32", "model").sync(entries, Encoder())
+    other = CaseStore(str(tmp_path), "float32", "other-model")
+    assert not other.load()
+    assert len(other) == 0
+
+def test_torn_log_line_is_not_replayed(tmp_path, entries):
+    encoder = Encoder()
+    store = CaseStore(str(tmp_path), "float32", "model")
+    store.sync(entries[:3], encoder)
+    store.sync(entries, encoder)
+    with open(tmp_path / store._log_name, "ab") as f:
+        f.write(b'{"updates": [')
+
+    restarted = CaseStore(str(tmp_path), "float32", "model")
+    assert restarted.load()
+    assert restarted.keys == store.keys
+
+def test_replay_survives_changes_logged_by_unlocked_writers(tmp_path, entries):
+    encoder = Encoder()
+    CaseStore(str(tmp_path), "float32", "model").sync(entries, encoder)
+    first, second = CaseStore(str(tmp_path), "float32", "model"), CaseStore(str(tmp_path), "float32", "model")
+    first.load()
+    second.load()
+    # Both delete the same case and append the same new key from the same log offset
+    first.apply([entry("300", "report 300")], ["3"], encoder)
+    second.apply([entry("300", "report 300, again")], ["3"], encoder)
+    first.apply([entry("301", "report 301")], [], encoder)
+
+    restarted = CaseStore(str(tmp_path), "float32", "model")
+    assert restarted.load()
+    assert sorted(restarted.rows) == ["0", "1", "2", "300", "301", "4"]
+    assert restarted.hashes[restarted.rows["300"]] == "hash-report 300, again"
+    assert len(restarted) == sum(key is not None for key in restarted.keys)
+
+def test_locked_writers_see_each_others_changes(tmp_path, entries):
+    encoder = Encoder()
+    CaseStore(str(tmp_path), "float32", "model").sync(entries, encoder)
+    first, second = CaseStore(str(tmp_path), "float32", "model"), CaseStore(str(tmp_path), "float32", "model")
+    first.load()
+    second.load()
+    for store, upserts, deletes in ((first, [entry("300", "report 300")], ["3"]), (second, [entry("300", "report 300")], ["3"])):
+        with store.locked():
+            store.reload_if_changed()
+            store.apply(upserts, deletes, encoder)
+    # The second writer caught up first, so it had nothing to do
+    assert len(encoder.texts) == 6
+    assert second.keys == first.keys
+
+def test_lock_excludes_other_stores(tmp_path):
+    import threading
+    import time
+    first, second = CaseStore(str(tmp_path), "float32", "model"), CaseStore(str(tmp_path), "float32", "model")
+    events = []
+
+    def contend():
+        with second.locked():
+            events.append("second")
+
+    with first.locked():
+        with first.locked():
+            worker = threading.Thread(target=contend)
+            worker.start()
+            time.sleep(0.1)
+        events.append("first")
+    worker.join()
+    assert events == ["first", "second"]
+
+def test_store_written_before_normalization_is_normalized_on_load(tmp_path, entries):
+    import json
+    encoder = Encoder()
+    store = CaseStore(str(tmp_path), "float32", "model")
+    store.sync(entries, encoder)
+    # Rewrite it as an older version did: raw embeddings, no "normalized" flag
+    metadata_path = tmp_path / CaseStore.METADATA_FILE
+    metadata = json.loads(metadata_path.read_text())
+    del metadata["normalized"]
+    raw = (store.embeddings * np.arange(1, len(store.keys) + 1)[:, None]).astype(np.float32)
+    raw.tofile(tmp_path / metadata["file"])
+    metadata_path.write_text(json.dumps(metadata))
+
+    restarted = CaseStore(str(tmp_path), "float32", "model")
+    assert restarted.load()
+    np.testing.assert_allclose(np.linalg.norm(restarted.embeddings, axis=1), 1, rtol=1e-5)
+    np.testing.assert_allclose(restarted.embeddings, normalize_rows(raw), rtol=1e-5, atol=1e-6)
+    # The next change rewrites the store in the current format
+    restarted.apply([entry("9", "report 9")], [], encoder)
+    assert json.loads(metadata_path.read_text())["normalized"] is True
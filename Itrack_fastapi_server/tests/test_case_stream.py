@@ -0,0 +1,88 @@
+import asyncio
+import json
+import pickle
+
+import pytest
+
+from case_stream import ARRAY_START, CaseRecord, iter_json_object
+
+def parse(body, chunk_size=None, stream_key="historical_cases"):
+    """All (key, value) pairs of `body`, fed in chunks of `chunk_size` bytes"""
+    data = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode("utf-8")
+    chunk_size = chunk_size or len(data) or 1
+
+    async def chunks():
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+
+    async def collect():
+        return [item async for item in iter_json_object(chunks(), stream_key)]
+    return asyncio.run(collect())
+
+BODY = {
+    "description": "Drucker \"Warteschlange\" hängt \\ seit 10:00 — 打印机",
+    "new_case": {"historical_cases": [{"ID": "not streamed"}], "Priority": 2},
+    "historical_cases": [
+        {"ID": "1", "RCAReport": "## 3. Root Causes\n- Spooler\tdeadlock   🖨"},
+        {"ID": 2, "Tags": [[1, 2], {"nested": [3.5e-3, -12345678901234567890]}]},
+        "not a case",
+        None
+    ],
+    "filters": {"Category": ["Printing"]},
+    "count": 1234567
+}
+
+def expected_items(body):
+    items = []
+    for key, value in body.items():
+        if key == "historical_cases":
+            items.append((key, ARRAY_START))
+            items.extend((key, case) for case in value)
+        else:
+            items.append((key, value))
+    return items
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 2, 3, 7, 64])
+def test_chunk_boundaries_do_not_change_the_result(chunk_size):
+    assert parse(BODY, chunk_size) == expected_items(BODY)
+
+def test_escaped_unicode_is_decoded():
+    body = b'{"historical_cases": [{"ID": "\\u00e9\\"\\\\\\/\\ud83d\\udda8"}]}'
+    assert parse(body, 1) == [("historical_cases", ARRAY_START), ("historical_cases", {"ID": "é\"\\/\U0001f5a8"})]
+
+def test_only_the_top_level_array_is_streamed():
+    body = {"new_case": {"historical_cases": [1, 2]}, "historical_cases": []}
+    assert parse(body, 5) == [("new_case", {"historical_cases": [1, 2]}), ("historical_cases", ARRAY_START)]
+    # Not an array: yielded as an ordinary value
+    assert parse({"historical_cases": None}) == [("historical_cases", None)]
+
+def test_number_split_across_chunks_is_read_whole():
+    assert parse(b'{"count": 1234567}', 3) == [("count", 1234567)]
+    assert parse(b'{"historical_cases": [12, 3.25e2]}', 1) == [
+        ("historical_cases", ARRAY_START), ("historical_cases", 12), ("historical_cases", 325.0)
+    ]
+
+@pytest.mark.parametrize("body", [
+    b'', b'[]', b'{"a": 1', b'{"a" 1}', b'{"a": 1,}', b'{1: 2}', b'{"historical_cases": [1 2]}',
+    b'{"a": 1}x', b'{"a": 1} {"b": 2}', b'{}]', b'{"historical_cases": [1]} ,'
+])
+def test_malformed_bodies_are_rejected(body):
+    for chunk_size in (None, 1):
+        with pytest.raises(ValueError):
+            parse(body, chunk_size)
+
+def test_whitespace_around_the_object_is_accepted():
+    assert parse(b' \n{ }\r\n\t ', 1) == []
+    assert parse(b'{"a": 1}\n\n', 2) == [("a", 1)]
+
+def test_case_record_normalizes_posted_cases():
+    case = CaseRecord.from_dict({"ID": "7", "Subject": "Spooler", "Category": "Printing", "X_PREFERENCE": 2, "Extra": "dropped"})
+    assert dict(case) == {
+        "ID": "7", "CaseNumber": "7", "Subject": "Spooler", "Summary": "Spooler", "Description": "",
+        "Category": "Printing", "CategoryName": "Printing", "Task": "", "TaskName": "", "Priority": "",
+        "PREFERENCE": 2, "DefectPhase": "", "RCAReport": ""
+    }
+    assert "Extra" not in case and case.get("Extra") is None
+    assert pickle.loads(pickle.dumps(case)) == case
+    with pytest.raises(AttributeError):
+        case.ID = "8"
@@ -0,0 +1,75 @@
+import random
+
+import pytest
+
+from bench_hybrid_search import synthetic_tickets
+from case_stream import CaseRecord
+from field_predictor import KnnFieldPredictor
+
+def case(module, preference, priority, report="## 3. Root Causes\n- Spooler deadlock"):
+    return {"ID": module, "CategoryName": module, "PREFERENCE": preference, "Priority": priority, "RCAReport": report}
+
+def test_clear_majority_wins():
+    neighbors = [
+        (case("Printing", 1, "Severity 2"), 0.1),
+        (case("Printing", "High", "2"), 0.15),
+        (case("Printing", 2, "Severity 2"), 0.2),
+        (case("Network", 3, "Severity 1"), 0.4),
+        # Too far away to vote
+        (case("Billing", 3, "Severity 3"), 0.9)
+    ]
+    vote = KnnFieldPredictor(min_similarity=0.5, min_cases=3).predict(neighbors)
+    assert vote["predictions"] == {"Module": "Printing", "Priority": "High", "Severity": "Severity 2"}
+    assert vote["field_confidence"]["Module"] == pytest.approx(2.55 / 3.15, abs=1e-4)
+    assert vote["confidence"] == min(vote["field_confidence"].values()) > 0.5
+    assert [voter["ID"] for voter in vote["cases"]] == ["Printing", "Printing", "Printing", "Network"]
+
+def test_split_or_thin_votes_have_low_confidence():
+    predictor = KnnFieldPredictor(min_similarity=0.5, min_cases=3)
+    split = predictor.predict([(case("Printing", 1, "1"), 0.1), (case("Network", 2, "2"), 0.1), (case("Billing", 3, "3"), 0.1)])
+    assert split["confidence"] == pytest.approx(1 / 3, abs=1e-4)
+    # Neighbours without a value still count towards the total
+    missing = predictor.predict([(case("Printing", None, ""), 0.1)] * 2 + [(case("Printing", 1, "1"), 0.1)])
+    assert missing["predictions"] == {"Module": "Printing", "Priority": "High", "Severity": "Severity 1"}
+    assert missing["confidence"] == pytest.approx(1 / 3, abs=1e-4)
+    # A lone close case is no consensus
+    lone = predictor.predict([(case("Printing", 1, "1"), 0.0)])
+    assert lone["field_confidence"]["Module"] == 1.0 and lone["confidence"] == 0.0
+
+def test_no_neighbors():
+    vote = KnnFieldPredictor().predict([])
+    assert vote == {"predictions": {}, "confidence": 0.0, "field_confidence": {"Module": 0.0, "Priority": 0.0, "Severity": 0.0}, "cases": []}
+    assert KnnFieldPredictor().predict([(case("Printing", 1, "1"), 0.8)])["cases"] == []
+
+@pytest.fixture
+def predict(fake_llm_server, make_vector_search, monkeypatch):
+    """POST /predict against ingested synthetic tickets with the kNN vote enabled"""
+    from fastapi.testclient import TestClient
+    from vector_utils import QueryEmbeddingBatcher
+    search = make_vector_search(store_dir="")
+    tickets = [CaseRecord.from_dict(dict(ticket, PREFERENCE=2)) for ticket in synthetic_tickets(random.Random(11), 40)]
+    search.apply_case_changes([("upsert", ticket) for ticket in tickets])
+    monkeypatch.setattr(fake_llm_server, "vector_search", search)
+    monkeypatch.setattr(fake_llm_server, "query_batcher", QueryEmbeddingBatcher(search.encode_queries, window_ms=0))
+    monkeypatch.setattr(fake_llm_server, "PREDICT_KNN_ENABLED", True)
+    client = TestClient(fake_llm_server.app)
+
+    def post(threshold, **new_case):
+        monkeypatch.setattr(fake_llm_server, "PREDICT_KNN_THRESHOLD", threshold)
+        response = client.post("/predict", json={"description": tickets[0]["Description"], "new_case": new_case})
+        assert response.status_code == 200, response.text
+        return response.json()
+    post.tickets = tickets
+    return post
+
+def test_confident_vote_answers_without_openai(predict, fake_openai):
+    result = predict(0.0, Summary=predict.tickets[0]["Summary"])
+    assert result["source"] == "knn" and result["predictions"]["Priority"] == "Medium"
+    assert result["rcaSuggestion"].startswith("Based on similar resolved cases")
+    assert fake_openai.counters["requests"] == 0
+
+def test_low_confidence_vote_falls_back_to_openai(predict, fake_openai):
+    result = predict(1.01, Summary=predict.tickets[0]["Summary"])
+    assert result["source"] == "llm" and 0 <= result["confidence"] <= 1
+    assert result["predictions"] == {"Module": "Network", "Priority": "Medium", "Severity": "Severity 2"}
+    assert fake_openai.counters["requests"] > 0
@@ -0,0 +1,70 @@
+import asyncio
+
+from final_drafts import FinalReportDrafts
+
+class Generator:
+    def __init__(self, seconds=0.0):
+        self.seconds = seconds
+        self.calls = []
+
+    async def __call__(self, rca_data):
+        self.calls.append(rca_data)
+        await asyncio.sleep(self.seconds)
+        return f"report for {rca_data['summary']}"
+
+def drafts(generate, busy=lambda: False, delay=0.0):
+    return FinalReportDrafts(generate, is_busy=busy, delay=delay)
+
+def test_draft_waits_for_the_state_to_settle():
+    async def main():
+        generate = Generator()
+        store = drafts(generate)
+        store.schedule("s", {"summary": "a"})
+        store.schedule("s", {"summary": "b"})
+        await asyncio.sleep(0.02)
+        assert generate.calls == [] and store.counters["unsettled"] == 2
+
+        store.schedule("s", {"summary": "b"})
+        await asyncio.sleep(0.02)
+        assert generate.calls == [{"summary": "b"}]
+        assert await store.take("s", {"summary": "b"}) == "report for b"
+        # The session ended, the next turn starts over
+        store.schedule("s", {"summary": "b"})
+        await asyncio.sleep(0.02)
+        assert len(generate.calls) == 1
+    asyncio.run(main())
+
+def test_draft_for_other_data_is_a_miss():
+    async def main():
+        store = drafts(Generator())
+        store.schedule("s", {"summary": "a"})
+        store.schedule("s", {"summary": "a"})
+        await asyncio.sleep(0.02)
+        assert await store.take("s", {"summary": "changed"}) is None
+        assert store.counters["misses"] == 1
+    asyncio.run(main())
+
+def test_in_flight_refine_call_cancels_and_blocks_the_draft():
+    async def main():
+        generate = Generator(seconds=0.05)
+        store = drafts(generate, delay=0.02)
+        store.schedule("s", {"summary": "a"})
+        store.schedule("s", {"summary": "a"})
+        with store.turn("s"):
+            assert store.stats()["drafts"] == 0
+            # A draft scheduled meanwhile, e.g. by another turn, does not start either
+            store.schedule("s", {"summary": "a"})
+            await asyncio.sleep(0.04)
+        assert generate.calls == [] and store.counters["skipped_active"] == 1
+        assert await store.take("s", {"summary": "a"}) is None
+    asyncio.run(main())
+
+def test_busy_client_skips_drafts():
+    async def main():
+        generate = Generator()
+        store = drafts(generate, busy=lambda: True)
+        store.schedule("s", {"summary": "a"})
+        store.schedule("s", {"summary": "a"})
+        await asyncio.sleep(0.02)
+        assert generate.calls == [] and store.counters["skipped_busy"] == 1
+    asyncio.run(main())
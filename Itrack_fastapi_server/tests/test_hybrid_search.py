@@ -0,0 +1,65 @@
+import random
+
+import pytest
+
+from bench_hybrid_search import synthetic_tickets
+from case_stream import CaseRecord
+from lexical_index import reciprocal_rank_fusion
+
+QUERY = "printer spooler hangs with ERR-77123"
+
+@pytest.fixture
+def search(make_vector_search):
+    tickets = [CaseRecord.from_dict(ticket) for ticket in synthetic_tickets(random.Random(13), 60)]
+    # Only the description names the error code, the embedded report does not
+    tickets[10] = CaseRecord.from_dict(dict(tickets[10], Description="Nightly export fails with ERR-77123"))
+    search = make_vector_search(store_dir="")
+    search.apply_case_changes([("upsert", ticket) for ticket in tickets])
+    search.tickets = tickets
+    return search
+
+def ids(results):
+    return [case['ID'] for case, _ in results]
+
+def test_reciprocal_rank_fusion():
+    # Row 2 is second in both lists and beats rows that top only one
+    assert reciprocal_rank_fusion([[1, 2, 3], [4, 2, 5]], 3) == [2, 1, 4]
+    assert reciprocal_rank_fusion([[], [7]], 5) == [7]
+
+def test_lexical_only_match_is_ranked(search):
+    query = "printer spooler hangs, see XQ-99881"
+    vector = search.encode_queries([query])[0]
+    dense = ids(search.search_vector(vector, 60))
+    # The case farthest from the query, which BM25 alone finds by the error code in its description
+    target = next(ticket for ticket in search.tickets if ticket['ID'] == dense[-1])
+    search.apply_case_changes([("upsert", CaseRecord.from_dict(dict(target, Description="Export fails with XQ-99881")))])
+    rows, _ = search.snapshot.lexical.search(query, 60)
+    assert [search.snapshot.cases[row]['ID'] for row in rows.tolist()] == [target['ID']]
+    assert target['ID'] not in ids(search.search_vector(vector, 5))
+
+    results = search.hybrid_search(query, vector, 5)
+    assert target['ID'] in ids(results)
+    # It reports its cosine distance like the cases the dense ranking found
+    distances = dict((case['ID'], distance) for case, distance in search.search_vector(vector, 60))
+    assert dict((case['ID'], distance) for case, distance in results)[target['ID']] == pytest.approx(distances[target['ID']], abs=1e-6)
+
+@pytest.mark.parametrize("prefilter", [False, True])
+def test_deleted_cases_never_come_back_from_the_lexical_side(search, prefilter):
+    if prefilter:
+        search.prefilter_min_cases, search.prefilter_candidates = 1, 5
+    deleted = {search.tickets[10]['ID'], search.tickets[20]['ID']}
+    # A replaced case keeps its row but drops the terms of its old content
+    changed = CaseRecord.from_dict(dict(search.tickets[30], Description="ERR-77123 " + search.tickets[30]['Description']))
+    search.apply_case_changes([("delete", case_id) for case_id in deleted] + [("upsert", changed)])
+    search.apply_case_changes([("upsert", CaseRecord.from_dict(dict(changed, Description="Resolved")))])
+
+    snapshot = search.snapshot
+    dead = [row for row, case in enumerate(snapshot.cases) if case is None]
+    assert len(dead) == 2 and set(dead) <= set(snapshot.dead)
+    for query in (QUERY, search.tickets[20]['Summary']):
+        rows, _ = snapshot.lexical.search(query, len(snapshot.cases))
+        assert not set(rows.tolist()) & set(dead)
+        found = ids(search.hybrid_search(query, search.encode_queries([query])[0], 58))
+        assert len(found) == len(set(found)) and not set(found) & deleted
+    rows, _ = snapshot.lexical.search("ERR-77123", len(snapshot.cases))
+    assert rows.tolist() == []
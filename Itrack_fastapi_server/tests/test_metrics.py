@@ -0,0 +1,86 @@
+import math
+import re
+
+import metrics
+from metrics import Gauge, Histogram, Registry
+
+# name{label="value",...} value, label values escape \, " and newlines
+SAMPLE_PATTERN = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+LABEL_PATTERN = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\\n]|\\[\\"n])*)"(?:,|$)')
+UNESCAPE = {"\\\\": "\\", '\\"': '"', "\\n": "\n"}
+
+def parse(text):
+    """Metric name -> type, and (sample name, labels, value) of every sample of a text exposition"""
+    types, samples = {}, []
+    assert text.endswith("\n")
+    for line in text[:-1].split("\n"):
+        if line.startswith("# HELP "):
+            continue
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            assert name not in types
+            types[name] = kind
+            continue
+        match = SAMPLE_PATTERN.match(line)
+        assert match, line
+        name, label_text, value = match.groups()
+        labels = {}
+        if label_text:
+            position = 0
+            while position < len(label_text):
+                label = LABEL_PATTERN.match(label_text, position)
+                assert label, label_text
+                labels[label.group(1)] = re.sub(r'\\[\\"n]', lambda escape: UNESCAPE[escape.group()], label.group(2))
+                position = label.end()
+        samples.append((name, labels, float(value)))
+    return types, samples
+
+def check_histograms(types, samples):
+    """Buckets are cumulative, end with +Inf and agree with _count"""
+    for name, kind in types.items():
+        if kind != "histogram":
+            continue
+        series = {}
+        for sample, labels, value in samples:
+            if sample == f"{name}_bucket":
+                key = tuple(sorted((k, v) for k, v in labels.items() if k != "le"))
+                series.setdefault(key, []).append((float(labels["le"]), value))
+        counts = {tuple(sorted(labels.items())): value for sample, labels, value in samples if sample == f"{name}_count"}
+        assert set(series) == set(counts)
+        for key, buckets in series.items():
+            bounds = [bound for bound, _ in buckets]
+            assert bounds == sorted(bounds) and bounds[-1] == math.inf
+            values = [value for _, value in buckets]
+            assert values == sorted(values) and values[-1] == counts[key]
+
+def test_labels_are_escaped_and_buckets_are_cumulative():
+    registry = Registry()
+    histogram = Histogram("test_seconds", "Test latency", ["path"], buckets=(0.1, 1.0), registry=registry)
+    gauge = Gauge("test_items", "Test items", ["name"], registry=registry)
+    odd = 'C:\\temp\n"quoted"'
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, path=odd)
+    histogram.observe(0.2, path="/plain")
+    gauge.set(2.5, name=odd)
+
+    types, samples = parse(registry.render())
+    assert types == {"test_seconds": "histogram", "test_items": "gauge"}
+    check_histograms(types, samples)
+    buckets = [(labels["le"], value) for name, labels, value in samples if name == "test_seconds_bucket" and labels["path"] == odd]
+    assert buckets == [("0.1", 2), ("1", 3), ("+Inf", 4)]
+    assert ("test_seconds_sum", {"path": odd}, 3.65) in samples
+    assert ("test_items", {"name": odd}, 2.5) in samples
+
+def test_metrics_endpoint_output_parses(llm_server):
+    from fastapi.testclient import TestClient
+    client = TestClient(llm_server.app)
+    assert client.get("/cases/jobs/unknown").status_code == 404
+    response = client.get("/metrics")
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/plain; version=0.0.4")
+
+    types, samples = parse(response.text)
+    assert {metric.name for metric in metrics.REGISTRY.metrics} == set(types)
+    check_histograms(types, samples)
+    # Path parameters are reported by their route template
+    assert any(name == "itrack_request_duration_seconds_count" and labels == {"endpoint": "/cases/jobs/{job_id}", "method": "GET", "status": "404"}
+               for name, labels, _ in samples)
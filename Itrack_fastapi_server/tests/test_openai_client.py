@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+import openai_client
+from openai_client import OpenAIClient
+
+MESSAGES = [{"role": "user", "content": "Please provide a root cause analysis for the new ticket"}]
+
+def make_client(base_url, **kwargs):
+    kwargs.setdefault("backoff_base", 0.01)
+    return OpenAIClient(api_key="sk-test", base_url=base_url, **kwargs)
+
+def run(client, coroutine):
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await client.aclose()
+    return asyncio.run(main())
+
+def rate_limit_error(headers):
+    request = httpx.Request("POST", "http://fake/v1/chat/completions")
+    response = httpx.Response(429, headers=headers, request=request)
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+def test_429_is_retried_after_retry_after(fake_openai, fake_openai_server):
+    fake_openai.reset(fail_first=1, retry_after=0.4)
+    client = make_client(fake_openai_server, max_retries=2)
+
+    start = time.perf_counter()
+    response = run(client, client.chat("predict", model="gpt-3.5-turbo", messages=MESSAGES))
+    elapsed = time.perf_counter() - start
+
+    assert response.choices[0].message.content == fake_openai.RCA_REPLY
+    assert fake_openai.counters["requests"] == 2
+    assert client.metrics["predict"]["retries"] == 1
+    assert client.metrics["predict"]["errors"] == 0
+    # The jittered backoff alone would be at most 10 ms
+    assert elapsed >= 0.4
+
+def test_429_fails_once_retries_are_used_up(fake_openai, fake_openai_server):
+    fake_openai.reset(fail_first=10, retry_after=0)
+    client = make_client(fake_openai_server, max_retries=2)
+
+    with pytest.raises(openai.RateLimitError):
+        run(client, client.chat("predict", model="gpt-3.5-turbo", messages=MESSAGES))
+    assert fake_openai.counters["requests"] == 3
+    assert client.metrics["predict"]["errors"] == 1
+
+def test_concurrency_limits_in_flight_calls(fake_openai, fake_openai_server):
+    fake_openai.reset(latency_ms=50)
+    client = make_client(fake_openai_server, max_concurrency=3, endpoint_concurrency={"refine_rca": 2})
+
+    async def calls(endpoint, count):
+        return await asyncio.gather(*(
+            client.chat(endpoint, model="gpt-3.5-turbo", messages=MESSAGES) for _ in range(count)
+        ))
+
+    run(client, calls("predict", 12))
+    assert fake_openai.counters["max_in_flight"] == 3
+    assert client.stats()["waiting"] == 0
+
+    fake_openai.reset(latency_ms=50)
+    client = make_client(fake_openai_server, max_concurrency=3, endpoint_concurrency={"refine_rca": 2})
+    run(client, calls("refine_rca", 8))
+    assert fake_openai.counters["max_in_flight"] == 2
+
+def test_timeout_surfaces_as_an_error(fake_openai, fake_openai_server):
+    fake_openai.reset(latency_ms=5000)
+    client = make_client(fake_openai_server, max_retries=1, endpoint_timeouts={"predict": 0.2})
+
+    start = time.perf_counter()
+    with pytest.raises(openai.APITimeoutError):
+        run(client, client.chat("predict", model="gpt-3.5-turbo", messages=MESSAGES))
+    # Two attempts of 0.2 s each, far from the 5 s the server takes
+    assert time.perf_counter() - start < 2
+    assert fake_openai.counters["requests"] == 2
+    assert client.metrics["predict"]["errors"] == 1
+
+async def collect(stream):
+    chunks = []
+    async for chunk in stream:
+        chunks.append(chunk.choices[0].delta.content or "")
+    return chunks
+
+def test_stream_is_retried_before_the_first_chunk(fake_openai, fake_openai_server):
+    fake_openai.reset(fail_first=1, retry_after=0)
+    client = make_client(fake_openai_server, max_retries=2)
+
+    chunks = run(client, collect(client.chat_stream("final_report", model="gpt-3.5-turbo", messages=MESSAGES)))
+
+    assert "".join(chunks) == fake_openai.RCA_REPLY
+    assert fake_openai.counters["requests"] == 2
+    assert client.metrics["final_report"]["retries"] == 1
+
+def test_stream_is_not_retried_after_the_first_chunk(fake_openai, fake_openai_server, monkeypatch):
+    fake_openai.reset(stream_error_after=2)
+    # Even an error that would be retried while opening the stream must not be retried mid-stream
+    monkeypatch.setattr(openai_client, "is_retryable", lambda error: True)
+    client = make_client(fake_openai_server, max_retries=3)
+    received = []
+
+    async def consume():
+        async for chunk in client.chat_stream("final_report", model="gpt-3.5-turbo", messages=MESSAGES):
+            received.append(chunk.choices[0].delta.content)
+
+    with pytest.raises(openai.APIError):
+        run(client, consume())
+    assert len(received) == 2
+    assert fake_openai.counters["requests"] == 1
+    assert client.metrics["final_report"]["retries"] == 0
+    assert client.metrics["final_report"]["errors"] == 1
+
+def test_backoff_stays_within_its_bounds():
+    client = OpenAIClient(api_key="sk-test", backoff_base=0.5, backoff_max=4.0)
+    error = RuntimeError("connection reset")
+    for attempt in range(8):
+        ceiling = min(4.0, 0.5 * 2 ** attempt)
+        delays = [client._backoff(attempt, error) for _ in range(200)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        # Jittered, not a fixed schedule
+        assert len(set(delays)) > 1
+
+    # Retry-After is a floor, capped by backoff_max
+    for attempt in range(4):
+        assert all(1.5 <= client._backoff(attempt, rate_limit_error({"retry-after": "1.5"})) <= 4.0 for _ in range(100))
+    assert client._backoff(0, rate_limit_error({"retry-after-ms": "2500"})) >= 2.5
+    assert client._backoff(0, rate_limit_error({"retry-after": "60"})) == 4.0
+    asyncio.run(client.aclose())
@@ -0,0 +1,48 @@
+from rca_context import RefineContextManager
+
+def history(turns):
+    messages = []
+    for number in range(turns):
+        messages.append({"role": "user", "content": f"turn {number}: " + "state " * 40})
+        messages.append({"role": "assistant", "content": f"reply {number}: " + "merged " * 40})
+    return messages
+
+CURRENT = {"role": "user", "content": "latest: " + "current state " * 50}
+
+def turn_tokens(manager, messages):
+    return sum(map(manager.estimator.message, messages[:2]))
+
+def test_oldest_turns_are_dropped_first():
+    messages = history(10)
+    manager = RefineContextManager("system prompt", history_tokens=0)
+    manager.history_tokens = 3 * turn_tokens(manager, messages) + 1
+    sent, replayed, stats = manager.build(messages, CURRENT)
+    assert replayed == messages[-6:]
+    assert sent == [{"role": "system", "content": "system prompt"}] + messages[-6:] + [CURRENT]
+    assert stats["replayed_turns"] == 3 and stats["collapsed_turns"] == 7
+    assert stats["prompt_tokens"] == manager.estimator.messages(sent)
+
+def test_system_prompt_and_latest_turn_are_always_kept():
+    messages = history(4)
+    system_prompt = "rules " * 3000
+    # The pinned messages alone exceed the window, no history fits
+    manager = RefineContextManager(system_prompt, history_tokens=10000, context_window=2000, completion_tokens=500)
+    sent, replayed, stats = manager.build(messages, CURRENT)
+    assert sent == [{"role": "system", "content": system_prompt}, CURRENT]
+    assert replayed == [] and stats["collapsed_turns"] == 4
+
+def test_window_limits_the_history_budget():
+    messages = history(6)
+    manager = RefineContextManager("system prompt", history_tokens=100000, completion_tokens=0)
+    pinned = manager.estimator.messages([{"role": "system", "content": "system prompt"}, CURRENT])
+    manager.context_window = pinned + 2 * turn_tokens(manager, messages)
+    _, replayed, _ = manager.build(messages, CURRENT)
+    assert replayed == messages[-4:]
+
+def test_replies_are_not_replayed_without_their_question():
+    stored_system = {"role": "system", "content": "old prompt"}
+    orphan = {"role": "assistant", "content": "reply without a question"}
+    messages = [stored_system, orphan] + history(2)
+    sent, replayed, _ = RefineContextManager("system prompt").build(messages, CURRENT)
+    assert replayed == history(2)
+    assert sent[0]["content"] == "system prompt" and stored_system not in sent and orphan not in sent
@@ -0,0 +1,31 @@
+import pytest
+
+from bench_rca_parser import EDGE_CASE_REPORTS, legacy_embedding_text
+from rca_parser import parse_rca_sections, rca_embedding_text
+
+def test_sections_split_on_headings_and_labels():
+    report = (
+        "# Root Cause Analysis Report (RCA) - Printer Issue\n\n"
+        "## 1. Issue Summary\n- Queue stuck\n\n"
+        "## **3. Root Causes**\n- Spooler deadlock\n\n"
+        "**Resolution**: Restarted the spooler\n\n"
+        "### 7. CONCLUSION\nResolved"
+    )
+    assert parse_rca_sections(report) == {
+        "Issue Summary": "- Queue stuck",
+        "Root Causes": "- Spooler deadlock",
+        "Resolution": "Restarted the spooler",
+        "Conclusion": "Resolved"
+    }
+
+def test_issue_reference_is_not_a_heading():
+    report = "## 3. Root Causes\n#4521 regression in build\nmore detail\n\n## 4. Resolution\nfixed"
+    assert parse_rca_sections(report) == {"Root Causes": "#4521 regression in build\nmore detail", "Resolution": "fixed"}
+    assert rca_embedding_text(report) == legacy_embedding_text(report)
+
+@pytest.mark.parametrize("report", EDGE_CASE_REPORTS)
+def test_edge_cases_match_the_legacy_extraction(report):
+    assert rca_embedding_text(report) == legacy_embedding_text(report)
+
+def test_report_without_sections_is_embedded_whole():
+    assert rca_embedding_text("#12 printer queue stuck") == "RCA: #12 printer queue stuck"
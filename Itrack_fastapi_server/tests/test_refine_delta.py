@@ -0,0 +1,34 @@
+import pytest
+
+@pytest.mark.parametrize("changes", [
+    {"impact_analysis": {"dynamic_fields": [{"is_confirmed": True}]}},
+    {"impact_analysis": {"dynamic_fields": ["x"]}},
+    {"impact_analysis": {"dynamic_fields": "x"}},
+    {"resolution": {"dynamic_fields": [{"key": "k", "type": "string", "value": 1, "is_confirmed": True}]}},
+    {"supplementary_info": "x"},
+    {"dynamic_fields": ["x"]},
+    {"dynamic_fields": "x"}
+])
+def test_malformed_changes_are_rejected(llm_server, changes):
+    from fastapi.testclient import TestClient
+    # Not entered as a context manager, so the lifespan does not load the vector search
+    client = TestClient(llm_server.app)
+    response = client.post("/refine_rca/delta", json={"session_id": "delta-test", "changes": changes})
+    assert response.status_code == 422, response.text
+    assert response.json()["detail"].startswith("Invalid RCA changes")
+
+def test_dynamic_fields_are_merged_by_key(llm_server):
+    state = llm_server.apply_rca_delta({}, {"impact_analysis": {"dynamic_fields": [
+        {"key": "region", "type": "string", "value": "EU", "is_confirmed": True},
+        {"key": "users", "type": "array", "value": ["a"], "is_confirmed": False}
+    ]}})
+    state = llm_server.apply_rca_delta(state, {"impact_analysis": {"severity": "Severity 2", "dynamic_fields": [
+        {"key": "region", "type": "string", "value": "US", "is_confirmed": True},
+        {"key": "hosts", "type": "array", "value": ["h1"], "is_confirmed": True}
+    ]}})
+    impact = state["impact_analysis"]
+    assert impact["severity"] == "Severity 2"
+    assert impact["dynamic_fields"] == [
+        {"key": "region", "type": "string", "value": "US", "is_confirmed": True},
+        {"key": "hosts", "type": "array", "value": ["h1"], "is_confirmed": True}
+    ]
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+RCA_REQUEST = {
+    "session_id": "stream-test", "category": "Printing", "task": "Incident", "summary": "Queue stuck",
+    "description": "Printer queue stuck since the update", "root_causes": ["Spooler deadlock"],
+    "conclusion": "", "impact_analysis": {}, "resolution": {}, "preventive_measures": {},
+    "supplementary_info": {}, "additional_questions": {}, "is_final": True
+}
+
+def stream(llm_server):
+    """Status, content type and (event, data) pairs of a /refine_rca/stream response"""
+    from fastapi.testclient import TestClient
+    response = TestClient(llm_server.app).post("/refine_rca/stream", json=RCA_REQUEST)
+    body = response.text
+    # Every event is "event: <name>\ndata: <JSON>" followed by a blank line
+    assert body.endswith("\n\n")
+    events = []
+    for block in body[:-2].split("\n\n"):
+        name, data = block.split("\n")
+        assert name.startswith("event: ") and data.startswith("data: ")
+        events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+    return response.status_code, response.headers["content-type"], events
+
+def test_report_is_streamed_as_token_events(fake_llm_server, fake_openai):
+    status, content_type, events = stream(fake_llm_server)
+    assert status == 200 and content_type.startswith("text/event-stream")
+    names = [name for name, _ in events]
+    assert names == ["token"] * (len(events) - 1) + ["final"] and len(events) > 2
+    final = events[-1][1]
+    assert "".join(data["text"] for _, data in events[:-1]) == fake_openai.REPORT_REPLY
+    assert final["status"] == "success" and final["rca_report"] == fake_openai.REPORT_REPLY
+    assert final["data"]["summary"] == "Queue stuck"
+
+@pytest.mark.parametrize("failure", [{"stream_error_after": 2}, {"fail_first": 10, "retry_after": 0}])
+def test_upstream_failure_ends_with_an_error_event(fake_llm_server, fake_openai, failure):
+    fake_openai.reset(**failure)
+    status, _, events = stream(fake_llm_server)
+    # The status is sent with the first byte, failures can only be reported in the stream
+    assert status == 200
+    names = [name for name, _ in events]
+    tokens = 2 if "stream_error_after" in failure else 0
+    assert names == ["token"] * tokens + ["error"]
+    assert events[-1][1]["detail"].startswith("Error generating RCA report")
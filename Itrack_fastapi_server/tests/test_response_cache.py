@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from response_cache import ResponseCache
+
+def test_concurrent_misses_share_one_call():
+    cache = ResponseCache()
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"answer": 42}
+
+    async def main():
+        results = await asyncio.gather(*(cache.get_or_create("key", factory) for _ in range(10)))
+        again = await cache.get_or_create("key", factory)
+        return results, again
+
+    results, again = asyncio.run(main())
+    assert len(calls) == 1
+    assert results == [{"answer": 42}] * 10 and again == {"answer": 42}
+    assert cache.counters["misses"] == 1 and cache.counters["shared"] == 9 and cache.counters["hits"] == 1
+    assert cache.stats()["inflight"] == 0
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    cache = ResponseCache()
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(cache.get_or_create("key", factory))
+        second = asyncio.ensure_future(cache.get_or_create("key", factory))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "done"
+    assert len(calls) == 1
+
+def test_failed_call_is_shared_and_not_cached():
+    cache = ResponseCache()
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        if len(calls) == 1:
+            raise RuntimeError("upstream failed")
+        return "recovered"
+
+    async def main():
+        results = await asyncio.gather(*(cache.get_or_create("key", factory) for _ in range(3)), return_exceptions=True)
+        return results, await cache.get_or_create("key", factory)
+
+    results, retried = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert retried == "recovered" and len(calls) == 2
+    assert cache.counters["errors"] == 1
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    async def factory():
+        return {"predictions": {"Category": "Printing"}}
+
+    key = ResponseCache.make_key({"messages": [{"role": "user", "content": "Printer  queue\nstuck"}]})
+    asyncio.run(ResponseCache(directory=str(tmp_path)).get_or_create(key, factory))
+
+    restarted = ResponseCache(directory=str(tmp_path))
+    same_key = ResponseCache.make_key({"messages": [{"role": "user", "content": "Printer queue stuck"}]})
+    assert same_key == key
+
+    async def unexpected():
+        pytest.fail("the cached value should have been used")
+    assert asyncio.run(restarted.get_or_create(key, unexpected)) == {"predictions": {"Category": "Printing"}}
+    assert restarted.counters["disk_hits"] == 1
+
+def test_disk_reads_and_writes_run_off_the_event_loop(tmp_path, monkeypatch):
+    import threading
+    cache = ResponseCache(directory=str(tmp_path))
+    threads = {"read": [], "write": []}
+    read_disk, write_disk = cache._read_disk, cache._write_disk
+    monkeypatch.setattr(cache, "_read_disk", lambda key: threads["read"].append(threading.get_ident()) or read_disk(key))
+    monkeypatch.setattr(cache, "_write_disk", lambda *args: threads["write"].append(threading.get_ident()) or write_disk(*args))
+
+    async def factory():
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        results = await asyncio.gather(*(cache.get_or_create("key", factory) for _ in range(5)))
+        return results, threading.get_ident()
+
+    results, loop_thread = asyncio.run(main())
+    assert results == ["value"] * 5
+    # Concurrent callers share one disk lookup and one write
+    assert len(threads["read"]) == 1 and len(threads["write"]) == 1
+    assert loop_thread not in threads["read"] + threads["write"]
+    assert (tmp_path / "ke" / "key.json").exists()
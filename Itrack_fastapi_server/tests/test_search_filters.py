@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+from bench_hybrid_search import synthetic_tickets
+
+@pytest.fixture
+def client(llm_server, make_vector_search, monkeypatch):
+    """Test client whose searches run on a hashing-encoder VectorSearch, without the lifespan"""
+    from fastapi.testclient import TestClient
+    from vector_utils import QueryEmbeddingBatcher
+    search = make_vector_search(store_dir="")
+
+    async def get_vector_search():
+        return search
+    monkeypatch.setattr(llm_server, "get_vector_search", get_vector_search)
+    monkeypatch.setattr(llm_server, "query_batcher", QueryEmbeddingBatcher(search.encode_queries, window_ms=0))
+    return TestClient(llm_server.app)
+
+@pytest.fixture
+def tickets():
+    tickets = synthetic_tickets(random.Random(9), 30)
+    for i, ticket in enumerate(tickets):
+        ticket['Category'] = ["Reporting", "B", "C"][i % 3]
+    return tickets
+
+def search(client, tickets, filters, new_case):
+    response = client.post("/search_similar_cases", json={
+        "description": tickets[0]['Description'], "new_case": new_case, "historical_cases": tickets, "filters": filters
+    })
+    assert response.status_code == 200, response.text
+    return [case['category'] for case in response.json()["similarCases"]]
+
+def test_same_as_new_case_narrows_the_explicit_values(client, tickets):
+    filters = {"Category": ["Reporting", "B"], "same_as_new_case": ["Category"]}
+    assert set(search(client, tickets, filters, {"Category": "b"})) == {"B"}
+    # Outside the explicit values nothing matches, rather than either value
+    assert search(client, tickets, {"Category": ["Reporting"], "same_as_new_case": ["Category"]}, {"Category": "B"}) == []
+    # Without explicit values new_case's value alone is the filter
+    assert set(search(client, tickets, {"same_as_new_case": ["Category"]}, {"Category": "C"})) == {"C"}
+
+def test_resolve_search_filters(llm_server):
+    filters = llm_server.SearchFilters(Category="Reporting", Priority=["1", "Severity 2"], same_as_new_case=["Priority"])
+    assert llm_server.resolve_search_filters(filters, {"Priority": "severity 2"}) == {"Category": ["Reporting"], "Priority": ["severity 2"]}
+    assert llm_server.resolve_search_filters(filters, {"Priority": "3"}) is None
+    # A new_case without the field leaves the explicit values alone
+    assert llm_server.resolve_search_filters(filters, {}) == {"Category": ["Reporting"], "Priority": ["1", "Severity 2"]}
@@ -0,0 +1,115 @@
+import json
+
+import pytest
+
+import session_store
+from session_store import MemorySessionBackend, SessionStore, SQLiteSessionBackend, session_size
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        # Every reading is a distinct instant, so LRU order never depends on ties
+        self.now += 0.001
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(session_store.time, "time", clock)
+    return clock
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemorySessionBackend()
+    return SQLiteSessionBackend(str(tmp_path / "sessions" / "sessions.db"))
+
+def test_least_recently_used_session_is_evicted(backend, clock):
+    store = SessionStore(backend, max_entries=2)
+    store.put("a", {"n": 1})
+    store.put("b", {"n": 2})
+    assert store.get("a") == {"n": 1}
+    store.put("c", {"n": 3})
+    assert "b" not in store
+    assert "a" in store and "c" in store
+    assert store.counters["evicted"] == 1
+
+def test_idle_sessions_expire(backend, clock):
+    store = SessionStore(backend, ttl_seconds=60)
+    store.put("a", {"n": 1})
+    store.put("b", {"n": 2})
+    clock.now += 30
+    assert store.get("b") == {"n": 2}
+    clock.now += 45
+    assert store.get("a") is None
+    assert store.get("b") == {"n": 2}
+    assert store.counters["expired"] == 1
+
+def test_byte_budget_evicts_but_keeps_the_session_just_stored(backend, clock):
+    big = {"text": "x" * 1000}
+    store = SessionStore(backend, max_bytes=2 * session_size(big) + 10)
+    store.put("a", big)
+    store.put("b", big)
+    store.put("c", big)
+    assert len(store) == 2 and "a" not in store
+    assert backend.total_bytes() == 2 * session_size(big)
+
+    # A session over the budget on its own is still kept until the next one arrives
+    store.put("huge", {"text": "y" * 5000})
+    assert len(store) == 1 and "huge" in store
+
+def test_sqlite_sessions_survive_a_restart(tmp_path, clock):
+    path = str(tmp_path / "sessions.db")
+    session = {"rca": {"impact_analysis": {"dynamic_fields": []}}, "history": ["ünïcode"]}
+    SessionStore(SQLiteSessionBackend(path)).put("a", session)
+
+    restarted = SessionStore(SQLiteSessionBackend(path))
+    assert restarted.get("a") == session
+    assert restarted.backend.total_bytes() == session_size(session)
+    assert restarted.delete("a")
+    assert restarted.get("a") is None
+
+def refine_turns(store, turns, start=0, session_id="s"):
+    """Store a session the way /refine_rca does, one turn at a time"""
+    for turn in range(start, start + turns):
+        session = store.get(session_id) or {"is_first_request": True, "state": {}, "context": []}
+        state = {"summary": f"turn {turn}", "root_causes": ["ünïcode \"quoted\""] * (turn + 1), "is_final": False}
+        session["context"] = session["context"][-4:] + [
+            {"role": "user", "content": json.dumps(state)}, {"role": "assistant", "content": json.dumps(state)}
+        ]
+        session["state"] = state
+        session["is_first_request"] = False
+        store.put(session_id, session)
+    return session
+
+def test_put_only_encodes_the_new_turn(backend, clock, monkeypatch):
+    store = SessionStore(backend)
+    refine_turns(store, 3)
+    dumped = []
+    dumps = session_store._dumps
+    monkeypatch.setattr(session_store, "_dumps", lambda value: dumped.append(value) or dumps(value))
+
+    session = refine_turns(store, 1, start=3)
+    messages = [value for value in dumped if isinstance(value, dict) and "role" in value]
+    # The two messages of the new turn, not the replayed ones
+    assert messages == session["context"][-2:]
+    assert backend.total_bytes() == session_size(session)
+    assert store.get("s") == session
+
+def test_unchanged_sqlite_session_is_only_touched(tmp_path, clock):
+    path = str(tmp_path / "sessions.db")
+    first, second = SessionStore(SQLiteSessionBackend(path)), SessionStore(SQLiteSessionBackend(path))
+    session = refine_turns(first, 2)
+    written = []
+    first.backend._conn.set_trace_callback(lambda statement: written.append(statement.split()[0]))
+    first.put("s", first.get("s"))
+    assert "INSERT" not in written and "UPDATE" in written
+
+    # Another worker moved the session on, an unchanged put from this one writes it again
+    refine_turns(second, 1, start=2)
+    written.clear()
+    first.put("s", session)
+    assert "INSERT" in written
+    assert SessionStore(SQLiteSessionBackend(path)).get("s") == session
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from vector_backends import create_backend, normalize_rows
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(3)
+    return normalize_rows(rng.standard_normal((300, 24)) * rng.uniform(0.5, 5, (300, 1)))
+
+def brute_force(vectors, query, k, rows=None):
+    rows = np.arange(len(vectors)) if rows is None else rows
+    similarities = vectors[rows] @ (query / np.linalg.norm(query))
+    order = np.argsort(-similarities, kind="stable")[:k]
+    return rows[order], 1 - similarities[order]
+
+@pytest.mark.parametrize("name", ["numpy", "sklearn", "faiss_flat"])
+def test_search_and_search_subset_match_brute_force(name, vectors):
+    if name == "faiss_flat":
+        pytest.importorskip("faiss")
+    backend = create_backend(name)
+    index = backend.build(vectors)
+    query = np.random.default_rng(4).standard_normal((1, 24)).astype(np.float32) * 7
+
+    distances, indices = backend.search(index, query, 5)
+    expected_rows, expected_distances = brute_force(vectors, query[0], 5)
+    assert indices[0].tolist() == expected_rows.tolist()
+    np.testing.assert_allclose(distances[0], expected_distances, atol=1e-5)
+
+    rows = np.arange(0, 300, 7)
+    distances, indices = backend.search_subset(index, vectors, query, 5, rows)
+    expected_rows, expected_distances = brute_force(vectors, query[0], 5, rows)
+    assert indices[0].tolist() == expected_rows.tolist()
+    np.testing.assert_allclose(distances[0], expected_distances, atol=1e-5)
+
+def test_numpy_index_is_the_normalized_matrix(vectors):
+    # Filtered searches read the same rows, nothing is normalized or copied again
+    assert create_backend("numpy").build(vectors).blocks[0] is vectors
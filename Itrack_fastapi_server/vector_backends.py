@@ -0,0 +1,290 @@
+import numpy as np
+from typing import Any, Iterator, List, Optional, Tuple, Union
+import logging
+import os
+
+logger = logging.getLogger("vector_search")
+
+# Rows scored per matrix product when stored rows are upcast to float32, about 12 MB at 384 dimensions
+BLOCK_ROWS = 8192
+
+class RowBlocks:
+    """Row-wise concatenation of matrices that is never materialized
+
+    Holds e.g. the memory-mapped case store base and the rows appended since, in their
+    stored dtype. Readers get float32 rows; float32 blocks are read in place and float16
+    blocks are upcast BLOCK_ROWS rows at a time, so a search never copies the store.
+    """
+    def __init__(self, blocks: List[np.ndarray]):
+        self.blocks = [block for block in blocks if len(block)]
+        self.starts = np.cumsum([0] + [len(block) for block in self.blocks])
+        width = self.blocks[0].shape[1] if self.blocks else (blocks[0].shape[1] if blocks else 0)
+        self.shape = (int(self.starts[-1]), width)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def chunks(self, start: int = 0) -> Iterator[Tuple[int, np.ndarray]]:
+        """(first row, float32 rows) from row `start` on, at most BLOCK_ROWS rows each"""
+        for block_start, block in zip(self.starts, self.blocks):
+            first = max(start - block_start, 0)
+            for offset in range(first, len(block), BLOCK_ROWS):
+                yield int(block_start + offset), np.asarray(block[offset:offset + BLOCK_ROWS], dtype=np.float32)
+
+    def take(self, rows: np.ndarray) -> np.ndarray:
+        """float32 copy of the rows numbered `rows`"""
+        rows = np.asarray(rows, dtype=np.int64)
+        result = np.empty((len(rows), self.shape[1]), dtype=np.float32)
+        block_of = np.searchsorted(self.starts, rows, side="right") - 1
+        for b, block in enumerate(self.blocks):
+            selected = np.flatnonzero(block_of == b)
+            if len(selected):
+                result[selected] = block[rows[selected] - self.starts[b]]
+        return result
+
+    def array(self, start: int = 0) -> np.ndarray:
+        """Contiguous float32 copy of the rows from `start` on, for engines that keep their own copy"""
+        result = np.empty((max(len(self) - start, 0), self.shape[1]), dtype=np.float32)
+        for first, rows in self.chunks(start):
+            result[first - start:first - start + len(rows)] = rows
+        return result
+
+Vectors = Union[np.ndarray, RowBlocks]
+
+def as_row_blocks(vectors: Vectors) -> RowBlocks:
+    return vectors if isinstance(vectors, RowBlocks) else RowBlocks([np.asarray(vectors)])
+
+def as_float32(vectors: Vectors) -> np.ndarray:
+    if isinstance(vectors, RowBlocks):
+        return vectors.array()
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+class SearchBackend:
+    """Nearest neighbor engine behind VectorSearch
+
+    Every backend answers with cosine distances (1 - cosine similarity) in ascending order,
+    so callers get the same result shape whichever engine is configured. Indexes are built
+    from L2-normalized rows, an array or RowBlocks, which callers keep and pass back to
+    search_subset. sklearn and faiss are imported on first use, so importing this module
+    stays cheap.
+    """
+    name = "base"
+
+    def build(self, vectors: Vectors) -> Any:
+        """Build an index over the L2-normalized embedding matrix"""
+        raise NotImplementedError
+
+    def search(self, index: Any, query_vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (distances, indices), both shaped (number of queries, k)"""
+        raise NotImplementedError
+
+    def extend(self, index: Any, vectors: Vectors, start: int) -> Any:
+        """Return an index over `vectors` whose rows before `start` are already in `index`
+
+        `index` may still be searched by other threads and must not change. The default
+        rebuilds, backends that can append to a copy override this.
+        """
+        return self.build(vectors)
+
+    def search_excluding(self, index: Any, query_vectors: np.ndarray, k: int, excluded: np.ndarray,
+                         size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Like search, but never returns the sorted row numbers in `excluded`
+
+        `size` is the number of rows in the index. Over-fetches by the number of excluded
+        rows and drops them, padding with index -1 if fewer than k rows are left.
+        """
+        queries = np.atleast_2d(query_vectors)
+        distances, indices = self.search(index, queries, min(k + len(excluded), size))
+        result_distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        result_indices = np.full((len(queries), k), -1, dtype=np.int64)
+        for i in range(len(queries)):
+            keep = (indices[i] >= 0) & ~np.isin(indices[i], excluded, assume_unique=True)
+            found = indices[i][keep][:k]
+            result_indices[i, :len(found)] = found
+            result_distances[i, :len(found)] = distances[i][keep][:k]
+        return result_distances, result_indices
+
+    def search_subset(self, index: Any, vectors: Vectors, query_vectors: np.ndarray, k: int,
+                      rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact search restricted to the row numbers in `rows`, indices refer to the full matrix
+
+        Scores the selected rows of the normalized matrix `vectors` the index was built from
+        directly, which for a small subset is cheaper than any index.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        queries = normalize_rows(np.atleast_2d(query_vectors))
+        selected = vectors.take(rows) if isinstance(vectors, RowBlocks) else vectors[rows]
+        positions, top_similarities = top_k_similarities(queries @ selected.T, k)
+        return 1 - top_similarities, rows[positions]
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Return a contiguous float32 copy of `vectors` with L2-normalized rows"""
+    vectors = np.array(vectors, dtype=np.float32, order='C', copy=True)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.maximum(norms, 1e-12)
+    return vectors
+
+def top_k_similarities(similarities: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices and values of the k largest entries of each row, in descending order
+
+    np.argpartition selects the k candidates in linear time, only those k are sorted.
+    """
+    k = min(k, similarities.shape[1])
+    if k < similarities.shape[1]:
+        candidates = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(k), (similarities.shape[0], k))
+    candidate_similarities = np.take_along_axis(similarities, candidates, axis=1)
+    order = np.argsort(-candidate_similarities, axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_similarities, order, axis=1)
+
+class NumpyExactBackend(SearchBackend):
+    """Exact search with matrix products against the pre-normalized rows
+
+    The normalized case rows are the index itself, searched where they are stored: a
+    memory-mapped case store is shared with the page cache rather than copied into each
+    worker. A search is a dot product per case followed by an argpartition top-k; a batch
+    of queries shares each product.
+    """
+    name = "numpy"
+
+    def build(self, vectors: Vectors) -> Any:
+        return as_row_blocks(vectors)
+
+    def search(self, index: Any, query_vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        indices, top_similarities = top_k_similarities(self._similarities(index, query_vectors), k)
+        return 1 - top_similarities, indices.astype(np.int64)
+
+    def extend(self, index: Any, vectors: Vectors, start: int) -> Any:
+        # The rows are the index, appended rows need no work
+        return self.build(vectors)
+
+    def search_excluding(self, index: Any, query_vectors: np.ndarray, k: int, excluded: np.ndarray,
+                         size: int) -> Tuple[np.ndarray, np.ndarray]:
+        similarities = self._similarities(index, query_vectors)
+        similarities[:, excluded] = -np.inf
+        indices, top_similarities = top_k_similarities(similarities, k)
+        return 1 - top_similarities, indices.astype(np.int64)
+
+    @staticmethod
+    def _similarities(index: RowBlocks, query_vectors: np.ndarray) -> np.ndarray:
+        queries = normalize_rows(np.atleast_2d(query_vectors))
+        similarities = np.empty((len(queries), len(index)), dtype=np.float32)
+        for first, rows in index.chunks():
+            if len(queries) == 1:
+                similarities[0, first:first + len(rows)] = rows @ queries[0]
+            else:
+                similarities[:, first:first + len(rows)] = queries @ rows.T
+        return similarities
+
+class SklearnBackend(SearchBackend):
+    """Exact brute-force search through sklearn NearestNeighbors"""
+    name = "sklearn"
+
+    def build(self, vectors: Vectors) -> Any:
+        from sklearn.neighbors import NearestNeighbors
+        index = NearestNeighbors(metric='cosine', algorithm='brute')
+        index.fit(as_float32(vectors))
+        return index
+
+    def search(self, index: Any, query_vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        distances, indices = index.kneighbors(query_vectors, n_neighbors=k)
+        return distances.astype(np.float32), indices.astype(np.int64)
+
+class FaissFlatBackend(SearchBackend):
+    """Exact search with a FAISS IndexFlatIP over L2-normalized vectors"""
+    name = "faiss_flat"
+
+    def build(self, vectors: Vectors) -> Any:
+        import faiss
+        vectors = as_float32(vectors)
+        index = faiss.IndexFlatIP(vectors.shape[1])
+        index.add(vectors)
+        return index
+
+    def search(self, index: Any, query_vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        similarities, indices = index.search(normalize_rows(query_vectors), k)
+        return 1 - similarities, indices.astype(np.int64)
+
+    def extend(self, index: Any, vectors: Vectors, start: int) -> Any:
+        import faiss
+        # Searches may still use `index`, append to a copy
+        index = faiss.clone_index(index)
+        index.add(as_row_blocks(vectors).array(start))
+        return index
+
+class FaissANNBackend(FaissFlatBackend):
+    """Approximate search with a FAISS IVF or HNSW index for large corpora
+
+    Corpora smaller than `min_cases` are served by an exact flat index, where
+    approximate search would only cost recall.
+    """
+    def __init__(self, kind: str = "ivf", nlist: int = 1024, nprobe: int = 16,
+                 hnsw_m: int = 32, ef_search: int = 64, min_cases: int = 10000):
+        if kind not in ("ivf", "hnsw"):
+            raise ValueError(f"Unsupported FAISS index kind: {kind}")
+        self.kind = kind
+        self.name = f"faiss_{kind}"
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search
+        self.min_cases = min_cases
+
+    def build(self, vectors: Vectors) -> Any:
+        if len(vectors) < self.min_cases:
+            logger.info(f"{len(vectors)} cases is below {self.min_cases}, using an exact flat index")
+            return super().build(vectors)
+
+        import faiss
+        vectors = as_float32(vectors)
+        dim = vectors.shape[1]
+        if self.kind == "ivf":
+            # Keep roughly 39 training points per list, as FAISS recommends
+            nlist = max(1, min(self.nlist, len(vectors) // 39))
+            quantizer = faiss.IndexFlatIP(dim)
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)
+            index.nprobe = min(self.nprobe, nlist)
+        else:
+            index = faiss.IndexHNSWFlat(dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efSearch = self.ef_search
+        index.add(vectors)
+        return index
+
+    def extend(self, index: Any, vectors: Vectors, start: int) -> Any:
+        if index.ntotal < self.min_cases <= len(vectors):
+            # Outgrew the exact flat index
+            return self.build(vectors)
+        # IVF lists keep the centroids trained on the earlier rows, a compaction retrains them
+        return super().extend(index, vectors, start)
+
+    def search(self, index: Any, query_vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        distances, indices = super().search(index, query_vectors, k)
+        # Approximate indexes pad with -1 when fewer than k neighbors were reached
+        if (indices < 0).any():
+            logger.warning(f"{self.name} returned fewer than {k} neighbors, consider raising nprobe/efSearch")
+        return distances, indices
+
+def create_backend(name: Optional[str] = None) -> SearchBackend:
+    """Create the search backend named by `name` or the VECTOR_SEARCH_BACKEND environment variable
+
+    Supported names: numpy (default), sklearn, faiss_flat, faiss_ivf, faiss_hnsw
+    """
+    name = (name or os.getenv("VECTOR_SEARCH_BACKEND", "numpy")).strip().lower()
+    if name == "numpy":
+        return NumpyExactBackend()
+    if name == "sklearn":
+        return SklearnBackend()
+    if name == "faiss_flat":
+        return FaissFlatBackend()
+    if name in ("faiss_ivf", "faiss_hnsw"):
+        return FaissANNBackend(
+            kind=name.split("_", 1)[1],
+            nlist=int(os.getenv("FAISS_IVF_NLIST", "1024")),
+            nprobe=int(os.getenv("FAISS_IVF_NPROBE", "16")),
+            hnsw_m=int(os.getenv("FAISS_HNSW_M", "32")),
+            ef_search=int(os.getenv("FAISS_HNSW_EF_SEARCH", "64")),
+            min_cases=int(os.getenv("FAISS_ANN_MIN_CASES", "10000"))
+        )
+    raise ValueError(f"Unknown vector search backend: {name}")
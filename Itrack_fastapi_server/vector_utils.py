@@ -1,29 +1,667 @@
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.neighbors import NearestNeighbors
-from typing import List, Dict, Any, Tuple
-import re
+from typing import List, Dict, Any, Tuple, Optional, Callable, Union
 import logging
 import json
+import os
+import glob
+import uuid
 import time
-import openai
-import faiss
+import threading
+import asyncio
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import partial
+from vector_backends import RowBlocks, SearchBackend, create_backend, normalize_rows
+from rca_parser import content_hash, rca_embedding_text
+from embedding_models import embedding_backend_name, load_embedding_model
+from lexical_index import BM25Index, LexicalSnapshot, reciprocal_rank_fusion
+from case_stream import CaseRecord
+from metrics import EMBEDDING_LATENCY, INDEX_BUILD_LATENCY, QUEUE_WAIT, SEARCH_LATENCY
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger("vector_search")
 
+def case_key(case: Dict[str, Any], content_hash: str) -> str:
+    """Key a case by its ID, falling back to its content hash when it has no usable ID"""
+    case_id = case.get('ID')
+    if case_id is None or str(case_id) in ('', 'Unknown'):
+        return f"hash:{content_hash}"
+    return str(case_id)
+
+# Case attributes that searches can be restricted to
+FILTER_FIELDS = ('Category', 'Task', 'DefectPhase', 'Priority')
+
+def filter_value(field: str, value: Any) -> str:
+    """Comparable form of an attribute value: trimmed, lowercased, priorities as Severity N"""
+    value = str(value).strip().lower()
+    if field == 'Priority' and value and not value.startswith('severity'):
+        value = f"severity {value}"
+    return value
+
+def attribute_rows(cases: List[Optional[Dict[str, Any]]]) -> Dict[str, Dict[str, np.ndarray]]:
+    """Row numbers of the cases holding each value of each filter field, None rows are skipped"""
+    rows: Dict[str, Dict[str, List[int]]] = {field: {} for field in FILTER_FIELDS}
+    for row, case in enumerate(cases):
+        if case is None:
+            continue
+        for field in FILTER_FIELDS:
+            value = case.get(field)
+            if value is not None and str(value).strip():
+                rows[field].setdefault(filter_value(field, value), []).append(row)
+    return {
+        field: {value: np.array(value_rows, dtype=np.int64) for value, value_rows in values.items()}
+        for field, values in rows.items()
+    }
+
+def update_attribute_rows(attributes: Dict[str, Dict[str, np.ndarray]], removed: List[Tuple[int, Dict[str, Any]]],
+                          added: List[Tuple[int, Dict[str, Any]]]) -> Dict[str, Dict[str, np.ndarray]]:
+    """attribute_rows after cases left and entered rows, only the touched values are rebuilt
+    
+    Args:
+        attributes: Result of attribute_rows, left unchanged
+        removed: (row, case) pairs of cases that no longer hold their row
+        added: (row, case) pairs of cases that now hold their row
+    """
+    updated = {}
+    for field in FILTER_FIELDS:
+        dropped: Dict[str, List[int]] = {}
+        inserted: Dict[str, List[int]] = {}
+        for changes, target in ((removed, dropped), (added, inserted)):
+            for row, case in changes:
+                value = case.get(field)
+                if value is not None and str(value).strip():
+                    target.setdefault(filter_value(field, value), []).append(row)
+        values = dict(attributes.get(field, {}))
+        for value in dropped.keys() | inserted.keys():
+            rows = values.get(value, np.empty(0, dtype=np.int64))
+            if value in dropped:
+                rows = rows[~np.isin(rows, dropped[value])]
+            if value in inserted:
+                rows = np.union1d(rows, np.array(inserted[value], dtype=np.int64))
+            if len(rows):
+                values[value] = rows
+            else:
+                values.pop(value, None)
+        updated[field] = values
+    return updated
+
+class RowBuffer:
+    """Append-only float32 matrix with spare capacity
+    
+    view() is the filled part; views handed out earlier keep showing the rows they had,
+    since rows are only ever written past them or into a new, larger buffer.
+    """
+    def __init__(self, rows: np.ndarray):
+        self._data = np.ascontiguousarray(rows, dtype=np.float32)
+        self.size = len(self._data)
+        
+    def append(self, rows: np.ndarray) -> np.ndarray:
+        rows = np.asarray(rows, dtype=np.float32)
+        if self.size + len(rows) > len(self._data):
+            data = np.empty((max(2 * len(self._data), self.size + len(rows), 64), rows.shape[1]), dtype=np.float32)
+            data[:self.size] = self._data[:self.size]
+            self._data = data
+        self._data[self.size:self.size + len(rows)] = rows
+        self.size += len(rows)
+        return self.view()
+        
+    def view(self) -> np.ndarray:
+        return self._data[:self.size]
+
+class StoreChange:
+    """Rows touched by one CaseStore.apply, for updating the indexes without rebuilding them"""
+    def __init__(self, first_new: int):
+        # Rows at and above first_new were appended, their embeddings are new
+        self.first_new = first_new
+        # (row, key, case) of cases that left their row: deleted, re-embedded or with a changed payload
+        self.removed: List[Tuple[int, str, Dict[str, Any]]] = []
+        # Rows that got a case: appended, or the same row with a changed payload
+        self.added: List[int] = []
+        # Rows that no longer hold a case
+        self.killed: List[int] = []
+        # Set when the rows were renumbered, which invalidates every index built on them
+        self.compacted = False
+        self.stats = {"reused": 0, "embedded": 0, "evicted": 0, "updated": 0}
+        
+    def __bool__(self) -> bool:
+        return bool(self.removed or self.added or self.compacted)
+
+class CaseStore:
+    """Historical case embeddings keyed by case ID and content hash, kept across requests
+    
+    Rows are append-only: a new or re-embedded case gets a new row, and a deleted or
+    re-embedded case leaves a dead row (key None) behind, so the rows of indexes built
+    earlier stay valid. Once dead rows exceed `compact_ratio` of all rows, compact()
+    drops them and renumbers the rest.
+    
+    Embeddings are stored L2-normalized, so searches read the rows in place. With a
+    `directory` the store is persisted as a base embedding matrix opened through np.memmap,
+    a JSON sidecar with each row's case key, content hash and case, and a change log. A batch of changes appends one log line, plus a segment file with the embeddings
+    it added, so its cost does not grow with the store; compact() rewrites the base and
+    starts a new log, also once `max_segments` segments have piled up. A restarted process
+    maps the base and replays the log instead of re-embedding, and workers on the same host
+    share the page-cached copy. Writers hold locked() while they catch up with the log and
+    append to it, so workers never number rows without each other's changes.
+    """
+    METADATA_FILE = "case_store.json"
+    LOCK_FILE = "case_store.lock"
+    
+    def __init__(self, directory: Optional[str] = None, dtype: str = "float32", model_name: str = "",
+                 compact_ratio: float = 0.2, max_segments: int = 256):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported embedding store dtype: {dtype}")
+        self.directory = directory
+        self.dtype = dtype
+        self.model_name = model_name
+        self.compact_ratio = compact_ratio
+        self.max_segments = max(max_segments, 1)
+        self._metadata_stamp = None
+        # Change log of the current base, the offset it has been read or written up to, and its segment count
+        self._log_name: Optional[str] = None
+        self._log_offset = 0
+        self._segments = 0
+        # Per row, None for dead rows
+        self.keys: List[Optional[str]] = []
+        self.hashes: List[Optional[str]] = []
+        self.cases: List[Optional[Dict[str, Any]]] = []
+        self.rows: Dict[str, int] = {}
+        self.dead_rows = set()
+        # Embeddings of the rows: the mapped base, then the rows appended since in memory
+        self._base: Optional[np.ndarray] = None
+        self._tail: Optional[RowBuffer] = None
+        # Open lock file and nesting depth of locked()
+        self._lock_file = None
+        self._lock_depth = 0
+        # Bumped whenever rows or case payloads change, snapshots record the version they were built from
+        self.version = 0
+        
+    def __len__(self) -> int:
+        return len(self.rows)
+        
+    @property
+    def embeddings(self) -> Optional[np.ndarray]:
+        """Embeddings of all rows, dead ones included; a copy once rows were appended to the base"""
+        if self._tail is None or not self._tail.size:
+            return self._base
+        if self._base is None or not len(self._base):
+            return self._tail.view()
+        return np.concatenate([self._base, self._tail.view()])
+        
+    def row_blocks(self) -> RowBlocks:
+        """All rows without copying them: the mapped base in the store dtype, then the appended rows"""
+        blocks = [block for block in (self._base, self._tail.view() if self._tail is not None else None) if block is not None]
+        return RowBlocks(blocks)
+        
+    def sync(self, entries: List[Tuple[str, str, Dict[str, Any], str]], encode: Callable[[List[str]], np.ndarray],
+             precomputed: Optional[Dict[str, np.ndarray]] = None) -> StoreChange:
+        """Make the store hold exactly `entries`, cases absent from them are evicted, see apply"""
+        return self.apply(entries, [], encode, precomputed, replace=True)
+        
+    def apply(self, upserts: List[Tuple[str, str, Dict[str, Any], Any]], deletes: List[str],
+              encode: Callable[[List[str]], np.ndarray], precomputed: Optional[Dict[str, np.ndarray]] = None,
+              replace: bool = False) -> StoreChange:
+        """Upsert and delete cases
+        
+        Args:
+            upserts: (key, content_hash, case, text) tuples; text may be a callable returning
+                the text, so it is only built when embedded
+            deletes: Keys to remove
+            encode: Function embedding a list of texts
+            precomputed: Embeddings already computed by content hash, used instead of `encode`
+            replace: Also remove every case whose key is not in `upserts`
+        
+        Only new or changed cases are passed to `encode`, and only the touched rows are
+        written. Call reload_if_changed() first when other workers may write the store.
+        """
+        start_time = time.perf_counter()
+        change = StoreChange(len(self.keys))
+        record = {"updates": [], "deletes": [], "appends": []}
+        
+        # Later duplicates of a key win
+        latest = {}
+        for entry in upserts:
+            latest[entry[0]] = entry
+        if replace:
+            deletes = [key for key in self.rows if key not in latest]
+        
+        for key in deletes:
+            row = self.rows.get(key)
+            if row is not None and key not in latest:
+                self._kill(row, change)
+                record["deletes"].append(row)
+                change.stats["evicted"] += 1
+        
+        stale = []
+        for key, entry in latest.items():
+            row = self.rows.get(key)
+            if row is not None and self.hashes[row] == entry[1]:
+                change.stats["reused"] += 1
+                if entry[2] != self.cases[row]:
+                    # Same embedding, only the payload changed
+                    change.removed.append((row, key, self.cases[row]))
+                    self.cases[row] = entry[2]
+                    change.added.append(row)
+                    record["updates"].append({"row": row, "case": dict(entry[2])})
+                    change.stats["updated"] += 1
+                continue
+            if row is not None:
+                self._kill(row, change)
+                record["deletes"].append(row)
+            stale.append(entry)
+        
+        fresh = None
+        if stale:
+            precomputed = precomputed or {}
+            missing = [i for i, entry in enumerate(stale) if entry[1] not in precomputed]
+            logger.info(f"Embedding {len(missing)} new or changed cases, {len(stale) - len(missing)} already embedded")
+            encoded = {}
+            if missing:
+                texts = [stale[i][3]() if callable(stale[i][3]) else stale[i][3] for i in missing]
+                encoded = dict(zip(missing, np.asarray(encode(texts), dtype=np.float32)))
+            fresh = np.stack([encoded[i] if i in encoded else precomputed[entry[1]] for i, entry in enumerate(stale)])
+            # Rows are stored L2-normalized, so searches can score the mapped store as it is;
+            # keep what a reload would read back
+            fresh = normalize_rows(fresh).astype(self.dtype).astype(np.float32)
+            for key, content_hash, case, _ in stale:
+                self._append_row(key, content_hash, case)
+                change.added.append(len(self.keys) - 1)
+                record["appends"].append({"key": key, "hash": content_hash, "case": dict(case)})
+            self._append_embeddings(fresh)
+            change.stats["embedded"] = len(stale)
+        
+        if not change:
+            logger.info(f"Case store unchanged, {len(self)} cases")
+            return change
+        
+        self.version += 1
+        if self.dead_rows and len(self.dead_rows) > self.compact_ratio * len(self.keys):
+            change.compacted = self.compact()
+        elif self.directory and (self._log_name is None or self._segments >= self.max_segments):
+            change.compacted = self.compact()
+        elif self.directory:
+            self._append_log(record, fresh)
+        
+        stats = change.stats
+        logger.info(f"Case store updated, reused: {stats['reused']}, embedded: {stats['embedded']}, evicted: {stats['evicted']}, "
+                    f"payloads updated: {stats['updated']}, dead rows: {len(self.dead_rows)}, "
+                    f"time taken: {time.perf_counter() - start_time:.2f} seconds")
+        return change
+        
+    def _kill(self, row: int, change: Optional[StoreChange] = None):
+        key = self.keys[row]
+        if change is not None:
+            change.removed.append((row, key, self.cases[row]))
+            change.killed.append(row)
+        del self.rows[key]
+        self.keys[row] = self.hashes[row] = self.cases[row] = None
+        self.dead_rows.add(row)
+        
+    def _append_row(self, key: str, content_hash: str, case: Dict[str, Any]):
+        self.rows[key] = len(self.keys)
+        self.keys.append(key)
+        self.hashes.append(content_hash)
+        self.cases.append(case)
+        
+    def _append_embeddings(self, vectors: np.ndarray):
+        if self._tail is None:
+            self._tail = RowBuffer(np.empty((0, vectors.shape[1]), dtype=np.float32))
+        self._tail.append(vectors)
+        
+    def compact(self) -> bool:
+        """Drop dead rows and, with a directory, rewrite the store in full
+        
+        Returns True when rows were renumbered.
+        """
+        compacted = bool(self.dead_rows)
+        if compacted:
+            live = [row for row, key in enumerate(self.keys) if key is not None]
+            embeddings = self.embeddings
+            self._base = np.asarray(embeddings[live], dtype=np.float32) if embeddings is not None else None
+            self._tail = None
+            self.keys = [self.keys[row] for row in live]
+            self.hashes = [self.hashes[row] for row in live]
+            self.cases = [self.cases[row] for row in live]
+            self.rows = {key: row for row, key in enumerate(self.keys)}
+            self.dead_rows = set()
+            self.version += 1
+            logger.info(f"Case store compacted, rows: {len(self.keys)}")
+        self.save()
+        return compacted
+        
+    @contextmanager
+    def locked(self):
+        """Hold the store's inter-process lock, reentrant; callers serialize threads themselves"""
+        if not self.directory or self._lock_depth:
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        lock_file = open(os.path.join(self.directory, self.LOCK_FILE), "a+b")
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                # Retries for 10 seconds before raising OSError, so keep trying
+                while True:
+                    try:
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        pass
+            self._lock_file, self._lock_depth = lock_file, 1
+            try:
+                yield
+            finally:
+                self._lock_file, self._lock_depth = None, 0
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            lock_file.close()
+        
+    def _metadata_path(self) -> str:
+        return os.path.join(self.directory, self.METADATA_FILE)
+        
+    def _stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self._metadata_path())
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+        
+    def save(self):
+        """Write the whole store as a new base with an empty change log, the store must not have dead rows"""
+        embeddings = self.embeddings
+        if not self.directory or embeddings is None:
+            return
+        start_time = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+        
+        # Every save goes to new files: other workers may still map the previous ones,
+        # and Windows refuses to replace a file that is mapped
+        file_name = f"embeddings-{uuid.uuid4().hex}.bin"
+        file_path = os.path.join(self.directory, file_name)
+        np.ascontiguousarray(embeddings, dtype=self.dtype).tofile(file_path)
+        log_name = f"changes-{uuid.uuid4().hex}.jsonl"
+        open(os.path.join(self.directory, log_name), "wb").close()
+        
+        metadata = {
+            "model": self.model_name,
+            "dtype": self.dtype,
+            "shape": list(embeddings.shape),
+            "file": file_name,
+            "log": log_name,
+            "normalized": True,
+            "rows": [
+                {"key": key, "hash": content_hash, "case": dict(case)}
+                for key, content_hash, case in zip(self.keys, self.hashes, self.cases)
+            ]
+        }
+        tmp_path = f"{self._metadata_path()}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, self._metadata_path())
+        self._metadata_stamp = self._stamp()
+        self._log_name, self._log_offset, self._segments = log_name, 0, 0
+        
+        # Map the file we just wrote so this process shares the page cache too (empty files cannot be mapped)
+        if embeddings.size:
+            self._base = np.memmap(file_path, dtype=self.dtype, mode="r", shape=tuple(metadata["shape"]))
+        else:
+            self._base = np.empty(embeddings.shape, dtype=self.dtype)
+        self._tail = None
+        
+        current = {file_name, log_name}
+        for pattern in ("embeddings-*.bin", "segment-*.bin", "changes-*.jsonl"):
+            for stale_path in glob.glob(os.path.join(self.directory, pattern)):
+                if os.path.basename(stale_path) in current:
+                    continue
+                try:
+                    os.remove(stale_path)
+                except OSError:
+                    # Still mapped by another process, removed by a later save
+                    pass
+        logger.info(f"Case store saved to {self.directory}, rows: {len(self.keys)}, time taken: {time.perf_counter() - start_time:.2f} seconds")
+        
+    def _append_log(self, record: Dict[str, Any], fresh: Optional[np.ndarray]):
+        """Persist one batch of changes as a change log line and a segment with its new embeddings"""
+        if fresh is not None:
+            record["segment"] = f"segment-{uuid.uuid4().hex}.bin"
+            np.ascontiguousarray(fresh, dtype=self.dtype).tofile(os.path.join(self.directory, record["segment"]))
+            self._segments += 1
+        line = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        with open(os.path.join(self.directory, self._log_name), "ab") as f:
+            f.write(line)
+            end = f.tell()
+        if end - len(line) != self._log_offset:
+            # Another worker appended since we last read the log, our rows were numbered
+            # without its changes: reload everything on the next look at the store
+            logger.warning("Case store change log was appended to concurrently, reloading it on the next sync")
+            self._metadata_stamp = None
+        self._log_offset = end
+        
+    def _replay_log(self) -> int:
+        """Apply the change log lines written since our offset, returns how many were applied"""
+        try:
+            with open(os.path.join(self.directory, self._log_name), "rb") as f:
+                f.seek(self._log_offset)
+                data = f.read()
+        except OSError:
+            return 0
+        applied = 0
+        # A line without its newline is still being written
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            record = json.loads(line)
+            # Logs written by unlocked writers may update or delete a row twice, or append a key
+            # that is still live: the later change wins and dead rows stay dead
+            for update in record["updates"]:
+                if self.keys[update["row"]] is not None:
+                    self.cases[update["row"]] = CaseRecord.from_dict(update["case"])
+            for row in record["deletes"]:
+                if self.keys[row] is not None:
+                    self._kill(row)
+            if record["appends"]:
+                vectors = np.fromfile(os.path.join(self.directory, record["segment"]), dtype=self.dtype)
+                self._append_embeddings(vectors.reshape(len(record["appends"]), -1).astype(np.float32))
+                self._segments += 1
+                for row in record["appends"]:
+                    if row["key"] in self.rows:
+                        self._kill(self.rows[row["key"]])
+                    self._append_row(row["key"], row["hash"], CaseRecord.from_dict(row["case"]))
+            self._log_offset += len(line)
+            applied += 1
+        return applied
+        
+    def load(self) -> bool:
+        """Map the persisted store and replay its change log, returns False when there is nothing usable on disk"""
+        if not self.directory:
+            return False
+        start_time = time.perf_counter()
+        stamp = self._stamp()
+        if stamp is None:
+            return False
+        # Remember the stamp even if the store turns out unusable, so it is not re-read on every sync
+        self._metadata_stamp = stamp
+        try:
+            with open(self._metadata_path(), "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+            if metadata.get("model") != self.model_name:
+                logger.warning(f"Case store was built with model {metadata.get('model')}, ignoring it")
+                return False
+            
+            shape = tuple(metadata["shape"])
+            file_path = os.path.join(self.directory, metadata["file"])
+            expected_size = shape[0] * shape[1] * np.dtype(metadata["dtype"]).itemsize
+            if os.path.getsize(file_path) != expected_size or len(metadata["rows"]) != shape[0]:
+                logger.warning("Case store embedding file does not match its metadata, ignoring it")
+                return False
+            if shape[0]:
+                embeddings = np.memmap(file_path, dtype=metadata["dtype"], mode="r", shape=shape)
+            else:
+                embeddings = np.empty(shape, dtype=metadata["dtype"])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Failed to load case store from {self.directory}: {str(e)}")
+            return False
+        
+        rows = metadata["rows"]
+        self.keys = [row["key"] for row in rows]
+        self.hashes = [row["hash"] for row in rows]
+        self.cases = [CaseRecord.from_dict(row["case"]) for row in rows]
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+        self.dead_rows = set()
+        self._base, self._tail = embeddings, None
+        # Stores written before the change log was introduced have none, the next change rewrites them
+        self._log_name, self._log_offset, self._segments = metadata.get("log"), 0, 0
+        replayed = 0
+        if self._log_name:
+            try:
+                replayed = self._replay_log()
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Stopped replaying the case store change log at offset {self._log_offset}: {str(e)}")
+        if not metadata.get("normalized"):
+            # Stores written before rows were normalized: normalize in memory, the next change rewrites them
+            embeddings = self.embeddings
+            self._base = normalize_rows(embeddings).astype(self.dtype) if embeddings is not None else None
+            self._tail, self._log_name = None, None
+        self.version += 1
+        logger.info(f"Case store loaded from {self.directory}, rows: {len(self.keys)}, changes replayed: {replayed}, "
+                    f"time taken: {time.perf_counter() - start_time:.3f} seconds")
+        return True
+        
+    def reload_if_changed(self) -> bool:
+        """Catch up with what other processes saved since our last load or save"""
+        if not self.directory:
+            return False
+        stamp = self._stamp()
+        if stamp is None:
+            return False
+        if stamp != self._metadata_stamp:
+            return self.load()
+        if not self._log_name:
+            return False
+        try:
+            replayed = self._replay_log()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Failed to replay the case store change log, reloading it: {str(e)}")
+            return self.load()
+        if replayed:
+            self.version += 1
+            logger.info(f"Case store caught up with {replayed} changes from other workers")
+        return replayed > 0
+
+class IndexSnapshot:
+    """Immutable view of the case index
+    
+    build_index returns a snapshot and search reads from one, so a search never
+    sees cases from another request's rebuild. Rows are the case store rows: dead rows
+    hold None in `cases` and are listed in `dead`, searches never return them.
+    """
+    def __init__(self, cases: List[Optional[Dict[str, Any]]], vectors: Union[np.ndarray, RowBlocks], backend: SearchBackend, index: Any, k: int, version: int,
+                 lexical: Optional[LexicalSnapshot] = None, attributes: Optional[Dict[str, Dict[str, np.ndarray]]] = None,
+                 dead: Optional[np.ndarray] = None):
+        self.cases = cases
+        self.dead = dead if dead is not None else np.empty(0, dtype=np.int64)
+        # L2-normalized rows the index was built from, usually the mapped case store; filtered searches score them directly
+        self.vectors = vectors
+        self.backend = backend
+        self.index = index
+        self.k = k
+        self.version = version
+        self.lexical = lexical
+        # Filter field -> value -> sorted row numbers
+        self.attributes = attributes if attributes is not None else attribute_rows(cases)
+        
+    def __len__(self) -> int:
+        return len(self.cases) - len(self.dead)
+        
+    def filter_rows(self, filters: Optional[Dict[str, List[str]]]) -> Optional[np.ndarray]:
+        """Rows matching every filtered field, each field matching any of its values
+        
+        Args:
+            filters: Filter field -> accepted values; None or no values means no restriction
+        
+        Returns None when nothing is filtered, otherwise the sorted matching row numbers.
+        """
+        rows = None
+        for field, values in (filters or {}).items():
+            if field not in self.attributes:
+                raise ValueError(f"Unsupported filter field: {field}, expected one of {', '.join(FILTER_FIELDS)}")
+            if not values:
+                continue
+            index = self.attributes[field]
+            matches = [index[value] for value in {filter_value(field, v) for v in values} if value in index]
+            field_rows = np.unique(np.concatenate(matches)) if matches else np.empty(0, dtype=np.int64)
+            rows = field_rows if rows is None else np.intersect1d(rows, field_rows, assume_unique=True)
+        return rows
+
 class VectorSearch:
-    def __init__(self, model_name: str = 'paraphrase-multilingual-MiniLM-L12-v2'):
-        """Initialize vector search system"""
-        self.start_time = time.time()
+    def __init__(self, model_name: str = 'paraphrase-multilingual-MiniLM-L12-v2', backend: Optional[str] = None,
+                 store_dir: Optional[str] = None, store_dtype: Optional[str] = None,
+                 embedding_backend: Optional[str] = None):
+        """Initialize vector search system
+        
+        Args:
+            model_name: SentenceTransformer model used for embeddings
+            backend: Search backend name, defaults to the VECTOR_SEARCH_BACKEND environment variable
+            store_dir: Directory of the persisted case store, defaults to the VECTOR_STORE_DIR
+                environment variable ("vector_store"); an empty value keeps the store in memory only
+            store_dtype: float32 or float16, defaults to the VECTOR_STORE_DTYPE environment variable
+            embedding_backend: torch, onnx or int8, defaults to the EMBEDDING_BACKEND environment variable
+        """
+        self.start_time = time.perf_counter()
         logger.info(f"Initialize vector search system, using model: {model_name}")
-        self.model = SentenceTransformer(model_name)
-        self.index = None
-        self.cases = []
-        self.embeddings = None
+        self.embedding_backend = embedding_backend_name(embedding_backend)
+        self.model = load_embedding_model(model_name, self.embedding_backend)
+        self.backend = create_backend(backend)
+        logger.info(f"Using search backend: {self.backend.name}")
+        if store_dir is None:
+            store_dir = os.getenv("VECTOR_STORE_DIR", "vector_store")
+        if store_dtype is None:
+            store_dtype = os.getenv("VECTOR_STORE_DTYPE", "float32")
+        # Embeddings from different backends are not interchangeable, int8 in particular
+        self.case_store = CaseStore(
+            store_dir or None, store_dtype, f"{model_name}@{self.embedding_backend}",
+            compact_ratio=float(os.getenv("VECTOR_STORE_COMPACT_RATIO", "0.2")),
+            max_segments=int(os.getenv("VECTOR_STORE_MAX_SEGMENTS", "256"))
+        )
+        # BM25 over the cleaned case fields, fused with the dense results by hybrid_search
+        self.lexical_index = BM25Index()
+        self.hybrid_candidates = int(os.getenv("HYBRID_CANDIDATES", "50"))
+        self.rrf_k = int(os.getenv("HYBRID_RRF_K", "60"))
+        # Above this many cases, dense search only scores the best lexical matches
+        self.prefilter_min_cases = int(os.getenv("LEXICAL_PREFILTER_MIN_CASES", "50000"))
+        self.prefilter_candidates = int(os.getenv("LEXICAL_PREFILTER_CANDIDATES", "5000"))
+        self.embed_batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+        # Writers serialize on this lock, readers only take a reference to the current snapshot
+        self._write_lock = threading.Lock()
+        self._snapshot: Optional[IndexSnapshot] = None
+        # Content hash -> embedding of inline historical cases, least recently used first
+        self._inline_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._inline_cache_size = int(os.getenv("INLINE_EMBEDDING_CACHE_SIZE", "10000"))
+        self._inline_lock = threading.Lock()
         self.k = 5
-        logger.info(f"Vector search system initialized, time taken: {time.time() - self.start_time:.2f} seconds")
+        
+        # Warm start: serve from the persisted store until the first history sync
+        if self.case_store.load() and len(self.case_store):
+            with self._write_lock:
+                self._publish(self.k)
+        logger.info(f"Vector search system initialized, time taken: {time.perf_counter() - self.start_time:.2f} seconds")
         
     async def find_similar_cases(self, description: str, historical_cases: List[Dict[str, Any]], k: int = 5) -> List[Dict[str, Any]]:
         """Asynchronous search for similar cases
@@ -33,24 +671,19 @@ class VectorSearch:
             historical_cases: List of historical cases
             k: Number of similar cases to return
         """
-        start_time = time.time()
+        start_time = time.perf_counter()
         logger.info("Starting to search for similar cases")
         
         try:
-            # Create embeddings
-            logger.info("Starting to create embeddings")
-            embeddings = self.create_embeddings(historical_cases)
-            logger.info(f"Embeddings created, time taken: {time.time() - start_time:.2f} seconds")
-            
             # Build index
             logger.info("Starting to build index")
-            self.build_index(historical_cases, k)
-            logger.info(f"Index built, time taken: {time.time() - start_time:.2f} seconds")
+            snapshot = self.build_index(historical_cases, k)
+            logger.info(f"Index built, time taken: {time.perf_counter() - start_time:.2f} seconds")
             
             # Search for similar cases
             logger.info("Starting to search for similar cases")
-            results = self.search(description, k)
-            logger.info(f"Similar case search completed, found {len(results)} cases, time taken: {time.time() - start_time:.2f} seconds")
+            results = self.search(description, k, snapshot)
+            logger.info(f"Similar case search completed, found {len(results)} cases, time taken: {time.perf_counter() - start_time:.2f} seconds")
             
             # Process results
             similar_cases = []
@@ -60,7 +693,7 @@ class VectorSearch:
                 normalized_case['similarity'] = (1 - similarity) * 100
                 similar_cases.append(normalized_case)
             
-            logger.info(f"Case processing completed, total time taken: {time.time() - start_time:.2f} seconds")
+            logger.info(f"Case processing completed, total time taken: {time.perf_counter() - start_time:.2f} seconds")
             return similar_cases
             
         except Exception as e:
@@ -69,7 +702,7 @@ class VectorSearch:
             
     def _normalize_case(self, case: Dict[str, Any]) -> Dict[str, Any]:
         """Normalize case data"""
-        normalized = case.copy()
+        normalized = dict(case)
         
         # Process Summary and Subject
         if not normalized.get('Summary') and normalized.get('Subject'):
@@ -104,51 +737,27 @@ class VectorSearch:
         
         return normalized
         
+    def _case_text(self, case: Dict[str, Any], report_hash: Optional[str] = None) -> Optional[str]:
+        """Build the text that is embedded for a case, or None if it has no RCAReport"""
+        report = case.get('RCAReport')
+        if not (isinstance(report, str) and report.strip()):
+            return None
+        return rca_embedding_text(report, report_hash)
+        
     def create_embeddings(self, cases: List[Dict[str, Any]]) -> np.ndarray:
         """Create embeddings for cases"""
-        start_time = time.time()
+        start_time = time.perf_counter()
         logger.info(f"Creating embeddings for cases, number of cases: {len(cases)}")
         
         texts = []
         valid_cases = []
         
         for case in cases:
-            if 'RCAReport' in case and case['RCAReport'] and case['RCAReport'].strip():
-                field_parts = []
-                
-                if 'RCAReport' in case and case['RCAReport']:
-                    rca_text = case['RCAReport']
-                    
-                    key_sections = {
-                        'Issue Summary': None,
-                        'Impact Analysis': None,
-                        'Root Causes': None,
-                        'Resolution': None,
-                        'Preventive Measures': None,
-                        'Supplementary Information': None,
-                        'Conclusion': None
-                    }
-                    
-                    for section in key_sections.keys():
-                        pattern = rf"{section}\s*[:\n]+(.*?)(?=(##|\Z|#\s+))"
-                        match = re.search(pattern, rca_text, re.DOTALL | re.IGNORECASE)
-                        if match:
-                            key_sections[section] = match.group(1).strip()
-                    
-                    for section, content in key_sections.items():
-                        if content:
-                            clean_section = re.sub(r'^\d+\.\s*', '', section)
-                            clean_section = re.sub(r'[^\w\s]', '', clean_section).strip()
-                            field_parts.append(f"{clean_section}: {content}")
-                    
-                    if not any(key_sections.values()):
-                        field_parts.append(f"RCA: {rca_text}")
-                
-                text = " ".join(field_parts)
+            text = self._case_text(case)
+            if text is not None:
                 texts.append(text)
                 valid_cases.append(case)
         
-        self.cases = valid_cases
         logger.info(f"Number of valid cases: {len(valid_cases)}")
         
         if not texts:
@@ -157,47 +766,443 @@ class VectorSearch:
         
         logger.info("Starting to generate embeddings")
         embeddings = self.model.encode(texts, convert_to_numpy=True)
-        logger.info(f"Embeddings generated, shape: {embeddings.shape}, time taken: {time.time() - start_time:.2f} seconds")
+        logger.info(f"Embeddings generated, shape: {embeddings.shape}, time taken: {time.perf_counter() - start_time:.2f} seconds")
         return embeddings
         
-    def build_index(self, cases: List[Dict[str,Any]], k: int = 5):
-        """Build vector index"""
-        start_time = time.time()
+    @property
+    def snapshot(self) -> Optional[IndexSnapshot]:
+        """The most recently published index snapshot"""
+        return self._snapshot
+        
+    def build_index(self, cases: List[Dict[str,Any]], k: int = 5) -> IndexSnapshot:
+        """Build vector index and publish it as the current snapshot
+        
+        Only cases that are new or whose content changed since the previous call are
+        embedded; cases missing from `cases` are evicted from the case store.
+        """
+        start_time = time.perf_counter()
         logger.info(f"Building index, number of cases: {len(cases)}")
         
-        self.k = k
-        self.embeddings = self.create_embeddings(cases)
+        entries = [entry for entry in map(self._case_entry, cases) if entry is not None]
+        
+        logger.info(f"Number of valid cases: {len(entries)}")
+        if not entries:
+            logger.error("No valid cases found with RCAReport")
+            raise ValueError("No valid cases found with RCAReport")
+        
+        snapshot = self._sync_entries(entries, k)
+        logger.info(f"Index built, time taken: {time.perf_counter() - start_time:.2f} seconds")
+        return snapshot
+        
+    def _sync_entries(self, entries: List[Tuple[str, str, Dict[str, Any], Any]], k: int,
+                      precomputed: Optional[Dict[str, np.ndarray]] = None) -> IndexSnapshot:
+        """Make the case store hold exactly `entries` and return the matching snapshot"""
+        with self._write_lock, INDEX_BUILD_LATENCY.time():
+            _, snapshot = self._update_store(entries, [], k, precomputed, replace=True)
+            return snapshot
+        
+    def begin_index_sync(self) -> "IndexSync":
+        """Start indexing the cases posted with a single request, see IndexSync"""
+        return IndexSync(self)
+        
+    def apply_case_changes(self, changes: List[Tuple[str, Any]]) -> Dict[str, int]:
+        """Apply upserts and deletes to the case store in order and publish a new snapshot
+        
+        Args:
+            changes: ("upsert", case) or ("delete", case ID) tuples
+        
+        Unlike build_index, cases not mentioned in `changes` are kept. All new or changed
+        cases are embedded together, in batches of EMBEDDING_BATCH_SIZE, and only the
+        touched rows are written and re-indexed.
+        """
+        return self.apply_case_change_groups([changes])[0]
+    
+    def apply_case_change_groups(self, groups: List[List[Tuple[str, Any]]]) -> List[Dict[str, int]]:
+        """Apply several lists of changes, in order, as one update, see apply_case_changes
         
-        n_neighbors = min(self.k, len(self.cases))
-        logger.info(f"Building nearest neighbor index, number of neighbors: {n_neighbors}")
+        Returns the upserted, deleted and skipped counts of each list.
+        """
+        start_time = time.perf_counter()
+        group_stats = []
+        with self._write_lock, self.case_store.locked(), INDEX_BUILD_LATENCY.time():
+            # Start from what another worker may have saved in the meantime
+            self.case_store.reload_if_changed()
+            rows = self.case_store.rows
+            # Case key -> its entry after all changes, None once deleted
+            final: Dict[str, Optional[Tuple[str, str, Dict[str, Any], Any]]] = {}
+            for changes in groups:
+                stats = {"upserted": 0, "deleted": 0, "skipped": 0}
+                group_stats.append(stats)
+                for action, value in changes:
+                    if action == "delete":
+                        key = str(value)
+                        stats["deleted"] += final[key] is not None if key in final else key in rows
+                        final[key] = None
+                        continue
+                    entry = self._case_entry(value)
+                    if entry is None:
+                        # Cases without an RCAReport cannot be embedded
+                        stats["skipped"] += 1
+                        continue
+                    final[entry[0]] = entry
+                    stats["upserted"] += 1
+            
+            self._update_store(
+                [entry for entry in final.values() if entry is not None],
+                [key for key, entry in final.items() if entry is None],
+                self._snapshot.k if self._snapshot is not None else self.k
+            )
+        
+        totals = {key: sum(stats[key] for stats in group_stats) for key in ("upserted", "deleted", "skipped")}
+        logger.info(f"Case changes applied {totals}, cases: {len(self.case_store)}, time taken: {time.perf_counter() - start_time:.2f} seconds")
+        return group_stats
+        
+    def _update_store(self, upserts: List[Tuple[str, str, Dict[str, Any], Any]], deletes: List[str], k: int,
+                      precomputed: Optional[Dict[str, np.ndarray]] = None, replace: bool = False) -> Tuple[StoreChange, Optional[IndexSnapshot]]:
+        """Apply changes to the case store and publish the matching snapshot, caller holds the write lock
+        
+        The indexes of the current snapshot are updated for the touched rows only, unless
+        the store was compacted or changed under us, which needs a full rebuild.
+        """
+        store = self.case_store
+        with store.locked():
+            store.reload_if_changed()
+            current = self._snapshot
+            incremental = current is not None and current.version == store.version
+            change = store.apply(upserts, deletes, self._encode_cases, precomputed, replace)
+        
+        if not len(store):
+            self._snapshot = None
+            return change, None
+        if current is not None and current.version == store.version:
+            if current.k != k:
+                current = IndexSnapshot(current.cases, current.vectors, current.backend, current.index, k, current.version,
+                                        current.lexical, current.attributes, current.dead)
+                self._snapshot = current
+            logger.info(f"Index unchanged, reusing snapshot version {current.version}")
+            return change, current
+        if incremental and not change.compacted:
+            return change, self._publish_change(change, k)
+        return change, self._publish(k)
+        
+    def _case_entry(self, case: Dict[str, Any]) -> Optional[Tuple[str, str, Dict[str, Any], str]]:
+        """Case store entry of a case, or None if it has no RCAReport"""
+        report = case.get('RCAReport')
+        if not (isinstance(report, str) and report.strip()):
+            return None
+        # The embedded text is derived from the report alone, so its hash decides whether to re-embed
+        report_hash = content_hash(report)
+        return (case_key(case, report_hash), report_hash, case, partial(self._case_text, case, report_hash))
+        
+    def _inline_embeddings(self, entries: List[Tuple[str, str, Dict[str, Any], Any]],
+                           known: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Embeddings of inline cases by content hash, from the inline cache or freshly embedded"""
+        found, texts = {}, {}
+        with self._inline_lock:
+            for _, report_hash, _, text in entries:
+                if report_hash in known or report_hash in found:
+                    continue
+                vector = self._inline_cache.get(report_hash)
+                if vector is not None:
+                    self._inline_cache.move_to_end(report_hash)
+                    found[report_hash] = vector
+                else:
+                    texts[report_hash] = text
+        if texts:
+            logger.info(f"Embedding {len(texts)} inline cases, {len(found)} found in the inline cache")
+            vectors = np.asarray(self._encode_cases([text() if callable(text) else text for text in texts.values()]), dtype=np.float32)
+            embedded = dict(zip(texts, vectors))
+            found.update(embedded)
+            with self._inline_lock:
+                self._inline_cache.update(embedded)
+                while len(self._inline_cache) > self._inline_cache_size:
+                    self._inline_cache.popitem(last=False)
+        return found
         
-        self.index = NearestNeighbors(n_neighbors=n_neighbors, metric='cosine')
-        self.index.fit(self.embeddings)
+    def _overlay(self, entries: List[Tuple[str, str, Dict[str, Any], Any]], vectors: Dict[str, np.ndarray], k: int) -> IndexSnapshot:
+        """Snapshot of only `entries`, for a single request; it is never published"""
+        cases = [entry[2] for entry in entries]
+        normalized = normalize_rows(np.stack([vectors[entry[1]] for entry in entries]))
+        index = self.backend.build(normalized)
+        lexical = BM25Index(self.lexical_index.k1, self.lexical_index.b).build([entry[0] for entry in entries], cases)
+        return IndexSnapshot(cases, normalized, self.backend, index, k, -1, lexical)
         
-        logger.info(f"Index built, time taken: {time.time() - start_time:.2f} seconds")
+    def _encode_cases(self, texts: List[str]) -> np.ndarray:
+        with EMBEDDING_LATENCY.time(kind="cases"):
+            return self.model.encode(texts, convert_to_numpy=True, batch_size=self.embed_batch_size)
         
-    def search(self, query: str, k: int = None) -> List[Tuple[Dict[str, Any], float]]:
-        """Search for similar cases"""
-        start_time = time.time()
+    def _publish(self, k: int) -> IndexSnapshot:
+        """Build every index over the case store and make it the current snapshot, caller holds the write lock"""
+        store = self.case_store
+        cases = list(store.cases)
+        # The store keeps normalized rows, the backends and filtered searches read them in place
+        vectors = store.row_blocks()
+        logger.info(f"Building {self.backend.name} index, number of cases: {len(store)}")
+        index = self.backend.build(vectors)
+        tokenized = self.lexical_index.tokenized
+        lexical = self.lexical_index.build(store.keys, cases)
+        logger.info(f"Lexical index built, tokenized: {self.lexical_index.tokenized - tokenized}, terms: {len(lexical.postings)}")
+        
+        # Publishing is a single reference swap, searches holding the old snapshot are unaffected
+        dead = np.array(sorted(store.dead_rows), dtype=np.int64)
+        snapshot = IndexSnapshot(cases, vectors, self.backend, index, k, store.version, lexical, dead=dead)
+        self._snapshot = snapshot
+        return snapshot
+        
+    def _publish_change(self, change: StoreChange, k: int) -> IndexSnapshot:
+        """Derive the next snapshot from the current one for the rows in `change`, caller holds the write lock"""
+        start_time = time.perf_counter()
+        store = self.case_store
+        current = self._snapshot
+        cases = list(store.cases)
+        vectors, index = current.vectors, current.index
+        if len(cases) > len(current.cases):
+            vectors = store.row_blocks()
+            index = self.backend.extend(current.index, vectors, change.first_new)
+        added = [(row, store.keys[row], cases[row]) for row in change.added]
+        lexical = self.lexical_index.update(current.lexical, len(cases), change.removed, added)
+        attributes = update_attribute_rows(
+            current.attributes,
+            [(row, case) for row, _, case in change.removed],
+            [(row, case) for row, _, case in added]
+        )
+        dead = np.union1d(current.dead, np.array(change.killed, dtype=np.int64)) if change.killed else current.dead
+        
+        snapshot = IndexSnapshot(cases, vectors, self.backend, index, k, store.version, lexical, attributes, dead)
+        self._snapshot = snapshot
+        logger.info(f"Index updated for {len(change.removed)} removed and {len(added)} added rows, "
+                    f"dead rows: {len(dead)}, time taken: {time.perf_counter() - start_time:.3f} seconds")
+        return snapshot
+        
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed a batch of query texts in one forward pass"""
+        with EMBEDDING_LATENCY.time(kind="query"):
+            return self.model.encode(queries, convert_to_numpy=True)
+        
+    def search(self, query: str, k: int = None, snapshot: Optional[IndexSnapshot] = None,
+               rows: Optional[np.ndarray] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """Search for similar cases
+        
+        Args:
+            query: Query text
+            k: Number of results, defaults to the k the snapshot was built with
+            snapshot: Snapshot to search, defaults to the current one
+            rows: Only consider these rows of the snapshot, see IndexSnapshot.filter_rows
+        """
         logger.info(f"Starting to search, query: {query[:100]}...")
+        query_vector = self.encode_queries([query])[0]
+        return self.search_vector(query_vector, k, snapshot, rows)
         
-        if self.index is None:
+    def search_vector(self, query_vector: np.ndarray, k: int = None, snapshot: Optional[IndexSnapshot] = None,
+                      rows: Optional[np.ndarray] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """Search for similar cases with an already embedded query"""
+        return self.search_vectors(np.asarray(query_vector).reshape(1, -1), k, snapshot, rows)[0]
+        
+    def search_vectors(self, query_vectors: np.ndarray, k: int = None, snapshot: Optional[IndexSnapshot] = None,
+                       rows: Optional[np.ndarray] = None) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """Search for similar cases for a batch of embedded queries in one backend call
+        
+        Returns one list of (case, cosine distance) tuples per query row.
+        """
+        start_time = time.perf_counter()
+        snapshot = self._resolve_snapshot(snapshot)
+        
+        if k is None:
+            k = snapshot.k
+        query_vectors = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        if rows is not None and len(rows) == 0:
+            return [[] for _ in query_vectors]
+        
+        logger.info(f"Searching for the nearest {k} cases, number of queries: {len(query_vectors)}, "
+                    f"candidate rows: {len(snapshot) if rows is None else len(rows)}")
+        distances, indices = self._dense_search(snapshot, query_vectors, k, rows)
+        
+        cases = snapshot.cases
+        results = [
+            [(cases[idx], float(distance)) for idx, distance in zip(row_indices.tolist(), row_distances.tolist()) if idx >= 0]
+            for row_indices, row_distances in zip(indices, distances)
+        ]
+            
+        elapsed = time.perf_counter() - start_time
+        SEARCH_LATENCY.observe(elapsed, mode="dense")
+        logger.info(f"Search completed, found {sum(map(len, results))} results, time taken: {elapsed:.3f} seconds")
+        return results
+        
+    def _resolve_snapshot(self, snapshot: Optional[IndexSnapshot]) -> IndexSnapshot:
+        if snapshot is None:
+            snapshot = self._snapshot
+        if snapshot is None:
             logger.error("Index not built")
             raise ValueError("Index not built")
+        return snapshot
         
+    def _dense_search(self, snapshot: IndexSnapshot, query_vectors: np.ndarray, k: int,
+                      rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Nearest neighbors in the whole snapshot, or only among `rows` when given"""
+        if rows is None and len(snapshot.dead):
+            return snapshot.backend.search_excluding(snapshot.index, query_vectors, min(k, len(snapshot)),
+                                                     snapshot.dead, len(snapshot.cases))
+        if rows is None:
+            return snapshot.backend.search(snapshot.index, query_vectors, min(k, len(snapshot)))
+        return snapshot.backend.search_subset(snapshot.index, snapshot.vectors, query_vectors, min(k, len(rows)), rows)
+        
+    def hybrid_search(self, query: str, query_vector: np.ndarray, k: int = None, snapshot: Optional[IndexSnapshot] = None,
+                      rows: Optional[np.ndarray] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """Search with BM25 and the dense index and fuse both rankings with reciprocal-rank fusion
+        
+        Args:
+            query: Query text, matched against the indexed case fields
+            query_vector: Embedded query
+            k: Number of results, defaults to the k the snapshot was built with
+            snapshot: Snapshot to search, defaults to the current one
+            rows: Only consider these rows of the snapshot, see IndexSnapshot.filter_rows
+        
+        Results carry the cosine distance to the query, also for cases found only lexically.
+        When at least LEXICAL_PREFILTER_MIN_CASES cases are searched, the dense search only
+        scores the LEXICAL_PREFILTER_CANDIDATES best lexical matches.
+        """
+        start_time = time.perf_counter()
+        snapshot = self._resolve_snapshot(snapshot)
+        if snapshot.lexical is None:
+            return self.search_vector(query_vector, k, snapshot, rows)
+        
+        searched = len(snapshot) if rows is None else len(rows)
+        if searched == 0:
+            return []
         if k is None:
-            k = self.k
-        k = min(k, len(self.cases))
+            k = snapshot.k
+        k = min(k, searched)
+        candidates = min(max(k, self.hybrid_candidates), searched)
+        query_vectors = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
         
-        logger.info(f"Searching for the nearest {k} cases")
-        query_vector = self.model.encode([query], convert_to_numpy=True)
+        prefiltered = False
+        if searched >= self.prefilter_min_cases:
+            lexical_rows, _ = snapshot.lexical.search(query, max(self.prefilter_candidates, candidates), rows)
+            # Too few lexical matches to stand in for the whole history, search everything
+            prefiltered = len(lexical_rows) >= candidates
+        else:
+            lexical_rows, _ = snapshot.lexical.search(query, candidates, rows)
         
-        distances, indices = self.index.kneighbors(query_vector, n_neighbors=k)
+        distances, indices = self._dense_search(snapshot, query_vectors, candidates, lexical_rows if prefiltered else rows)
+        dense = {idx: float(distance) for idx, distance in zip(indices[0].tolist(), distances[0].tolist()) if idx >= 0}
         
-        results = []
-        for i, idx in enumerate(indices[0]):
-            case = self.cases[idx]
-            results.append((case, float(distances[0][i])))
-            
-        logger.info(f"Search completed, found {len(results)} results, time taken: {time.time() - start_time:.2f} seconds")
-        return results 
\ No newline at end of file
+        fused = reciprocal_rank_fusion([list(dense), lexical_rows[:candidates].tolist()], k, self.rrf_k)
+        
+        # Cases only the lexical ranking found still report their cosine distance
+        missing = np.array([row for row in fused if row not in dense], dtype=np.int64)
+        if len(missing):
+            distances, indices = self._dense_search(snapshot, query_vectors, len(missing), missing)
+            dense.update(zip(indices[0].tolist(), distances[0].tolist()))
+        
+        results = [(snapshot.cases[row], dense[row]) for row in fused]
+        elapsed = time.perf_counter() - start_time
+        SEARCH_LATENCY.observe(elapsed, mode="hybrid")
+        logger.info(f"Hybrid search completed, found {len(results)} results ({len(lexical_rows)} lexical matches, "
+                    f"prefiltered: {prefiltered}), time taken: {elapsed:.3f} seconds")
+        return results
+
+class IndexSync:
+    """Index of cases that arrive one at a time, e.g. while a request body is parsed
+    
+    add() only queues a case; take_pending() and embed() let the caller hash, section and
+    embed the queued cases in batches in a worker thread while more cases arrive, and
+    finish() builds a snapshot of exactly these cases. The case store and the published
+    snapshot are left alone, inline histories only reuse embeddings through the bounded
+    VectorSearch inline cache.
+    """
+    def __init__(self, search: VectorSearch):
+        self._search = search
+        self.batch_size = search.embed_batch_size * 4
+        self.entries: List[Tuple[str, str, Dict[str, Any], Any]] = []
+        self._pending: List[Dict[str, Any]] = []
+        self._vectors: Dict[str, np.ndarray] = {}
+        
+    def add(self, case: Dict[str, Any]) -> bool:
+        """Queue a case, returns True once a full batch of cases is waiting"""
+        self._pending.append(case)
+        return len(self._pending) >= self.batch_size
+        
+    def take_pending(self) -> List[Dict[str, Any]]:
+        """Hand over the queued cases"""
+        pending, self._pending = self._pending, []
+        return pending
+        
+    def embed(self, cases: List[Dict[str, Any]]):
+        """Hash and embed cases from take_pending(), meant to run in a worker thread
+        
+        Calls must not overlap. Cases without an RCAReport are dropped.
+        """
+        entries = [entry for entry in map(self._search._case_entry, cases) if entry is not None]
+        self.entries.extend(entries)
+        self._vectors.update(self._search._inline_embeddings(entries, self._vectors))
+        
+    def finish(self, k: int = 5) -> IndexSnapshot:
+        """Embed what is left and return a snapshot of the added cases, later duplicates of a case win"""
+        start_time = time.perf_counter()
+        self.embed(self.take_pending())
+        logger.info(f"Number of valid cases: {len(self.entries)}")
+        if not self.entries:
+            logger.error("No valid cases found with RCAReport")
+            raise ValueError("No valid cases found with RCAReport")
+        latest = {}
+        for entry in self.entries:
+            latest[entry[0]] = entry
+        snapshot = self._search._overlay(list(latest.values()), self._vectors, k)
+        logger.info(f"Index built, time taken: {time.perf_counter() - start_time:.2f} seconds")
+        return snapshot
+
+class QueryEmbeddingBatcher:
+    """Micro-batches concurrent query embeddings into a single model call
+    
+    Queries arriving within `window_ms` of the first pending one, or until `max_batch`
+    queries are pending, are embedded together and each caller gets its own row back.
+    """
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], window_ms: float = 5.0, max_batch: int = 32):
+        self._encode = encode
+        self.window = max(window_ms, 0.0) / 1000
+        self.max_batch = max(max_batch, 1)
+        # (query, future, perf_counter when queued)
+        self._pending: List[Tuple[str, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running = set()
+        
+    async def encode(self, query: str) -> np.ndarray:
+        """Embed one query, sharing the forward pass with other pending queries"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+        
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._run(batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+        
+    async def _run(self, batch: List[Tuple[str, asyncio.Future, float]]):
+        start_time = time.perf_counter()
+        for _, _, queued_at in batch:
+            QUEUE_WAIT.observe(start_time - queued_at, queue="query_embedding")
+        try:
+            vectors = await asyncio.to_thread(self._encode, [query for query, _, _ in batch])
+        except Exception as e:
+            logger.error(f"Failed to embed query batch: {str(e)}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future, _), vector in zip(batch, vectors):
+            # Callers that gave up (e.g. client disconnected) have a cancelled future
+            if not future.done():
+                future.set_result(vector)
+        logger.info(f"Embedded query batch of {len(batch)}, time taken: {time.perf_counter() - start_time:.3f} seconds")
\ No newline at end of file